@@ -0,0 +1,188 @@
+"""
+Motor de amortización (sistema francés) vectorizado con NumPy.
+
+Una sola implementación para simulador, tabla Cuotas, recaudación, cartera,
+consultas y tablero: calcula de una vez las tablas de muchos créditos, con un
+arreglo (créditos x cuotas) por columna.
+
+Solo la dimensión de créditos está vectorizada. Las cuotas se recorren una por
+una porque cada interés sale del saldo ya redondeado de la cuota anterior; una
+fórmula cerrada por cuota daría centavos distintos de los de la tabla que el
+sistema siempre calculó a mano.
+
+Reglas:
+  - tasa anual nominal en %, capitalización mensual (tasa / 12);
+  - cuota fija redondeada a centavos; el interés de cada cuota se calcula sobre
+    el saldo que queda (ya redondeado) y se redondea a centavos;
+  - la última cuota paga exactamente el saldo que quede (absorbe el redondeo).
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+TablaAmortizacion = namedtuple("TablaAmortizacion", "cuota interes capital saldo vigente")
+Liquidacion = namedtuple("Liquidacion", "capital interes_vencido interes_corrido mora total")
+Escenarios = namedtuple("Escenarios", "montos tasas plazos cuota interes_total")
+
+DIAS_ANIO = 360  # año comercial para el interés corrido de una liquidación
+PROPORCION_DISPONIBLE = 0.70  # parte del disponible mensual del cliente que puede ir a la cuota
+MAX_ESCENARIOS = 20000
+
+
+def _centavos(x):
+    """
+    Redondeo a centavos idéntico a round(x, 2) de Python. np.round multiplica por
+    100 y ese producto puede caer justo en .5 cuando el valor real está apenas por
+    debajo o por encima (714.255 -> 714.26 en lugar de 714.25); en esos empates se
+    decide con el error exacto del producto (división de Dekker).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    p = x * 100
+    c = 134217729.0 * x  # 2**27 + 1
+    alto = c - (c - x)
+    error = (alto * 100 - p) + (x - alto) * 100  # x*100 - p, exacto
+    piso = np.floor(p)
+    empate = (p - piso == 0.5) & (error != 0)
+    return np.where(empate, np.where(error > 0, piso + 1, piso), np.round(p)) / 100
+
+
+def _arreglos(montos, tasas_anuales, plazos):
+    monto = np.atleast_1d(np.asarray(montos, dtype=np.float64))
+    tasa = np.atleast_1d(np.asarray(tasas_anuales, dtype=np.float64))
+    plazo = np.atleast_1d(np.asarray(plazos, dtype=np.int64))
+    monto, tasa, plazo = np.broadcast_arrays(np.nan_to_num(monto), np.nan_to_num(tasa), plazo)
+    return monto, tasa / 100 / 12, np.maximum(plazo, 0)
+
+
+def cuota_fija(montos, tasas_anuales, plazos):
+    """Cuota mensual redondeada a centavos (0 si el plazo es 0). Acepta escalares o arreglos."""
+    monto, i, plazo = _arreglos(montos, tasas_anuales, plazos)
+    n = np.maximum(plazo, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        francesa = monto * i / (1 - (1 + i) ** -n.astype(np.float64))
+    cuota = np.where(i > 0, francesa, monto / n)
+    return np.where(plazo > 0, _centavos(cuota), 0.0)
+
+
+def tablas(montos, tasas_anuales, plazos, cuotas=None):
+    """
+    Tablas completas de varios créditos a la vez. Columna j = cuota j+1; las
+    columnas después del plazo quedan en 0 (vigente=False).
+    `cuotas` fija el valor de la cuota (p. ej. al reducir plazo tras un abono).
+    """
+    monto, i, plazo = _arreglos(montos, tasas_anuales, plazos)
+    cuota = cuota_fija(monto, i * 1200, plazo) if cuotas is None else np.broadcast_to(
+        np.asarray(cuotas, dtype=np.float64), monto.shape)
+    ancho = int(plazo.max()) if plazo.size else 0
+    vigente = np.arange(1, ancho + 1)[None, :] <= plazo[:, None]
+    interes, capital, saldo = (np.zeros(vigente.shape) for _ in range(3))
+
+    # Una pasada por número de cuota, todos los créditos a la vez: el interés corre
+    # sobre el saldo redondeado que dejó la cuota anterior (como al calcularla a mano).
+    pendiente = _centavos(monto)
+    for j in range(ancho):
+        activos = vigente[:, j]
+        interes_j = _centavos(pendiente * i)
+        # Última cuota: todo el saldo que quede
+        capital_j = np.where(plazo == j + 1, pendiente, _centavos(cuota - interes_j))
+        pendiente = np.where(activos, _centavos(pendiente - capital_j), pendiente)
+        interes[:, j] = np.where(activos, interes_j, 0.0)
+        capital[:, j] = np.where(activos, capital_j, 0.0)
+        saldo[:, j] = np.where(activos, pendiente, 0.0)
+    return TablaAmortizacion(_centavos(interes + capital), interes, capital, saldo, vigente)
+
+
+def tabla(monto, tasa_anual, plazo):
+    """Tabla de un crédito: [(numero, cuota, interes, capital, saldo)] con floats."""
+    t = tablas(monto, tasa_anual, plazo)
+    n = int(t.vigente[0].sum()) if t.vigente.size else 0
+    return [(k + 1, float(t.cuota[0, k]), float(t.interes[0, k]), float(t.capital[0, k]), float(t.saldo[0, k]))
+            for k in range(n)]
+
+
+def saldos(montos, tasas_anuales, plazos, cuotas_pagadas):
+    """Saldo de capital después de pagar `cuotas_pagadas` cuotas (por crédito)."""
+    monto, _, plazo = _arreglos(montos, tasas_anuales, plazos)
+    pagadas = np.clip(np.atleast_1d(np.asarray(cuotas_pagadas, dtype=np.int64)), 0, plazo)
+    t = tablas(montos, tasas_anuales, plazos)
+    if t.saldo.shape[1] == 0:
+        return monto.copy()
+    despues = np.take_along_axis(t.saldo, np.maximum(pagadas - 1, 0)[:, None], axis=1)[:, 0]
+    return np.where(pagadas > 0, despues, monto)
+
+
+def interes_de_cuotas(montos, tasas_anuales, plazos, desde, cuantas):
+    """Suma del interés de las cuotas desde+1 .. desde+cuantas (p. ej. las vencidas sin pagar)."""
+    t = tablas(montos, tasas_anuales, plazos)
+    k = np.arange(t.interes.shape[1])[None, :]
+    desde = np.atleast_1d(np.asarray(desde, dtype=np.int64))[:, None]
+    cuantas = np.atleast_1d(np.asarray(cuantas, dtype=np.int64))[:, None]
+    return np.round(np.where((k >= desde) & (k < desde + cuantas), t.interes, 0.0).sum(axis=1), 2)
+
+
+def abono_capital(saldo, tasa_anual, plazo_restante, abono, reducir="cuota"):
+    """
+    Recalcula un crédito después de un abono extraordinario a capital.
+    reducir="cuota": mismo plazo, cuota menor. reducir="plazo": misma cuota, menos cuotas.
+    Retorna (nuevo_saldo, cuota, plazo, tabla) para las cuotas que quedan.
+    """
+    nuevo = round(max(float(saldo) - float(abono), 0.0), 2)
+    if nuevo <= 0 or plazo_restante <= 0:
+        return 0.0, 0.0, 0, []
+    if reducir == "plazo":
+        cuota = float(cuota_fija(saldo, tasa_anual, plazo_restante)[0])
+        i = tasa_anual / 100 / 12
+        if i > 0:
+            plazo = int(np.ceil(-np.log(1 - nuevo * i / cuota) / np.log(1 + i)))
+        else:
+            plazo = int(np.ceil(nuevo / cuota))
+        plazo = min(max(plazo, 1), plazo_restante)
+        t = tablas(nuevo, tasa_anual, plazo, cuotas=cuota)
+        filas = [(k + 1, float(t.cuota[0, k]), float(t.interes[0, k]), float(t.capital[0, k]), float(t.saldo[0, k]))
+                 for k in range(plazo)]
+        return nuevo, cuota, plazo, filas
+    filas = tabla(nuevo, tasa_anual, plazo_restante)
+    return nuevo, filas[0][1], plazo_restante, filas
+
+
+def liquidacion(monto, tasa_anual, plazo, cuotas_pagadas, cuotas_vencidas=0, dias_corridos=0, mora=0.0):
+    """
+    Valor para cancelar hoy el crédito: saldo de capital + interés de las cuotas
+    vencidas sin pagar + interés corrido desde el último vencimiento + mora.
+    """
+    pagadas = min(int(cuotas_pagadas or 0), int(plazo or 0))
+    capital = float(saldos(monto, tasa_anual, plazo, pagadas)[0])
+    vencido = float(interes_de_cuotas(monto, tasa_anual, plazo, pagadas, cuotas_vencidas or 0)[0])
+    # El interés corrido corre sobre el saldo que queda después de las cuotas vencidas
+    base = float(saldos(monto, tasa_anual, plazo, pagadas + int(cuotas_vencidas or 0))[0])
+    corrido = round(base * (tasa_anual or 0) / 100 / DIAS_ANIO * max(int(dias_corridos or 0), 0), 2)
+    mora = round(float(mora or 0), 2)
+    return Liquidacion(round(capital, 2), vencido, corrido, mora, round(capital + vencido + corrido + mora, 2))
+
+
+@lru_cache(maxsize=32)
+def escenarios(montos, tasas_anuales, plazos):
+    """
+    Cuota e interés total de todas las combinaciones monto x tasa x plazo, en una
+    sola llamada a tablas(). Recibe tuplas (para cachear por conjunto de entradas)
+    y retorna Escenarios con arreglos de forma (montos, tasas, plazos), de solo lectura.
+    """
+    if len(montos) * len(tasas_anuales) * len(plazos) > MAX_ESCENARIOS:
+        raise ValueError(f"Demasiadas combinaciones (máximo {MAX_ESCENARIOS}).")
+    m, t, p = np.meshgrid(np.array(montos, dtype=np.float64), np.array(tasas_anuales, dtype=np.float64),
+                          np.array(plazos, dtype=np.int64), indexing="ij")
+    tb = tablas(m.ravel(), t.ravel(), p.ravel())
+    cuota = cuota_fija(m.ravel(), t.ravel(), p.ravel()).reshape(m.shape)
+    interes = np.round(tb.interes.sum(axis=1), 2).reshape(m.shape)
+    for arreglo in (cuota, interes):
+        arreglo.flags.writeable = False  # compartidos por la caché
+    return Escenarios(montos, tasas_anuales, plazos, cuota, interes)
+
+
+def capacidad_pago(cuotas, disponible, proporcion=PROPORCION_DISPONIBLE):
+    """(cuota / disponible, cuota alcanzable) para cada cuota; sin disponible nada es alcanzable."""
+    cuotas = np.asarray(cuotas, dtype=np.float64)
+    if not disponible or disponible <= 0:
+        return np.full(cuotas.shape, np.inf), np.zeros(cuotas.shape, dtype=bool)
+    return cuotas / disponible, cuotas <= disponible * proporcion
@@ -2,6 +2,8 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox, ttk
 import datetime
 import psycopg2
+import numpy as np
+import amortizacion
 
 class AsesoresView(ctk.CTkToplevel):
     def __init__(self, parent, db_manager, session_user):
@@ -172,21 +174,13 @@ class AsesoresView(ctk.CTkToplevel):
             for item in tree.get_children():
                 tree.delete(item)
 
-            tasa_mensual = (tasa_anual / 100) / 12
-            # Fórmula Sistema Francés
-            cuota = monto * (tasa_mensual * (1 + tasa_mensual)**plazo) / ((1 + tasa_mensual)**plazo - 1)
+            # Fórmula Sistema Francés (motor compartido con la tabla Cuotas y recaudación)
+            filas = amortizacion.tabla(monto, tasa_anual, plazo)
             
             # Formatear y mostrar en el campo superior
-            cuota_var.set(f"${cuota:,.2f}")
-
-            saldo = monto
-            for mes in range(1, plazo + 1):
-                interes = saldo * tasa_mensual
-                capital = cuota - interes
-                saldo = saldo - capital
-                if saldo < 0:
-                    saldo = 0 # Evitar -0.00 en la última cuota
-                
+            cuota_var.set(f"${filas[0][1]:,.2f}")
+
+            for mes, cuota, interes, capital, saldo in filas:
                 tree.insert("", "end", values=(
                     mes,
                     f"${cuota:.2f}",
@@ -195,8 +189,175 @@ class AsesoresView(ctk.CTkToplevel):
                     f"${saldo:.2f}"
                 ))
 
-        btn_calcular = ctk.CTkButton(sim_window, text="Calcular Tabla", command=calcular_tabla, font=("Arial", 14, "bold"))
-        btn_calcular.pack(pady=10)
+        frame_botones = ctk.CTkFrame(sim_window, fg_color="transparent")
+        frame_botones.pack(pady=10)
+        btn_calcular = ctk.CTkButton(frame_botones, text="Calcular Tabla", command=calcular_tabla, font=("Arial", 14, "bold"))
+        btn_calcular.pack(side="left", padx=5)
+        ctk.CTkButton(frame_botones, text="Comparar Escenarios", fg_color="#6c757d", font=("Arial", 14, "bold"),
+                      command=lambda: self.abrir_escenarios(sim_window, monto_var.get(), tasa_var.get(), plazo_var.get())
+                      ).pack(side="left", padx=5)
+
+    def abrir_escenarios(self, parent, monto="", tasa="", plazo=""):
+        """Matriz monto x plazo (para cada tasa) con cuota, interés total y capacidad de pago del cliente."""
+        win = ctk.CTkToplevel(parent)
+        win.title("Simulador - Comparar Escenarios")
+        win.geometry("1100x650")
+        win.transient(parent)
+        win.grab_set()
+
+        frame_inputs = ctk.CTkFrame(win, fg_color="transparent")
+        frame_inputs.pack(pady=15, padx=20, fill="x")
+
+        # Rangos: desde / hasta / paso (por defecto alrededor de lo que se simuló)
+        try: m = float(monto)
+        except ValueError: m = 5000.0
+        try: t = float(tasa)
+        except ValueError: t = 24.0
+        try: p = int(plazo)
+        except ValueError: p = 12
+        rangos = {
+            "Monto ($)": [ctk.StringVar(value=f"{max(m / 2, 100):.0f}"), ctk.StringVar(value=f"{m * 1.5:.0f}"), ctk.StringVar(value=f"{max(m / 10, 50):.0f}")],
+            "Tasa Anual (%)": [ctk.StringVar(value=f"{max(t - 6, 0):g}"), ctk.StringVar(value=f"{t + 6:g}"), ctk.StringVar(value="2")],
+            "Plazo (Meses)": [ctk.StringVar(value=str(max(p - 6, 1))), ctk.StringVar(value=str(p + 12)), ctk.StringVar(value="3")],
+        }
+        for col, texto in enumerate(("", "Desde", "Hasta", "Paso")):
+            ctk.CTkLabel(frame_inputs, text=texto, font=("Arial", 11, "bold")).grid(row=0, column=col, padx=5)
+        for fila, (nombre, vars_rango) in enumerate(rangos.items(), start=1):
+            ctk.CTkLabel(frame_inputs, text=nombre, font=("Arial", 12, "bold")).grid(row=fila, column=0, padx=5, pady=3, sticky="e")
+            for col, var in enumerate(vars_rango, start=1):
+                ctk.CTkEntry(frame_inputs, textvariable=var, width=90).grid(row=fila, column=col, padx=5, pady=3)
+
+        # Cliente: el disponible mensual se trae de Clientes por cédula o se digita
+        cedula_var = ctk.StringVar(value=self.vars["cedula"].get().strip())
+        disponible_var = ctk.StringVar()
+        ctk.CTkLabel(frame_inputs, text="Cédula Cliente:", font=("Arial", 12, "bold")).grid(row=1, column=4, padx=(30, 5), sticky="e")
+        ctk.CTkEntry(frame_inputs, textvariable=cedula_var, width=120).grid(row=1, column=5, padx=5)
+        ctk.CTkLabel(frame_inputs, text="Disponible Mensual ($):", font=("Arial", 12, "bold")).grid(row=2, column=4, padx=(30, 5), sticky="e")
+        ctk.CTkEntry(frame_inputs, textvariable=disponible_var, width=120).grid(row=2, column=5, padx=5)
+        lbl_cliente = ctk.CTkLabel(frame_inputs, text="", font=("Arial", 11, "italic"), text_color="gray")
+        lbl_cliente.grid(row=3, column=4, columnspan=3, sticky="w", padx=(30, 5))
+
+        def traer_disponible():
+            ced = cedula_var.get().strip()
+            if not ced or not self.db_manager:
+                return
+            conn = None
+            try:
+                conn = self.db_manager.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("SELECT nombres, nombre, total_disponible FROM Clientes WHERE cedula = %s LIMIT 1", (ced,))
+                row = cursor.fetchone()
+                if row:
+                    disponible_var.set(f"{row[2] or 0:.2f}")
+                    lbl_cliente.configure(text=row[0] or row[1] or "")
+                else:
+                    lbl_cliente.configure(text="Cliente no encontrado")
+            except Exception as e:
+                print(f"Error trayendo disponible del cliente: {e}")
+            finally:
+                if conn: self.db_manager.release_connection(conn)
+
+        ctk.CTkButton(frame_inputs, text="Buscar", width=70, command=traer_disponible).grid(row=1, column=6, padx=5)
+
+        # Vista: una tasa a la vez, filas = montos, columnas = plazos
+        frame_vista = ctk.CTkFrame(win, fg_color="transparent")
+        frame_vista.pack(padx=20, fill="x")
+        tasa_sel = ctk.StringVar()
+        vista_sel = ctk.StringVar(value="Cuota")
+        ctk.CTkLabel(frame_vista, text="Tasa:", font=("Arial", 12, "bold")).pack(side="left", padx=5)
+        menu_tasa = ctk.CTkOptionMenu(frame_vista, variable=tasa_sel, values=["-"], width=100, command=lambda v: pintar())
+        menu_tasa.pack(side="left", padx=5)
+        ctk.CTkSegmentedButton(frame_vista, values=["Cuota", "Interés Total", "% del Disponible"], variable=vista_sel,
+                               command=lambda v: pintar()).pack(side="left", padx=20)
+        lbl_resumen = ctk.CTkLabel(frame_vista, text="", font=("Arial", 12, "bold"), text_color="#1860C3")
+        lbl_resumen.pack(side="left", padx=10)
+
+        frame_tree = ctk.CTkFrame(win)
+        frame_tree.pack(pady=10, padx=20, fill="both", expand=True)
+        tree = ttk.Treeview(frame_tree, show="headings")
+        sy = ttk.Scrollbar(frame_tree, orient="vertical", command=tree.yview)
+        sx = ttk.Scrollbar(frame_tree, orient="horizontal", command=tree.xview)
+        tree.configure(yscrollcommand=sy.set, xscrollcommand=sx.set)
+        sy.pack(side="right", fill="y")
+        sx.pack(side="bottom", fill="x")
+        tree.pack(side="left", fill="both", expand=True)
+
+        estado = {"esc": None}
+
+        def rango(vars_rango, entero=False):
+            desde, hasta, paso = (float(v.get().replace(",", "")) for v in vars_rango)
+            if paso <= 0 or hasta < desde:
+                raise ValueError
+            valores = np.round(np.arange(desde, hasta + paso / 2, paso), 2)
+            return tuple(int(v) for v in valores) if entero else tuple(float(v) for v in valores)
+
+        def calcular():
+            try:
+                montos = rango(rangos["Monto ($)"])
+                tasas = rango(rangos["Tasa Anual (%)"])
+                plazos = rango(rangos["Plazo (Meses)"], entero=True)
+                if min(montos) <= 0 or min(plazos) <= 0 or min(tasas) < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error de Entrada", "Revise los rangos: valores numéricos, 'Hasta' >= 'Desde' y paso mayor a 0.", parent=win)
+                return
+            try:
+                # Todas las combinaciones en una llamada; el mismo conjunto de entradas sale de la caché
+                estado["esc"] = amortizacion.escenarios(montos, tasas, plazos)
+            except ValueError as e:
+                messagebox.showerror("Error de Entrada", str(e), parent=win)
+                return
+            etiquetas = [f"{t:g} %" for t in tasas]
+            menu_tasa.configure(values=etiquetas)
+            if tasa_sel.get() not in etiquetas:
+                tasa_sel.set(etiquetas[len(etiquetas) // 2])
+            pintar()
+
+        def pintar():
+            esc = estado["esc"]
+            if esc is None:
+                return
+            etiquetas = [f"{t:g} %" for t in esc.tasas]
+            it = etiquetas.index(tasa_sel.get()) if tasa_sel.get() in etiquetas else 0
+            cuota = esc.cuota[:, it, :]
+            try:
+                disponible = float(disponible_var.get().replace(",", "").replace("$", "") or 0)
+            except ValueError:
+                disponible = 0.0
+            relacion, alcanza = amortizacion.capacidad_pago(cuota, disponible)
+
+            columnas = ["Monto"] + [f"{p} m" for p in esc.plazos]
+            tree.delete(*tree.get_children())
+            tree.configure(columns=columnas)
+            for col in columnas:
+                tree.heading(col, text=col)
+                tree.column(col, width=110 if col == "Monto" else 95, anchor="center", stretch=False)
+
+            vista = vista_sel.get()
+            for im, monto_fila in enumerate(esc.montos):
+                if vista == "Interés Total":
+                    celdas = [f"${v:,.2f}" for v in esc.interes_total[im, it, :]]
+                elif vista == "% del Disponible":
+                    celdas = [f"{r:.0%}" if np.isfinite(r) else "-" for r in relacion[im]]
+                else:
+                    celdas = [f"${v:,.2f}" for v in cuota[im]]
+                if disponible > 0:
+                    # ✓ = la cuota cabe en el disponible del cliente
+                    celdas = [c + (" ✓" if ok else " ✗") for c, ok in zip(celdas, alcanza[im])]
+                tree.insert("", "end", values=[f"${monto_fila:,.0f}"] + celdas)
+
+            if disponible > 0:
+                lbl_resumen.configure(text=f"{int(alcanza.sum())} de {alcanza.size} ofertas caben en el "
+                                           f"{amortizacion.PROPORCION_DISPONIBLE:.0%} del disponible (${disponible:,.2f})")
+            else:
+                lbl_resumen.configure(text=f"{cuota.size} ofertas para la tasa {tasa_sel.get()}")
+
+        disponible_var.trace_add("write", lambda *a: pintar())
+        ctk.CTkButton(win, text="Calcular Escenarios", command=calcular, font=("Arial", 14, "bold")).pack(pady=10)
+
+        if cedula_var.get():
+            traer_disponible()
+        calcular()
 
     def verificar_cliente_tiempo_real(self, event=None):
         ced = self.vars["cedula"].get().strip()
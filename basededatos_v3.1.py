@@ -1,6 +1,5 @@
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-import pandas as pd
 import sqlite3 
 import hashlib 
 import datetime
@@ -18,10 +17,23 @@ import tempfile
 import qrcode
 import base64
 from io import BytesIO
-from db_manager import DatabaseManager
-from db_manager import DatabaseManager
+from db_manager import DatabaseManager, compilar_sql
+from migraciones import aplicar_migraciones
+from ejecutor_db import EjecutorDB
+from busqueda_clientes import filtro_por_nombre
+from directorio_clientes import DirectorioClientes
+from grilla_virtual import GrillaVirtual
+import kpis
+import graficos
+import resumen_pagos
+import cuotas
+import motor_mora
+import exportador
+import informes
+import informes_programados
 import psycopg2.extras
 import sys
+import threading
 from asesores_view import AsesoresView
 
 def resource_path(relative_path):
@@ -36,77 +48,6 @@ def resource_path(relative_path):
 
 
 
-def verificar_integridad_db():
-    print('--- VERIFICANDO INTEGRIDAD DE BASE DE DATOS ---')
-    if not db_manager:
-        print("Error: db_manager no inicializado. Saltando verificación.")
-        return
-
-    try:
-        conn = db_manager.get_connection()
-        cursor = db_manager.get_cursor(conn)
-
-        nuevas_columnas = [
-            ("fecha_desembolso_real", "TEXT"),
-            ("monto_aprobado", "REAL"),
-            ("tasa_interes", "REAL"),
-            ("plazo_meses", "INTEGER"),
-            ("valor_cuota", "REAL"),
-            ("dia_pago", "INTEGER"),
-            # Campos nuevos pestaña Visitas
-            ("vis_tiempo_reside", "TEXT"),
-            ("vis_m2_constru", "TEXT"),
-            ("vis_avaluo", "TEXT"),
-            ("vis_hipoteca", "TEXT"),
-            ("vis_avaluo_enseres", "TEXT"),
-            ("vis_pisos", "TEXT"),
-            ("vis_donde_vive", "TEXT"),
-            ("vis_caracteristicas", "TEXT"),
-            ("vis_destino_credito", "TEXT"),
-            ("vis_hora", "TEXT"),
-            ("vis_observaciones", "TEXT"),
-            ("vis_imagenes_rutas", "TEXT"),
-        ]
-        
-        # Obtener columnas existentes (abstracted by db_manager)
-        try:
-            columnas_existentes = db_manager.get_column_names(cursor, "Microcreditos")
-        except Exception:
-            # Si falla, intentar crear la tabla (aunque crear_tablas ya deberia haber corrido)
-            # O simplemente asumir vacio
-            columnas_existentes = []
-
-        for col_nombre, col_tipo in nuevas_columnas:
-            if col_nombre not in columnas_existentes:
-                print(f"Reparando: Agregando columna faltante '{col_nombre}'...")
-                try:
-                    # ALTER TABLE es standard para ADD COLUMN
-                    cursor.execute(f"ALTER TABLE Microcreditos ADD COLUMN {col_nombre} {col_tipo}")
-                    print(f"Columna '{col_nombre}' agregada.")
-                except Exception as e:
-                    print(f"Info/Error al agregar {col_nombre}: {e}")
-            else:
-                print(f"Verificado: '{col_nombre}' ya existe.")
-        
-        # Verificar columna 'observaciones' en Caja
-        try:
-            cols_caja = db_manager.get_column_names(cursor, "Caja")
-            # Convertir a minúsculas por si acaso
-            cols_caja = [c.lower() for c in cols_caja]
-            if "observaciones" not in cols_caja:
-                print("Reparando: Agregando columna faltante 'observaciones' en Caja...")
-                cursor.execute("ALTER TABLE Caja ADD COLUMN observaciones TEXT")
-                print("Columna 'observaciones' agregada a Caja.")
-        except Exception as e_caja:
-            print(f"Info/Error al verificar Caja: {e_caja}")
-
-        conn.commit()
-        db_manager.release_connection(conn)
-        print('--- VERIFICACIÓN COMPLETADA ---')
-    except Exception as e:
-        print(f"Error crítico en verificación DB: {e}")
-
-
 def generar_qr_base64(texto):
     qr = qrcode.QRCode(version=1, box_size=10, border=2)
     qr.add_data(texto)
@@ -172,6 +113,26 @@ except Exception as e:
     print(f"Alerta de Arquitectura: {e}")
     db_manager = None
 
+# Instrumentación de consultas (diagnóstico de pantallas lentas).
+# Las que superen el umbral quedan en consultas_lentas.log; al salir se imprime p50/p95/p99.
+METRICAS_SQL = False
+UMBRAL_CONSULTA_LENTA_MS = 300
+UMBRALES_POR_MODULO = {"informes": 2000}
+
+if db_manager and METRICAS_SQL:
+    db_manager.activar_metricas(umbral_ms=UMBRAL_CONSULTA_LENTA_MS, umbrales=UMBRALES_POR_MODULO)
+
+# Consultas en segundo plano para no congelar la ventana
+ejecutor_db = EjecutorDB(db_manager)
+
+# Directorio de clientes en memoria para las búsquedas por tecla
+directorio_clientes = DirectorioClientes(db_manager)
+if db_manager:
+    directorio_clientes.cargar_en_fondo()
+
+# Instantánea de KPI del tablero; pagos y desembolsos la invalidan
+servicio_kpi = kpis.ServicioKPI()
+
 # =================================================================
 # FUNCIÓN HELPER PARA LOGO
 # =================================================================
@@ -192,6 +153,120 @@ def agregar_logo(ventana, logo_path="Logo Face.jpg", width=150, height=140):
         print(f"Error cargando logo: {e}")
     return None
 
+# =================================================================
+# BÚSQUEDA MIENTRAS SE ESCRIBE (directorio en memoria)
+# =================================================================
+
+def con_espera(widget, funcion, espera_ms=200):
+    """Envuelve un manejador de <KeyRelease> para que corra solo cuando el usuario deja de escribir."""
+    pendiente = [None]
+    def correr(event):
+        pendiente[0] = None
+        funcion(event)
+    def manejador(event=None):
+        if pendiente[0] is not None:
+            widget.after_cancel(pendiente[0])
+        pendiente[0] = widget.after(espera_ms, correr, event)
+    return manejador
+
+def resolver_cliente(widget, ced, ruc, nom, al_resolver, reintentar):
+    """
+    Cliente de los campos de búsqueda de un formulario sin consultar la base en el
+    hilo de Tk: sale del directorio en memoria o, si falta ahí, de una consulta
+    indexada en ejecutor_db. al_resolver(criterio, entrada) corre en el hilo de Tk
+    (criterio None: nada que buscar); mientras el directorio carga se llama reintentar().
+    """
+    clave = f"directorio {widget}"
+    criterio, entrada = directorio_clientes.resolver(ced, ruc, nom)
+    if criterio == "cargando":
+        widget.after(directorio_clientes.REINTENTO_MS, reintentar)
+        return
+    if directorio_clientes.requiere_base(criterio, entrada):
+        valor = {"cedula": ced, "ruc": ruc, "nombre": nom}[criterio]
+        ejecutor_db.ejecutar(widget, directorio_clientes.consultar_base, criterio, valor,
+                             al_terminar=lambda e: al_resolver(criterio, e),
+                             al_fallar=lambda e: print(f"Búsqueda de cliente: {e}"), clave=clave)
+        return
+    # Una consulta anterior más lenta no debe pisar esta respuesta
+    ejecutor_db.cancelar(clave)
+    al_resolver(criterio, entrada)
+
+def activar_sugerencias(entry, al_elegir, limite=8, espera_ms=120):
+    """
+    Lista desplegable bajo `entry` con los clientes del directorio que coinciden con lo escrito.
+    Flecha abajo entra a la lista; Enter o doble clic eligen y llaman al_elegir(entrada).
+    """
+    estado = {"popup": None, "lista": None, "entradas": []}
+
+    def cerrar(event=None):
+        if estado["popup"] is not None:
+            try: estado["popup"].destroy()
+            except tk.TclError: pass
+        estado["popup"] = estado["lista"] = None
+
+    def cerrar_sin_foco(event=None):
+        # El foco pudo pasar a la lista: se decide un instante después
+        def verificar():
+            try:
+                if entry.focus_get() is not estado["lista"]: cerrar()
+            except (tk.TclError, KeyError): cerrar()
+        entry.after(150, verificar)
+
+    def elegir(event=None):
+        lista = estado["lista"]
+        sel = lista.curselection() if lista is not None else ()
+        if sel:
+            entrada = estado["entradas"][sel[0]]
+            cerrar()
+            entry.focus_set()
+            al_elegir(entrada)
+        return "break"
+
+    def mostrar(event=None):
+        if event is not None and event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+            return
+        texto = entry.get().strip()
+        entradas = directorio_clientes.buscar(texto, limite) if len(texto) >= 2 else []
+        if not entradas and len(texto) >= 2 and directorio_clientes.cargando:
+            # Sin bloquear la ventana: se reintenta cuando el directorio termine de cargar
+            entry.after(directorio_clientes.REINTENTO_MS, mostrar)
+            return
+        if not entradas:
+            return cerrar()
+        if estado["popup"] is None:
+            popup = tk.Toplevel(entry)
+            popup.wm_overrideredirect(True)
+            popup.attributes("-topmost", True)
+            lista = tk.Listbox(popup, font=("Arial", 11), activestyle="dotbox", exportselection=False)
+            lista.pack(fill="both", expand=True)
+            lista.bind("<Double-Button-1>", elegir)
+            lista.bind("<Return>", elegir)
+            lista.bind("<Escape>", lambda e: (cerrar(), entry.focus_set(), "break")[-1])
+            lista.bind("<FocusOut>", cerrar_sin_foco)
+            estado["popup"], estado["lista"] = popup, lista
+        lista = estado["lista"]
+        estado["entradas"] = entradas
+        lista.delete(0, tk.END)
+        for e in entradas:
+            lista.insert(tk.END, f"{e.nombres or ''}  —  {e.cedula or e.ruc or ''}")
+        lista.configure(height=len(entradas))
+        estado["popup"].geometry(f"{max(entry.winfo_width(), 380)}x{len(entradas) * 22 + 4}"
+                                 f"+{entry.winfo_rootx()}+{entry.winfo_rooty() + entry.winfo_height()}")
+
+    def bajar(event=None):
+        if estado["lista"] is not None:
+            estado["lista"].focus_set()
+            estado["lista"].selection_clear(0, tk.END)
+            estado["lista"].selection_set(0)
+            estado["lista"].activate(0)
+            return "break"
+
+    entry.bind("<KeyRelease>", con_espera(entry, mostrar, espera_ms), add="+")
+    entry.bind("<Down>", bajar, add="+")
+    entry.bind("<Escape>", cerrar, add="+")
+    entry.bind("<FocusOut>", cerrar_sin_foco, add="+")
+    entry.bind("<Destroy>", cerrar, add="+")
+
 # =================================================================
 # 1. BASE DE DATOS
 # =================================================================
@@ -229,176 +304,14 @@ def db_connection():
         db_manager.release_connection(conn)
 
 def crear_tablas():
-    conn, cursor = conectar_db()
-    try:
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Clientes (
-                id {sql_type("SERIAL PRIMARY KEY")}, 
-                cedula TEXT UNIQUE NOT NULL,  
-                ruc TEXT,
-                nombre TEXT NOT NULL,
-                estado_civil TEXT,
-                cargas_familiares INTEGER,
-                email TEXT,
-                telefono TEXT,
-                direccion TEXT,
-                parroquia TEXT,
-                tipo_vivienda TEXT,
-                profesion TEXT,
-                ingresos_mensuales REAL,
-                referencia1 TEXT,
-                referencia2 TEXT,
-                asesor TEXT,
-                apertura TEXT,
-                numero_carpeta TEXT,
-                "fecha nacimiento" TEXT,
-                producto TEXT,
-                observaciones TEXT,
-                "cartera castigada" INTEGER DEFAULT 0,
-                "valor cartera" REAL,
-                "demanda judicial" INTEGER DEFAULT 0,
-                "valor demanda" REAL,
-                "problemas justicia" INTEGER DEFAULT 0,
-                "detalle justicia" TEXT
-            )
-        """)
-        
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Usuarios (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                usuario TEXT UNIQUE NOT NULL,
-                clave_hash TEXT NOT NULL, 
-                nivel_acceso INTEGER NOT NULL,
-                estado INTEGER DEFAULT 1,
-                rol TEXT
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Auditoria (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                id_usuario TEXT,
-                accion TEXT,
-                id_cliente TEXT,
-                detalles TEXT,
-                timestamp TEXT
-            )
-        """)
-        
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Rehabilitacion (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                cedula_cliente TEXT UNIQUE NOT NULL,
-                fecha_inicio TEXT,
-                terminos TEXT,
-                resultado TEXT,
-                finalizado INTEGER DEFAULT 0,
-                FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS visitas_microcredito (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                cedula_cliente TEXT NOT NULL,
-                fecha TEXT,
-                observaciones TEXT,
-                FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Pagos (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                fecha TEXT,
-                cedula_cliente TEXT,
-                cuota_nro INTEGER,
-                valor_capital REAL,
-                valor_interes REAL,
-                valor_mora REAL,
-                total_pagado REAL,
-                usuario TEXT
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Caja (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                fecha_hora TEXT,
-                cedula TEXT,
-                ruc TEXT,
-                nombres_completos TEXT,
-                email TEXT,
-                direccion TEXT,
-                telefono TEXT,
-                estado_civil TEXT,
-                asesor TEXT,
-                buro_credito TEXT,
-                buro_archivo_ruta TEXT,
-                valor_apertura REAL,
-                numero_apertura TEXT,
-                estado_impreso TEXT
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Intermediacion_Detalles (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                cedula_cliente TEXT UNIQUE NOT NULL,
-                
-
-                chk_dis_temp INTEGER DEFAULT 0, val_dis_temp REAL DEFAULT 0, obs_dis_temp TEXT,
-                chk_dis_reg INTEGER DEFAULT 0, val_dis_reg REAL DEFAULT 0, obs_dis_reg TEXT,
-                chk_pat_1 INTEGER DEFAULT 0, val_pat_1 REAL DEFAULT 0, obs_pat_1 TEXT,
-                chk_pat_2 INTEGER DEFAULT 0, val_pat_2 REAL DEFAULT 0, obs_pat_2 TEXT,
-                chk_inmueble INTEGER DEFAULT 0, val_inmueble REAL DEFAULT 0, obs_inmueble TEXT,
-                chk_ruc INTEGER DEFAULT 0, val_ruc REAL DEFAULT 0, obs_ruc TEXT,
-                chk_declaraciones INTEGER DEFAULT 0, val_declaraciones REAL DEFAULT 0, obs_declaraciones TEXT,
-                chk_estados_cta INTEGER DEFAULT 0, val_estados_cta REAL DEFAULT 0, obs_estados_cta TEXT,
-                
-                fecha_cita TEXT, 
-                informe_cita TEXT,
-                
-                chk_precal INTEGER DEFAULT 0, desc_precal TEXT,
-                chk_aprob INTEGER DEFAULT 0, desc_aprob TEXT,
-                fecha_desembolso_inter TEXT,
-                chk_informe INTEGER DEFAULT 0, desc_informe TEXT,
-                
-                FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-            )
-        """)
-
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS PagosBuro (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                fecha TEXT,
-                cedula_cliente TEXT,
-                nombre_cliente TEXT,
-                monto REAL,
-                usuario TEXT,
-                metodo TEXT,
-                detalles TEXT
-            )
-        """)
-
-        cursor.execute("SELECT COUNT(*) FROM Usuarios")
-        if cursor.fetchone()[0] == 0:
-            hash_admin = generar_hash('cyberpol2022') 
-            cursor.execute("INSERT INTO Usuarios (usuario, clave_hash, nivel_acceso, rol) VALUES (%s, %s, %s, %s)", ('Paul', hash_admin, 1, 'Administrador'))
-
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Error DB: {e}")
-    finally: db_manager.release_connection(conn)
+    """Compatibilidad: el esquema base ahora es la migración 1 (ver migraciones.py)."""
+    migrar_db()
 
 # Helpers delegados a db_manager
 def sql_type(t): return db_manager.sql_type(t)
 def get_column_names(c, t): return db_manager.get_column_names(c, t)
 def check_table_exists(c, t): return db_manager.check_table_exists(c, t)
-def fix_query(q): 
-    if db_manager.mode == "SQLITE": return q.replace("%s", "?")
-    return q
+def fix_query(q): return compilar_sql(q, db_manager.mode).sql
 
 def registrar_auditoria(accion, id_cliente=None, detalles=None):
     """Registra una acción en la tabla de Auditoria"""
@@ -412,301 +325,10 @@ def registrar_auditoria(accion, id_cliente=None, detalles=None):
     finally: db_manager.release_connection(conn)
 
 def migrar_db():
-    conn, cursor = conectar_db()
+    """Aplica las migraciones pendientes; si el esquema está al día solo compara la versión."""
     try:
-        # Verificar si existe la columna 'referencia_vivienda'
-        columnas = get_column_names(cursor, 'Clientes')
-        
-        if 'imagen_deposito' not in columnas:
-            print("Migrando DB: Agregando columna 'imagen_deposito' a Clientes...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN imagen_deposito BYTEA")
-            conn.commit()
-            print("Migración completada.")
-
-        # Asegurar columnas necesarias para AsesoresView en la tabla original Clientes
-        try:
-            if 'nombre' not in columnas:
-                cursor.execute("ALTER TABLE Clientes ADD COLUMN nombre TEXT")
-            if 'asesor' not in columnas:
-                cursor.execute("ALTER TABLE Clientes ADD COLUMN asesor TEXT")
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error migrando columnas para AsesoresView: {e}")
-            
-        if 'referencia_vivienda' not in columnas:
-            print("Migrando DB: Agregando columna 'referencia_vivienda'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN referencia_vivienda TEXT")
-            conn.commit()
-            print("Migración completada.")
-            
-        if 'situacion_financiera' not in columnas:
-            print("Migrando DB: Agregando columna 'situacion_financiera'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN situacion_financiera TEXT")
-            conn.commit()
-            print("Migración completada.")
-            
-        if 'terreno' not in columnas:
-            print("Migrando DB: Agregando columna 'terreno'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN terreno INTEGER DEFAULT 0")
-            conn.commit()
-            print("Migración completada.")
-
-        if 'valor_terreno' not in columnas:
-            print("Migrando DB: Agregando columna 'valor_terreno'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN valor_terreno REAL")
-            conn.commit()
-            print("Migración completada.")
-            
-        if 'hipotecado' not in columnas:
-            print("Migrando DB: Agregando columna 'hipotecado'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN hipotecado TEXT")
-            conn.commit()
-            print("Migración completada.")
-            
-        if 'fuente_ingreso' not in columnas:
-            print("Migrando DB: Agregando columna 'fuente_ingreso'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN fuente_ingreso TEXT")
-            conn.commit()
-            
-        if 'ingresos_mensuales_2' not in columnas:
-            print("Migrando DB: Agregando columna 'ingresos_mensuales_2'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN ingresos_mensuales_2 REAL")
-            conn.commit()
-        if 'fuente_ingreso_2' not in columnas:
-            print("Migrando DB: Agregando columna 'fuente_ingreso_2'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN fuente_ingreso_2 TEXT")
-            conn.commit()
-            
-        if 'casa_dep' not in columnas:
-            print("Migrando DB: Agregando columna 'casa_dep'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN casa_dep INTEGER DEFAULT 0")
-            conn.commit()
-        if 'valor_casa_dep' not in columnas:
-            print("Migrando DB: Agregando columna 'valor_casa_dep'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN valor_casa_dep REAL")
-            conn.commit()
-        if 'hipotecado_casa_dep' not in columnas:
-            print("Migrando DB: Agregando columna 'hipotecado_casa_dep'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN hipotecado_casa_dep TEXT")
-            conn.commit()
-            
-        if 'local' not in columnas:
-            print("Migrando DB: Agregando columna 'local'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN local INTEGER DEFAULT 0")
-            conn.commit()
-        if 'valor_local' not in columnas:
-            print("Migrando DB: Agregando columna 'valor_local'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN valor_local REAL")
-            conn.commit()
-        if 'hipotecado_local' not in columnas:
-            print("Migrando DB: Agregando columna 'hipotecado_local'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN hipotecado_local TEXT")
-            conn.commit()
-            
-        if 'score_buro' not in columnas:
-            print("Migrando DB: Agregando columna 'score_buro'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN score_buro INTEGER")
-            conn.commit()
-            print("Migración completada new fields.")
-            
-        if 'egresos' not in columnas:
-            print("Migrando DB: Agregando columna 'egresos'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN egresos REAL")
-            conn.commit()
-            
-        if 'total_disponible' not in columnas:
-            print("Migrando DB: Agregando columna 'total_disponible'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN total_disponible REAL")
-            conn.commit()
-
-        if 'valor_apertura' not in columnas:
-            print("Migrando DB: Agregando columna 'valor_apertura'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN valor_apertura REAL")
-            conn.commit()
-
-        if 'fecha_registro' not in columnas:
-            print("Migrando DB: Agregando columna 'fecha_registro'...")
-            cursor.execute("ALTER TABLE Clientes ADD COLUMN fecha_registro TEXT")
-            conn.commit()
-
-        # Migración Usuarios
-        cols_user = get_column_names(cursor, 'Usuarios')
-        if 'clave_hash' not in cols_user:
-            if 'clave' in cols_user:
-                print("Migrando DB: Renombrando 'clave' a 'clave_hash' en Usuarios...")
-                cursor.execute("ALTER TABLE Usuarios RENAME COLUMN clave TO clave_hash")
-            else:
-                print("Migrando DB: Agregando 'clave_hash' a Usuarios...")
-                cursor.execute("ALTER TABLE Usuarios ADD COLUMN clave_hash TEXT")
-            conn.commit()
-        if 'estado' not in cols_user:
-            print("Migrando DB: Agregando 'estado' a Usuarios...")
-            cursor.execute("ALTER TABLE Usuarios ADD COLUMN estado INTEGER DEFAULT 1")
-            conn.commit()
-        if 'rol' not in cols_user:
-            print("Migrando DB: Agregando 'rol' a Usuarios...")
-            cursor.execute("ALTER TABLE Usuarios ADD COLUMN rol TEXT")
-            cursor.execute("UPDATE Usuarios SET rol = 'Administrador' WHERE nivel_acceso = 1")
-            cursor.execute("UPDATE Usuarios SET rol = 'Usuario' WHERE nivel_acceso = 2")
-            conn.commit()
-
-        # Tabla Auditoria
-        if not check_table_exists(cursor, 'Auditoria'):
-            print("Migrando DB: Creando tabla 'Auditoria'...")
-            cursor.execute(f"""
-                CREATE TABLE Auditoria (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    id_usuario TEXT,
-                    accion TEXT,
-                    id_cliente TEXT,
-                    detalles TEXT,
-                    timestamp TEXT
-                )
-            """)
-            conn.commit()
-            
-        # Tabla Caja - MIGRACIÓN FECHA CONTRATO
-        cols_caja = get_column_names(cursor, 'Caja')
-        if 'fecha_contrato' not in cols_caja:
-            print("Migrando DB: Agregando columna 'fecha_contrato' a Caja...")
-            cursor.execute("ALTER TABLE Caja ADD COLUMN fecha_contrato TEXT")
-            conn.commit()
-           # Verificar si existe la tabla Documentos
-        if not check_table_exists(cursor, 'Documentos'):
-            print("Migrando DB: Creando tabla 'Documentos'...")
-            cursor.execute(f"""
-                CREATE TABLE Documentos (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT NOT NULL,
-                    nombre_archivo TEXT NOT NULL,
-                    tipo_documento TEXT,
-                    ruta_archivo TEXT NOT NULL,
-                    fecha_subida TEXT NOT NULL,
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-            print("Tabla 'Documentos' creada exitosamente.")
-
-        # Verificar si existe la tabla Microcreditos
-        if not check_table_exists(cursor, 'Microcreditos'):
-            print("Migrando DB: Creando tabla 'Microcreditos'...")
-            cursor.execute(f"""
-                CREATE TABLE Microcreditos (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT NOT NULL,
-                    ruc TEXT,
-                    observaciones TEXT,
-                    observaciones_info TEXT,
-                    status TEXT,
-                    sub_status TEXT,
-                    
-                    ref1_fecha TEXT, ref1_hora TEXT, ref1_nombre TEXT, ref1_telefono TEXT,
-                    ref1_relacion TEXT, ref1_tiempo_conocer TEXT, ref1_direccion TEXT,
-                    ref1_tipo_vivienda TEXT, ref1_cargas TEXT, ref1_patrimonio TEXT, ref1_responsable TEXT,
-
-                    ref2_fecha TEXT, ref2_hora TEXT, ref2_nombre TEXT, ref2_telefono TEXT,
-                    ref2_relacion TEXT, ref2_tiempo_conocer TEXT, ref2_direccion TEXT,
-                    ref2_tipo_vivienda TEXT, ref2_cargas TEXT, ref2_patrimonio TEXT, ref2_responsable TEXT,
-                    
-                    fecha_comite TEXT, fecha_desembolsado TEXT, fecha_negado TEXT, fecha_desistimiento TEXT,
-
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-            print("Tabla 'Microcreditos' creada exitosamente.")
-        
-        # Tabla Caja
-        if not check_table_exists(cursor, 'Caja'):
-            print("Migrando DB: Creando tabla 'Caja'...")
-            cursor.execute(f"""
-                CREATE TABLE Caja (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    fecha_hora TEXT,
-                    cedula TEXT,
-                    ruc TEXT,
-                    nombres_completos TEXT,
-                    email TEXT,
-                    direccion TEXT,
-                    telefono TEXT,
-                    estado_civil TEXT,
-                    asesor TEXT,
-                    buro_credito TEXT,
-                    buro_archivo_ruta TEXT,
-                    valor_apertura REAL,
-                    numero_apertura TEXT,
-                    estado_impreso TEXT DEFAULT 'Pendiente',
-                    observaciones TEXT,
-                    fecha_contrato TEXT
-                )
-            """)
-            conn.commit()
-        
-        # Verificar columnas críticas en Clientes si no están
-        cols = get_column_names(cursor, 'Clientes')
-        missing_cols = []
-        for c in ['fecha_contrato', 'score_buro', 'ingresos_mensuales_2', 'egresos', 'fecha_registro']:
-            if c not in cols and c != 'fecha_contrato': # fecha_contrato is in Caja usually, but user asked for checks
-                pass 
-                # Already handled in previous block, just double checking logic flows
-
-        # --- OPTIMIZACIÓN: ÍNDICES ---
-        print("Optimizando DB: Verificando Índices...")
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_cedula ON Clientes(cedula)")
-            # cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON Clientes(nombres)") # Removed to prevent PG exception
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_caja_cedula ON Caja(cedula)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_micro_cedula ON Microcreditos(cedula_cliente)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_docs_cedula ON Documentos(cedula_cliente)")
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Nota sobre índices: {e}")
-
-        # Migración Intermediacion Observaciones
-        cols_inter = get_column_names(cursor, 'Intermediacion_Detalles')
-        new_obs_cols = [
-            'obs_dis_temp', 'obs_dis_reg', 'obs_pat_1', 'obs_pat_2', 
-            'obs_inmueble', 'obs_ruc', 'obs_declaraciones', 'obs_estados_cta',
-            'fecha_cita', 'informe_cita',
-            'chk_precal', 'desc_precal',
-            'chk_aprob', 'desc_aprob',
-            'fecha_desembolso_inter',
-            'chk_informe', 'desc_informe'
-        ]
-        
-        if check_table_exists(cursor, 'Intermediacion_Detalles'):
-            for col in new_obs_cols:
-                if col not in cols_inter:
-                    print(f"Migrando DB: Agregando columna '{col}' a Intermediacion_Detalles...")
-                    cursor.execute(f"ALTER TABLE Intermediacion_Detalles ADD COLUMN {col} TEXT")
-            conn.commit()
-
-        # Migración Usuario Admin -> Paul
-        cursor.execute("SELECT id FROM Usuarios WHERE usuario='admin'")
-        admin_user = cursor.fetchone()
-        if admin_user:
-            print("Migrando usuario admin a Paul...")
-            new_hash = generar_hash('cyberpol2022')
-            cursor.execute("UPDATE Usuarios SET usuario=%s, clave_hash=%s WHERE id=%s", ('Paul', new_hash, admin_user[0]))
-            conn.commit()
-            print("Usuario actualizado.")
-
-        # Migración PagosBuro - Nuevas columnas para métodos de pago
-        if check_table_exists(cursor, 'PagosBuro'):
-            cols_pb = get_column_names(cursor, 'PagosBuro')
-            if 'metodo' not in cols_pb:
-                print("Migrando DB: Agregando 'metodo' a PagosBuro...")
-                cursor.execute("ALTER TABLE PagosBuro ADD COLUMN metodo TEXT")
-            if 'detalles' not in cols_pb:
-                print("Migrando DB: Agregando 'detalles' a PagosBuro...")
-                cursor.execute("ALTER TABLE PagosBuro ADD COLUMN detalles TEXT")
-            conn.commit()
-
+        aplicar_migraciones(db_manager)
     except Exception as e: 
-        conn.rollback()
         import sys
         if 'streamlit' in sys.modules:
             print(f"Error Migración Streamlit: {e}")
@@ -717,11 +339,13 @@ def migrar_db():
             # MessageBox para alertar si falla la integridad crítica
             try: messagebox.showerror("Error Crítico de Integridad", f"Fallo al verificar/reparar base de datos:\n{e}")
             except: pass
-    finally: db_manager.release_connection(conn)
 
-crear_tablas()
 migrar_db()
 
+# Historial del tablero: la instantánea del día queda en KpiDiario aunque nadie abra el tablero
+if db_manager:
+    kpis.registrar_dia_en_fondo(db_manager)
+
 # --- UTILIDADES DE FORMATO ---
 
 def limpiar_moneda(valor_str):
@@ -810,7 +434,7 @@ def guardar_cliente(*args):
      ing_str_2, fuente_ing_2, score_buro_str, egresos_str) = args
 
     val = validar_datos(*args)
-    if val is not True: return False, val
+    if val is not True: return False, val, None
     
     ingresos = limpiar_moneda(ing_str)
     ingresos_2 = limpiar_moneda(ing_str_2)
@@ -830,9 +454,9 @@ def guardar_cliente(*args):
         try:
             score_buro = int(score_buro_str)
             if score_buro < 1 or score_buro > 999:
-                return False, "Score Buró debe estar entre 1 y 999"
+                return False, "Score Buró debe estar entre 1 y 999", None
         except ValueError:
-            return False, "Score Buró debe ser un número"
+            return False, "Score Buró debe ser un número", None
     
     try:
         with db_connection() as (conn, cursor):
@@ -851,19 +475,16 @@ def guardar_cliente(*args):
                   cart, val_cart, dem, val_dem, just, det_just,
                   casa_val, valor_casa, hip_casa, local_val, valor_local, hip_local,
                   ingresos_2, fuente_ing_2, score_buro, egresos, total_disponible))
+            # Fila guardada (misma transacción) para actualizar solo ese item de la grilla
+            cursor.execute("SELECT * FROM Clientes WHERE cedula = %s", (cedula,))
+            fila = cursor.fetchone()
             # Commit is handled by context manager
             
+        directorio_clientes.actualizar(cedula=cedula)
         registrar_auditoria("Guardar Cliente", id_cliente=cedula, detalles=f"Cliente {nombre} guardado exitosamente.")
-        return True, "Guardado exitosamente."
-    except sqlite3.IntegrityError: return False, "Cédula ya existe."
-    except Exception as e: return False, f"Error: {e}"
-
-def consultar_clientes():
-    conn, cursor = conectar_db()
-    try:
-        cursor.execute("SELECT * FROM Clientes ORDER BY apertura ASC")
-        return cursor.fetchall()
-    finally: db_manager.release_connection(conn)
+        return True, "Guardado exitosamente.", fila
+    except sqlite3.IntegrityError: return False, "Cédula ya existe.", None
+    except Exception as e: return False, f"Error: {e}", None
 
 def sincronizar_cliente_desde_caja(cedula, ruc, nombre, email, direccion, telefono, asesor, fecha_apertura, num_carpeta):
     """Sincroniza datos básicos desde Caja a Clientes (Insert o Update)."""
@@ -885,6 +506,7 @@ def sincronizar_cliente_desde_caja(cedula, ruc, nombre, email, direccion, telefo
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (cedula, ruc, nombre, email, direccion, telefono, asesor, num_carpeta, fecha_apertura))
         conn.commit()
+        directorio_clientes.actualizar(cedula=cedula)
     except Exception as e:
         try: messagebox.showerror("Error Sincronización", f"Error sincronizando cliente desde caja: {e}")
         except: pass
@@ -899,7 +521,7 @@ def actualizar_cliente(id_cliente, *args):
      ing_str_2, fuente_ing_2, score_buro_str, egresos_str) = args
 
     val = validar_datos(*args)
-    if val is not True: return False, val
+    if val is not True: return False, val, None
     
     ingresos = limpiar_moneda(ing_str)
     ingresos_2 = limpiar_moneda(ing_str_2)
@@ -919,9 +541,9 @@ def actualizar_cliente(id_cliente, *args):
         try:
             score_buro = int(score_buro_str)
             if score_buro < 1 or score_buro > 999:
-                return False, "Score Buró debe estar entre 1 y 999"
+                return False, "Score Buró debe estar entre 1 y 999", None
         except ValueError:
-            return False, "Score Buró debe ser un número"
+            return False, "Score Buró debe ser un número", None
     
     try:
         with db_connection() as (conn, cursor):
@@ -939,30 +561,28 @@ def actualizar_cliente(id_cliente, *args):
                   cart, val_cart, dem, val_dem, just, det_just,
                   casa_val, valor_casa, hip_casa, local_val, valor_local, hip_local,
                   ingresos_2, fuente_ing_2, score_buro, egresos, total_disponible, id_cliente))
+            cursor.execute("SELECT * FROM Clientes WHERE id = %s", (id_cliente,))
+            fila = cursor.fetchone()
             # Commit handled by CM
             
+        directorio_clientes.actualizar(id_cliente=id_cliente)
         registrar_auditoria("Actualizar Cliente", id_cliente=cedula, detalles=f"Cliente {nombre} actualizado.")
-        return True, "Actualizado correctamente."
-    except Exception as e: return False, f"Error: {e}"
+        return True, "Actualizado correctamente.", fila
+    except Exception as e: return False, f"Error: {e}", None
 
 def eliminar_cliente(id_cliente):
-    if NIVEL_ACCESO not in ["Administrador", "admin"]: return False, "No tiene permisos para eliminar."
+    if NIVEL_ACCESO not in ["Administrador", "admin"]: return False, "No tiene permisos para eliminar.", None
     with db_connection() as (conn, cursor):
-        # Get cedula for audit before deleting
-        cursor.execute("SELECT cedula, nombre FROM Clientes WHERE id = %s", (id_cliente,))
+        # Get cedula for audit before deleting (la fila eliminada se retorna para la grilla)
+        cursor.execute("SELECT * FROM Clientes WHERE id = %s", (id_cliente,))
         res = cursor.fetchone()
         if res:
-            ced, nom = res
+            ced, nom = res['cedula'], res['nombre']
             cursor.execute("DELETE FROM Clientes WHERE id = %s", (id_cliente,))
             # Commit handled by CM
             registrar_auditoria("Eliminar Cliente", id_cliente=ced, detalles=f"Cliente {nom} eliminado.")
-    return True, "Eliminado"
-
-def buscar_clientes(termino):
-    with db_connection() as (conn, cursor):
-        t = '%' + termino + '%'
-        cursor.execute("SELECT * FROM Clientes WHERE nombres LIKE %s OR cedula LIKE %s OR ruc LIKE %s OR numero_carpeta LIKE %s ORDER BY apertura ASC", (t,t,t,t))
-        return cursor.fetchall()
+    directorio_clientes.quitar(id_cliente)
+    return True, "Eliminado", res
 
 # --- USUARIOS ---
 def crear_usuario_db(usuario, clave, rol="Usuario", nivel_acceso=2):
@@ -1091,31 +711,36 @@ def limpiar_campos_ui():
     
     e_cedula.focus()
 
-def mostrar_datos_tree():
-    for i in tree.get_children(): tree.delete(i)
-    data = consultar_clientes()
-    for row in data:
+def formatear_clientes(filas):
+    """Filas de Clientes (c.*) -> valores del tree de clientes, para la grilla virtual."""
+    visuales = []
+    for row in filas:
         ing_fmt = "$ " + formatear_float_str(row['ingresos_mensuales'] if row['ingresos_mensuales'] else 0)
         # ID, Cedula, Nombre, Telf, Ingresos, Sit.Financiera (CHECKBOX), Producto, N.Apertura(apertura), Asesor
         sf = "Terreno: Si" if ('terreno' in row.keys() and row['terreno'] == 1) else ""
         # MAPEO CORREGIDO: Apertura (UI) muestra el numero de carpeta guardado en 'apertura' (DB)
         visual = (row['id'], row['cedula'], row['nombres'], row['telefono'], ing_fmt, sf, row['producto'], row['apertura'], row['asesor'])
-        tree.insert('', tk.END, values=visual)
+        visuales.append((visual, ()))
+    return visuales
+
+def mostrar_datos_tree():
+    # Sin filtro: la grilla trae solo las páginas que se ven
+    grilla_clientes.filtrar(None)
 
 def accion_guardar():
-    exito, msg = guardar_cliente(*obtener_campos_ui())
+    exito, msg, fila = guardar_cliente(*obtener_campos_ui())
     if exito:
+        # Solo se agrega la fila nueva a la grilla (sin recargar la lista)
+        grilla_clientes.actualizar_fila(fila)
         try:
             top = e_cedula.winfo_toplevel()
             messagebox.showinfo("Éxito", msg, parent=top)
             limpiar_campos_ui()
-            mostrar_datos_tree()
             top.lift()
             top.focus_force()
         except:
             messagebox.showinfo("Éxito", msg)
             limpiar_campos_ui()
-            mostrar_datos_tree()
     else: 
         try:
             messagebox.showerror("Error", msg, parent=e_cedula.winfo_toplevel())
@@ -1133,17 +758,17 @@ def accion_actualizar():
         return
 
     try:
-        exito, msg = actualizar_cliente(ID_CLIENTE_SELECCIONADO, *obtener_campos_ui())
+        exito, msg, fila = actualizar_cliente(ID_CLIENTE_SELECCIONADO, *obtener_campos_ui())
         if exito:
+            # Se corrige solo el item editado; conserva posición y selección
+            grilla_clientes.actualizar_fila(fila)
             try:
                 top = e_cedula.winfo_toplevel()
                 messagebox.showinfo("Éxito", msg, parent=top)
-                mostrar_datos_tree()
                 top.lift()
                 top.focus_force()
             except:
                 messagebox.showinfo("Éxito", msg)
-                mostrar_datos_tree()
         else:
             try:
                 messagebox.showerror("Error", msg, parent=e_cedula.winfo_toplevel())
@@ -1165,8 +790,12 @@ def accion_eliminar():
         confirm = messagebox.askyesno("Borrar", "¿Confirma?")
         
     if confirm:
-        eliminar_cliente(ID_CLIENTE_SELECCIONADO)
-        limpiar_campos_ui(); mostrar_datos_tree()
+        ok, msg, _ = eliminar_cliente(ID_CLIENTE_SELECCIONADO)
+        if not ok:
+            messagebox.showerror("Error", msg)
+            return
+        grilla_clientes.quitar_fila(ID_CLIENTE_SELECCIONADO)
+        limpiar_campos_ui()
         try:
             e_cedula.winfo_toplevel().lift()
             e_cedula.winfo_toplevel().focus_force()
@@ -1175,34 +804,12 @@ def accion_eliminar():
 def accion_buscar():
     term = e_busqueda.get().strip()
     if not term: return mostrar_datos_tree()
-    res = buscar_clientes(term)
-    for run in res:
-        # Usar nombres de columna para evitar errores de índice
-        try:
-            ing_val = run['ingresos_mensuales'] if 'ingresos_mensuales' in run.keys() else run[12]
-            ing_fmt = "$ " + formatear_float_str(ing_val if ing_val else 0)
-            
-            sf = "Terreno: Si" if ('terreno' in run.keys() and run['terreno'] == 1) else ""
-            # ID, Cedula, Nombre, Telf, Ingresos, Sit.Financiera, Producto, N.Apertura, Asesor
-            # Usamos acceso por nombre si es posible, fallback a índices si no (pero el cursor DictCursor debería proveer nombres)
-            visual = (
-                run['id'], 
-                run['cedula'], 
-                run['nombres'], 
-                run['telefono'], 
-                ing_fmt, 
-                sf, 
-                run['producto'], 
-                run['apertura'], 
-                run['asesor']
-            )
-        except (KeyError, TypeError, IndexError):
-            # Fallback seguro si por alguna razón no vienen nombres (poco probable con DictCursor)
-            ing_fmt = "$ " + formatear_float_str(run[12] if len(run) > 12 else 0)
-            sf = "Terreno: Si" if (len(run) > 29 and run[29] == 1) else ""
-            visual = (run[0], run[1], run[3], run[7], ing_fmt, sf, run[19], run[17], run[15])
-            
-        tree.insert('', tk.END, values=visual)
+    # Texto sin dígitos: filtro por nombre indexado (trigramas / FTS5)
+    if not any(ch.isdigit() for ch in term):
+        grilla_clientes.filtrar(lambda cursor: filtro_por_nombre(db_manager, cursor, term))
+        return
+    t = '%' + term + '%'
+    grilla_clientes.filtrar("c.cedula LIKE %s OR c.ruc LIKE %s OR c.numero_carpeta LIKE %s", (t, t, t))
 
 def cargar_seleccion(event):
     global ID_CLIENTE_SELECCIONADO, btn_eliminar
@@ -1594,522 +1201,206 @@ def abrir_modulo_informes():
 
     ctk.CTkLabel(reports_frame, text="Reportes y Estadísticas", font=('Arial', 16, 'bold'), text_color="#465EA6").pack(pady=(20, 30))
 
+    # Formato de exportación (Excel, CSV o Parquet) para todos los botones
+    frame_formato = ctk.CTkFrame(reports_frame, fg_color="transparent")
+    frame_formato.pack(pady=(0, 5))
+    ctk.CTkLabel(frame_formato, text="Formato:", font=('Arial', 12, 'bold'), text_color="#465EA6").pack(side='left', padx=5)
+    formato_var = ctk.StringVar(value="Excel")
+    ctk.CTkSegmentedButton(frame_formato, values=list(exportador.FORMATOS), variable=formato_var).pack(side='left', padx=5)
+    # Solo cambios: filas nuevas (o modificadas, en Caja) desde la última exportación de este usuario (Caja, Cobros, Buró, Auditoría)
+    solo_cambios_var = ctk.BooleanVar(value=False)
+    ctk.CTkCheckBox(frame_formato, text="Solo cambios desde mi última exportación", variable=solo_cambios_var,
+                    font=('Arial', 12)).pack(side='left', padx=(20, 5))
+
     # Grid de botones para reportes
     btn_container = ctk.CTkFrame(reports_frame, fg_color="transparent")
     btn_container.pack(pady=10)
 
-    def exportar_caja_global_excel():
-        """Exporta todos los registros de la tabla Caja a Excel con formato."""
-        try:
-            with db_connection() as (conn, cursor):
-                cursor.execute("""
-                    SELECT 
-                        fecha_hora, cedula, nombres_completos, ruc, telefono, 
-                        email, direccion, valor_apertura, numero_apertura, 
-                        buro_credito, observaciones 
-                    FROM Caja
-                """)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay datos registrados en Caja para exportar.", parent=win_informes)
+    def exportar_con_avance(nombre, tarea, terminado):
+        """
+        Corre tarea(progreso, cancelado) en el pool con una ventana de avance y botón Cancelar.
+        El hilo de exportación solo actualiza `avance`; la UI lo lee con after().
+        """
+        win_avance = ctk.CTkToplevel(win_informes)
+        win_avance.title("Exportando")
+        win_avance.geometry("420x160")
+        win_avance.resizable(False, False)
+        win_avance.transient(win_informes)
+        ctk.CTkLabel(win_avance, text=f"Exportando {nombre}...", font=('Arial', 13, 'bold')).pack(pady=(15, 5))
+        barra = ctk.CTkProgressBar(win_avance, width=360)
+        barra.set(0)
+        barra.pack(pady=5)
+        lbl_avance = ctk.CTkLabel(win_avance, text="Contando registros...", font=('Arial', 11))
+        lbl_avance.pack()
+        cancelado = threading.Event()
+        btn_cancelar = ctk.CTkButton(win_avance, text="Cancelar", fg_color="#d9534f", hover_color="#c9302c", width=120,
+                                     command=lambda: (cancelado.set(), btn_cancelar.configure(state="disabled", text="Cancelando...")))
+        btn_cancelar.pack(pady=10)
+        win_avance.protocol("WM_DELETE_WINDOW", cancelado.set)
+
+        avance = {"filas": 0, "total": None}
+
+        def progreso(filas, total):
+            avance["filas"], avance["total"] = filas, total
+
+        def refrescar():
+            if not win_avance.winfo_exists():
                 return
+            if avance["total"]:
+                barra.set(avance["filas"] / avance["total"])
+                lbl_avance.configure(text=f"{avance['filas']:,} de {avance['total']:,} registros")
+            win_avance.after(200, refrescar)
+
+        def fin(resultado):
+            win_avance.destroy()
+            terminado(resultado)
+            win_informes.lift()
+            win_informes.focus_force()
+
+        def fallo(e):
+            win_avance.destroy()
+            if isinstance(e, exportador.ExportacionCancelada):
+                messagebox.showinfo("Información", "Exportación cancelada.", parent=win_informes)
+            else:
+                messagebox.showerror("Error", f"No se pudo exportar {nombre}: {e}", parent=win_informes)
+
+        ejecutor_db.ejecutar_tarea(win_informes, tarea, progreso, cancelado, al_terminar=fin, al_fallar=fallo)
+        refrescar()
+
+    def exportar_informe(clave, auditoria=None):
+        """Pide el archivo y exporta el informe por tramos en segundo plano, en el formato elegido."""
+        informe = informes.INFORMES[clave]
+        formato = formato_var.get()
+        extension = exportador.FORMATOS[formato]
+        solo_cambios = solo_cambios_var.get()
+        if solo_cambios and not informe.marca:
+            messagebox.showinfo("Información", f"El reporte de {informe.nombre} no admite exportar solo cambios; se exportará completo.", parent=win_informes)
+            solo_cambios = False
+        # Si el programador nocturno ya lo generó, se ofrece ese archivo (copia inmediata) o regenerar
+        previo = None if solo_cambios else informes_programados.ultimo_generado(clave, formato)
+        if previo:
+            usar = messagebox.askyesnocancel("Reporte pre-generado", f"Hay un reporte de {informe.nombre} generado el {previo[1]:%d/%m/%Y %H:%M}.\n\nSí: usar ese archivo (inmediato)\nNo: regenerarlo ahora con los datos actuales", parent=win_informes)
+            if usar is None:
+                return
+            if not usar:
+                previo = None
+        sufijo = datetime.datetime.now().strftime('cambios_%Y%m%d_%H%M' if solo_cambios else '%Y%m%d')
+        if previo:
+            sufijo = previo[1].strftime('%Y%m%d')
+        filename = filedialog.asksaveasfilename(title=f"Guardar Reporte {informe.nombre}", defaultextension=extension, filetypes=[(f"Archivos {formato}", f"*{extension}")], initialfile=f"{informe.archivo}_{sufijo}", parent=win_informes)
+        if not filename:
+            return
+        if previo:
+            try:
+                shutil.copyfile(previo[0], filename)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo copiar el reporte: {e}", parent=win_informes)
+                return
+            messagebox.showinfo("Éxito", f"{informe.mensaje_ok}\nGenerado el {previo[1]:%d/%m/%Y %H:%M}.", parent=win_informes)
+            if auditoria:
+                registrar_auditoria(auditoria, detalles=f"Archivo: {os.path.basename(filename)}")
+            return
 
-            cols = ["Fecha de Registro", "Cédula", "Nombres y Apellidos", "RUC", "Teléfono", "Correo", "Dirección", "Valor Apertura ($)", "No. Apertura", "Buró de Crédito", "Observaciones"]
-            df = pd.DataFrame(rows, columns=cols)
-
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Global Caja", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Global_Caja_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Reporte Caja')
-                workbook  = writer.book
-                worksheet = writer.sheets['Reporte Caja']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#D7E4BC', 'border': 1})
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, len(value) + 5)
-                writer.close()
-                messagebox.showinfo("Éxito", f"Reporte global exportado correctamente.", parent=win_informes)
-                registrar_auditoria("Exportar Excel Global Caja", detalles=f"Archivo: {os.path.basename(filename)}")
-                win_informes.lift()
-                win_informes.focus_force()
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo generar el reporte: {e}", parent=win_informes)
-
-    def exportar_clientes_global_excel():
-        """Exporta la base completa de clientes a Excel."""
-        try:
-            with db_connection() as (conn, cursor):
-                cursor.execute("SELECT * FROM Clientes")
-                rows = cursor.fetchall()
-                cols_db = [desc[0] for desc in cursor.description]
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay clientes registrados.", parent=win_informes)
+        def terminado(resultado):
+            filas, anterior = resultado if solo_cambios else (resultado, None)
+            if not filas:
+                if solo_cambios and anterior:
+                    messagebox.showinfo("Información", f"No hay registros nuevos desde la última exportación ({anterior}).", parent=win_informes)
+                else:
+                    messagebox.showinfo("Información", informe.mensaje_vacio, parent=win_informes)
                 return
+            desde = f"\nRegistros nuevos desde {anterior}." if anterior else ""
+            messagebox.showinfo("Éxito", f"{informe.mensaje_ok}\n{filas:,} registros.{desde}", parent=win_informes)
+            if auditoria:
+                registrar_auditoria(auditoria, detalles=f"Archivo: {os.path.basename(filename)}")
+
+        if solo_cambios:
+            tarea = lambda progreso, cancelado: exportador.exportar_cambios(
+                db_manager, informe, filename, USUARIO_ACTIVO, progreso=progreso, cancelado=cancelado)
+        else:
+            tarea = lambda progreso, cancelado: exportador.exportar(
+                db_manager, informe, filename, progreso=progreso, cancelado=cancelado)
+        exportar_con_avance(informe.nombre, tarea, terminado)
+
+    def exportar_paquete_informes():
+        """Todos los informes en un solo libro de Excel, leídos de la misma instantánea de la base."""
+        filename = filedialog.asksaveasfilename(title="Guardar Paquete de Informes", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Paquete_Informes_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
+        if not filename:
+            return
 
-            df = pd.DataFrame(rows, columns=cols_db)
-            mapping = {
-                'id': 'ID', 'cedula': 'Cédula', 'ruc': 'RUC', 'nombre': 'Nombres y Apellidos',
-                'estado_civil': 'Estado Civil', 'cargas_familiares': 'Cargas Familiares',
-                'email': 'Email', 'telefono': 'Teléfono', 'direccion': 'Dirección Domicilio',
-                'parroquia': 'Parroquia', 'tipo_vivienda': 'Tipo Vivienda',
-                'referencia_vivienda': 'Referencia Vivienda', 'profesion': 'Profesión/Actividad',
-                'ingresos_mensuales': 'Ingresos Principal ($)', 'ingresos_mensuales_2': 'Ingresos Secundarios ($)',
-                'egresos': 'Egresos Mensuales ($)', 'total_disponible': 'Total Disponible ($)',
-                'referencia1': 'Referencia Personal 1', 'referencia2': 'Referencia Personal 2',
-                'asesor': 'Asesor Asignado', 'apertura': 'Número de Carpeta', 
-                'fecha nacimiento': 'Fecha de Nacimiento',
-                'producto': 'Producto', 'observaciones': 'Observaciones Generales',
-                'cartera castigada': 'Cartera', 'valor cartera': 'Valor Cartera ($)',
-                'demanda judicial': 'Demanda', 'valor demanda': 'Valor Demanda ($)',
-                'problemas justicia': 'Justicia', 'detalle justicia': 'Detalle Justicia',
-                'situacion_financiera': 'Situación Financiera', 'terreno': 'Tiene Terreno',
-                'valor_terreno': 'Valor Terreno ($)', 'hipotecado': 'Terreno Hipotecado',
-                'casa_dep': 'Tiene Casa/Dep', 'valor_casa_dep': 'Valor Casa/Dep ($)',
-                'hipotecado_casa_dep': 'Casa Hipotecada', 'local': 'Tiene Local',
-                'valor_local': 'Valor Local ($)', 'hipotecado_local': 'Local Hipotecado',
-                'score_buro': 'Score Buró', 'fecha_registro': 'Fecha de Apertura'
-            }
-            if 'numero_carpeta' in df.columns:
-                df.drop(columns=['numero_carpeta'], inplace=True)
-            df.rename(columns={k: v for k, v in mapping.items() if k in df.columns}, inplace=True)
-
-            filename = filedialog.asksaveasfilename(title="Guardar Base Completa", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Master_Base_Clientes_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Base Maestra')
-                workbook  = writer.book
-                worksheet = writer.sheets['Base Maestra']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#C6EFCE', 'border': 1})
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 15) + 2)
-                writer.close()
-                messagebox.showinfo("Éxito", "Exportación completada.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-        except Exception as e:
-            messagebox.showerror("Error", f"Error: {e}", parent=win_informes)
+        def terminado(filas):
+            if not filas:
+                messagebox.showinfo("Información", "No hay datos registrados para exportar.", parent=win_informes)
+                return
+            detalle = "\n".join(f"{informes.INFORMES[k].nombre}: {n:,}" for k, n in filas.items())
+            messagebox.showinfo("Éxito", f"Paquete de informes exportado correctamente.\n\n{detalle}", parent=win_informes)
+            registrar_auditoria("Exportar Paquete de Informes", detalles=f"Archivo: {os.path.basename(filename)}")
 
-    def exportar_cartera_excel():
-        """Exporta el reporte de Cartera con saldos y estados calculados."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        m.cedula_cliente,
-                        c.nombres,
-                        m.monto_aprobado,
-                        m.plazo_meses,
-                        m.valor_cuota,
-                        m.fecha_desembolso_real,
-                        COALESCE((SELECT SUM(p.valor_capital) FROM Pagos p WHERE p.cedula_cliente = m.cedula_cliente), 0) as capital_pagado,
-                        COALESCE((SELECT SUM(p.total_pagado) FROM Pagos p WHERE p.cedula_cliente = m.cedula_cliente), 0) as total_cash_paid
-                    FROM Microcreditos m
-                    LEFT JOIN Clientes c ON m.cedula_cliente = c.cedula
-                    WHERE m.sub_status = 'Desembolsado'
-                """
-                cursor.execute(query)
-                creditos = cursor.fetchall()
+        exportar_con_avance("Paquete de Informes", lambda progreso, cancelado: exportador.exportar_paquete(
+            db_manager, [informes.INFORMES[k] for k in informes.PAQUETE], filename, progreso=progreso, cancelado=cancelado), terminado)
 
-            if not creditos:
-                messagebox.showinfo("Información", "No hay créditos desembolsados para reporte.", parent=win_informes)
-                return
+    def exportar_caja_global_excel():
+        """Exporta todos los registros de la tabla Caja a Excel con formato."""
+        exportar_informe("caja", auditoria="Exportar Excel Global Caja")
 
-            rows_processed = []
-            for row in creditos:
-                cedula = row[0]
-                cliente = row[1] if row[1] else "Desconocido"
-                monto = row[2] if row[2] else 0.0
-                plazo = row[3] if row[3] else 0
-                cuota = row[4] if row[4] else 0.0
-                capital_pagado = row[6]
-                total_cash_paid = row[7]
-                
-                saldo_est = max(0.0, monto - capital_pagado)
-                
-                # Estado simple
-                estado = "Vigente"
-                if saldo_est <= 0.1:
-                    estado = "Pagado"
-                
-                dias_mora = 0 # Valor fijo por ahora
-
-                rows_processed.append({
-                    "Cédula": cedula,
-                    "Cliente": cliente,
-                    "Monto Crédito ($)": monto,
-                    "Plazo (Meses)": plazo,
-                    "Cuota ($)": cuota,
-                    "Total Pagado ($)": total_cash_paid,
-                    "Saldo Est. ($)": saldo_est,
-                    "Estado": estado,
-                    "Días Mora": dias_mora
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Cartera", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Cartera_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Cartera')
-                workbook  = writer.book
-                worksheet = writer.sheets['Cartera']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#9BC2E6', 'border': 1})
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 12) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Cartera exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
+    def exportar_clientes_global_excel():
+        """Exporta la base completa de clientes a Excel."""
+        exportar_informe("clientes")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar cartera: {e}", parent=win_informes)
+    def exportar_cartera_excel():
+        """Exporta el reporte de Cartera con saldos, estados y mora calculados."""
+        exportar_informe("cartera")
 
-    ctk.CTkButton(btn_container, text="📘 EXCEL CARTERA", command=exportar_cartera_excel, 
+    ctk.CTkButton(btn_container, text="📘 CARTERA", command=exportar_cartera_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#17a2b8", hover_color="#138496", height=50, width=250).grid(row=1, column=0, padx=20, pady=10)
 
     def exportar_microcredito_excel():
         """Exporta el reporte de Microcréditos completo."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        m.cedula_cliente,
-                        c.nombres,
-                        c.asesor,
-                        m.status,
-                        m.sub_status,
-                        m.monto_aprobado,
-                        m.plazo_meses,
-                        m.valor_cuota,
-                        m.fecha_desembolso_real,
-                        m.dia_pago,
-                        m.observaciones
-                    FROM Microcreditos m
-                    LEFT JOIN Clientes c ON m.cedula_cliente = c.cedula
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay microcréditos registrados para reporte.", parent=win_informes)
-                return
+        exportar_informe("microcredito")
 
-            rows_processed = []
-            for row in rows:
-                # Normalización de datos
-                rs = list(row)
-                # Formatos de moneda y limpieza
-                if rs[5]: rs[5] = float(rs[5]) # Monto
-                if rs[7]: rs[7] = float(rs[7]) # Cuota
-                
-                rows_processed.append({
-                    "Cédula": rs[0],
-                    "Cliente": rs[1],
-                    "Asesor": rs[2],
-                    "Estado": rs[3],
-                    "Sub-Estado": rs[4],
-                    "Monto Aprobado ($)": rs[5],
-                    "Plazo (Meses)": rs[6],
-                    "Cuota ($)": rs[7],
-                    "Fecha Desembolso": rs[8],
-                    "Día de Pago": rs[9],
-                    "Observaciones": rs[10]
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Microcrédito", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Microcredito_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Microcredito')
-                workbook  = writer.book
-                worksheet = writer.sheets['Microcredito']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#FFD966', 'border': 1})
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 12) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Microcrédito exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar microcrédito: {e}", parent=win_informes)
-
-    ctk.CTkButton(btn_container, text="📒 EXCEL MICROCRÉDITO", command=exportar_microcredito_excel, 
+    ctk.CTkButton(btn_container, text="📒 MICROCRÉDITO", command=exportar_microcredito_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#F39C12", hover_color="#D68910", height=50, width=250).grid(row=1, column=1, padx=20, pady=10)
 
     def exportar_pagos_excel():
         """Exporta el reporte de Pagos/Cobros completo."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        p.fecha,
-                        p.cedula_cliente,
-                        c.nombres,
-                        p.cuota_nro,
-                        p.valor_capital,
-                        p.valor_interes,
-                        p.valor_mora,
-                        p.total_pagado,
-                        p.usuario
-                    FROM Pagos p
-                    LEFT JOIN Clientes c ON p.cedula_cliente = c.cedula
-                    ORDER BY p.id DESC
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay pagos registrados para reporte.", parent=win_informes)
-                return
-
-            rows_processed = []
-            for row in rows:
-                rs = list(row)
-                # Formatos de moneda
-                if rs[4]: rs[4] = float(rs[4]) # Capital
-                if rs[5]: rs[5] = float(rs[5]) # Interes
-                if rs[6]: rs[6] = float(rs[6]) # Mora
-                if rs[7]: rs[7] = float(rs[7]) # Total
-
-                rows_processed.append({
-                    "Fecha": rs[0],
-                    "Cédula": rs[1],
-                    "Cliente": rs[2] if rs[2] else "Desconocido",
-                    "Nro. Cuota": rs[3],
-                    "Capital ($)": rs[4],
-                    "Interés ($)": rs[5],
-                    "Mora ($)": rs[6],
-                    "Total Pagado ($)": rs[7],
-                    "Usuario": rs[8]
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Pagos", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Pagos_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Pagos')
-                workbook  = writer.book
-                worksheet = writer.sheets['Pagos']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#E2EFDA', 'border': 1})
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 12) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Pagos exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar pagos: {e}", parent=win_informes)
+        exportar_informe("pagos")
 
     def exportar_buro_excel():
         """Exporta el reporte de Pagos Buró."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        b.fecha,
-                        b.cedula_cliente,
-                        b.nombre_cliente,
-                        b.monto,
-                        b.usuario
-                    FROM PagosBuro b
-                    ORDER BY b.id DESC
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay cobros de buró registrados para reporte.", parent=win_informes)
-                return
-
-            rows_processed = []
-            for row in rows:
-                rs = list(row)
-                if rs[3]: rs[3] = float(rs[3]) # Monto
-
-                rows_processed.append({
-                    "Fecha": rs[0],
-                    "Cédula": rs[1],
-                    "Cliente": rs[2],
-                    "Monto ($)": rs[3],
-                    "Usuario": rs[4]
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Buró", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Buro_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Buro')
-                workbook  = writer.book
-                worksheet = writer.sheets['Buro']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#D7BDE2', 'border': 1})
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 12) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Buró exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar buró: {e}", parent=win_informes)
+        exportar_informe("buro")
 
-    ctk.CTkButton(btn_container, text="💳 EXCEL BURÓ", command=exportar_buro_excel, 
+    ctk.CTkButton(btn_container, text="💳 BURÓ", command=exportar_buro_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#6f42c1", hover_color="#5a32a3", height=50, width=250).grid(row=1, column=2, padx=20, pady=10)
 
-    ctk.CTkButton(btn_container, text="💰 EXCEL COBROS", command=exportar_pagos_excel, 
+    ctk.CTkButton(btn_container, text="💰 COBROS", command=exportar_pagos_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#28a745", hover_color="#218838", height=50, width=250).grid(row=0, column=2, padx=20, pady=10)
 
-    ctk.CTkButton(btn_container, text="📊 EXCEL CAJA GLOBAL", command=exportar_caja_global_excel, 
+    ctk.CTkButton(btn_container, text="📊 CAJA GLOBAL", command=exportar_caja_global_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#28a745", hover_color="#218838", height=50, width=250).grid(row=0, column=0, padx=20, pady=10)
     
-    ctk.CTkButton(btn_container, text="🟢 EXCEL BASE MAESTRA", command=exportar_clientes_global_excel, 
+    ctk.CTkButton(btn_container, text="🟢 BASE MAESTRA", command=exportar_clientes_global_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#28a745", hover_color="#218838", height=50, width=250).grid(row=0, column=1, padx=20, pady=10)
     
     def exportar_intermediacion_excel():
         """Exporta el reporte de Intermediación."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        i.cedula_cliente,
-                        c.nombres,
-                        i.fecha_cita,
-                        i.informe_cita,
-                        i.fecha_desembolso_inter,
-                        i.desc_informe
-                    FROM Intermediacion_Detalles i
-                    LEFT JOIN Clientes c ON i.cedula_cliente = c.cedula
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay registros de intermediación para reporte.", parent=win_informes)
-                return
-
-            rows_processed = []
-            for row in rows:
-                rs = list(row)
-                rows_processed.append({
-                    "Cédula": rs[0],
-                    "Cliente": rs[1],
-                    "Fecha Cita": rs[2],
-                    "Informe Cita": rs[3],
-                    "Fecha Desembolso": rs[4],
-                    "Descripción Informe": rs[5]
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Intermediación", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Intermediacion_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Intermediacion')
-                workbook  = writer.book
-                worksheet = writer.sheets['Intermediacion']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#AED6F1', 'border': 1}) # Azul claro
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 15) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Intermediación exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar intermediación: {e}", parent=win_informes)
+        exportar_informe("intermediacion")
 
     def exportar_rehabilitacion_excel():
         """Exporta el reporte de Rehabilitación."""
-        try:
-            with db_connection() as (conn, cursor):
-                query = """
-                    SELECT
-                        r.cedula_cliente,
-                        c.nombres,
-                        r.fecha_inicio,
-                        r.terminos,
-                        r.resultado,
-                        r.finalizado
-                    FROM Rehabilitacion r
-                    LEFT JOIN Clientes c ON r.cedula_cliente = c.cedula
-                """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-            if not rows:
-                messagebox.showinfo("Información", "No hay registros de rehabilitación para reporte.", parent=win_informes)
-                return
+        exportar_informe("rehabilitacion")
 
-            rows_processed = []
-            for row in rows:
-                rs = list(row)
-                rows_processed.append({
-                    "Cédula": rs[0],
-                    "Cliente": rs[1],
-                    "Fecha Inicio": rs[2],
-                    "Términos": rs[3],
-                    "Resultado": rs[4],
-                    "Finalizado": "Sí" if rs[5] == 1 else "No"
-                })
-
-            df = pd.DataFrame(rows_processed)
-            
-            filename = filedialog.asksaveasfilename(title="Guardar Reporte Rehabilitación", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], initialfile=f"Reporte_Rehabilitacion_{datetime.datetime.now().strftime('%Y%m%d')}", parent=win_informes)
-            
-            if filename:
-                writer = pd.ExcelWriter(filename, engine='xlsxwriter')
-                df.to_excel(writer, index=False, sheet_name='Rehabilitacion')
-                workbook  = writer.book
-                worksheet = writer.sheets['Rehabilitacion']
-                header_format = workbook.add_format({'bold': True, 'bg_color': '#F5B7B1', 'border': 1}) # Rojo claro
-                
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    worksheet.set_column(col_num, col_num, max(len(str(value)), 15) + 2)
-                    
-                writer.close()
-                messagebox.showinfo("Éxito", "Reporte de Rehabilitación exportado correctamente.", parent=win_informes)
-                win_informes.lift()
-                win_informes.focus_force()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar rehabilitación: {e}", parent=win_informes)
-
-    ctk.CTkButton(btn_container, text="🤝 EXCEL INTERMEDIACIÓN", command=exportar_intermediacion_excel, 
+    ctk.CTkButton(btn_container, text="🤝 INTERMEDIACIÓN", command=exportar_intermediacion_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#3498DB", hover_color="#2980B9", height=50, width=250).grid(row=2, column=0, padx=20, pady=10)
 
-    ctk.CTkButton(btn_container, text="🏥 EXCEL REHABILITACIÓN", command=exportar_rehabilitacion_excel, 
+    ctk.CTkButton(btn_container, text="🏥 REHABILITACIÓN", command=exportar_rehabilitacion_excel, 
                   font=('Arial', 14, 'bold'), fg_color="#E74C3C", hover_color="#C0392B", height=50, width=250).grid(row=2, column=1, padx=20, pady=10)
 
+    ctk.CTkButton(btn_container, text="📦 PAQUETE (EXCEL)", command=exportar_paquete_informes, 
+                  font=('Arial', 14, 'bold'), fg_color="#1860C3", hover_color="#465EA6", height=50, width=250).grid(row=2, column=2, padx=20, pady=10)
+
+    ctk.CTkButton(btn_container, text="🗂️ AUDITORÍA", command=lambda: exportar_informe("auditoria"), 
+                  font=('Arial', 14, 'bold'), fg_color="#7F8C8D", hover_color="#626567", height=50, width=250).grid(row=3, column=0, padx=20, pady=10)
+
     # Logo (Panel Derecho - Estandarizado con Documentos y Clientes)
     try:
         img = Image.open("Logo Face.jpg")
@@ -2208,43 +1499,41 @@ def abrir_modulo_documentos():
     except: pass
 
     def buscar_cliente_auto(event=None):
-        global cedula_actual
         ced = e_cedula_buscar.get().strip()
         ruc = e_ruc_buscar.get().strip()
         nom = e_nombre_cliente.get().strip()
-        criteria = None; val = None
-        if len(ced) == 10 and ced.isdigit(): criteria = "cedula"; val = ced
-        elif len(ruc) >= 10 and ruc.isdigit(): criteria = "ruc"; val = ruc
-        elif len(nom) >= 3: criteria = "nombre"; val = nom
-        if not criteria: return
+        # Directorio en memoria; lo que falte se consulta en segundo plano
+        resolver_cliente(e_nombre_cliente, ced, ruc, nom,
+                         lambda criteria, res: mostrar_cliente_docs(criteria, res, event),
+                         lambda: buscar_cliente_auto(event))
 
-        conn, cursor = conectar_db()
-        res = None
-        if criteria == "cedula": cursor.execute("SELECT nombre, cedula, ruc FROM Clientes WHERE cedula = %s", (val,))
-        elif criteria == "ruc": cursor.execute("SELECT nombre, cedula, ruc FROM Clientes WHERE ruc = %s", (val,))
-        elif criteria == "nombre": cursor.execute("SELECT nombres, cedula, ruc FROM Clientes WHERE nombres LIKE %s LIMIT 1", (f"%{val}%",))
-        res = cursor.fetchone()
-        db_manager.release_connection(conn)
+    def mostrar_cliente_docs(criteria, res, event=None):
+        global cedula_actual
+        if not criteria: return
         
         if res:
             widget = event.widget if event else None
-            # res: 0:nombre, 1:cedula, 2:ruc
             if criteria != "nombre" or (widget != e_nombre_cliente):
-                e_nombre_cliente.delete(0, tk.END); e_nombre_cliente.insert(0, res[0])
+                e_nombre_cliente.delete(0, tk.END); e_nombre_cliente.insert(0, res.nombres or "")
             if criteria != "ruc" or (widget != e_ruc_buscar):
                 e_ruc_buscar.delete(0, tk.END); 
-                if res[2]: e_ruc_buscar.insert(0, res[2])
+                if res.ruc: e_ruc_buscar.insert(0, res.ruc)
             if criteria != "cedula" or (widget != e_cedula_buscar):
-                 e_cedula_buscar.delete(0, tk.END); e_cedula_buscar.insert(0, res[1])
-            cedula_actual = res[1]
+                 e_cedula_buscar.delete(0, tk.END); e_cedula_buscar.insert(0, res.cedula)
+            cedula_actual = res.cedula
             cargar_documentos(cedula_actual)
         else:
             cedula_actual = None
             limpiar_lista_documentos()
     
-    e_cedula_buscar.bind('<KeyRelease>', buscar_cliente_auto)
-    e_ruc_buscar.bind('<KeyRelease>', buscar_cliente_auto)
-    e_nombre_cliente.bind('<KeyRelease>', buscar_cliente_auto)
+    e_cedula_buscar.bind('<KeyRelease>', con_espera(e_cedula_buscar, buscar_cliente_auto))
+    e_ruc_buscar.bind('<KeyRelease>', con_espera(e_ruc_buscar, buscar_cliente_auto))
+    e_nombre_cliente.bind('<KeyRelease>', con_espera(e_nombre_cliente, buscar_cliente_auto))
+
+    def elegir_cliente_docs(entrada):
+        e_cedula_buscar.delete(0, tk.END); e_cedula_buscar.insert(0, entrada.cedula)
+        buscar_cliente_auto()
+    activar_sugerencias(e_nombre_cliente, elegir_cliente_docs)
 
 def limpiar_lista_documentos():
     for item in tree_docs.get_children():
@@ -2500,6 +1789,23 @@ def login_fn(app, u_entry, p_entry):
         messagebox.showerror("Error de Sistema", f"No se pudo completar el inicio de sesión:\n{str(e)}")
 
 
+def vigilar_replicacion(ventana, intervalo_ms=30000):
+    """Avisa las escrituras offline que quedaron en CONFLICTO al replicar (no se aplicaron en el servidor)."""
+    try:
+        if not ventana.winfo_exists():
+            return
+    except tk.TclError:
+        return
+    if db_manager:
+        n = db_manager.tomar_conflictos()
+        if n:
+            detalle = "\n".join(f"{f[0]}  {f[1]}  {f[2] or ''}: {f[3]}" for f in db_manager.diario.conflictos(min(n, 10)))
+            messagebox.showwarning(
+                "Replicación offline",
+                f"{n} escrituras hechas sin conexión no se pudieron aplicar en el servidor "
+                f"y deben registrarse de nuevo:\n\n{detalle}", parent=ventana)
+    ventana.after(intervalo_ms, vigilar_replicacion, ventana, intervalo_ms)
+
 def abrir_menu_principal(app_root=None):
     global menu_app
     
@@ -2525,6 +1831,7 @@ def abrir_menu_principal(app_root=None):
     # menu_app.state('zoomed') 
     menu_app.configure(fg_color="#0b162c") # Dark blue to match background image
     menu_app.after(100, lambda: menu_app.state('zoomed')) # Increased delay slightly
+    menu_app.after(5000, vigilar_replicacion, menu_app)
 
     # Configuración Grid para centrado total
     menu_app.grid_columnconfigure(0, weight=1)
@@ -2750,7 +2057,7 @@ def abrir_modulo_clientes():
     global c_vivienda, e_ref_vivienda, e_profesion, e_ingresos, e_ref1, e_ref2, e_asesor, e_apertura, e_carpeta, e_nacimiento
     global t_obs, var_cartera, var_demanda, var_justicia, btn_accion, btn_cancelar, btn_eliminar
     global cb_cartera, cb_demanda, cb_justicia, cb_terreno, cb_casa, cb_local
-    global e_busqueda, tree, e_val_cartera, e_val_demanda, e_det_justicia, var_terreno, e_valor_terreno
+    global e_busqueda, tree, grilla_clientes, e_val_cartera, e_val_demanda, e_det_justicia, var_terreno, e_valor_terreno
     global lbl_dolar_cartera, lbl_dolar_demanda
     global c_hipotecado, f_terreno_hip
     global var_casa, e_valor_casa, c_hip_casa, f_casa_hip
@@ -3106,11 +2413,11 @@ def abrir_modulo_clientes():
             return
 
         if messagebox.askyesno("Confirmar Eliminación", "¿Está seguro de eliminar este cliente permanentemente?\nEsta acción no se puede deshacer."):
-            ok, msg = eliminar_cliente(ID_CLIENTE_SELECCIONADO)
+            ok, msg, _ = eliminar_cliente(ID_CLIENTE_SELECCIONADO)
             if ok:
+                grilla_clientes.quitar_fila(ID_CLIENTE_SELECCIONADO)
                 messagebox.showinfo("Éxito", msg)
                 limpiar_campos_ui()
-                mostrar_datos_tree()
             else:
                 messagebox.showerror("Error", msg)
 
@@ -3158,7 +2465,7 @@ def abrir_modulo_clientes():
     ctk.CTkLabel(fb, text="🔎 Buscar Cliente (Cédula/RUC/Nombre):", font=('Arial', 11, 'bold'), text_color="black").pack(side='left')
     e_busqueda = crear_entry(fb)
     e_busqueda.pack(side='left', fill='x', expand=True, padx=10)
-    e_busqueda.bind('<KeyRelease>', lambda e: buscar_clientes())
+    e_busqueda.bind('<KeyRelease>', con_espera(e_busqueda, lambda e: accion_buscar(), 300))
 
     ft = ctk.CTkFrame(mid, fg_color="white", corner_radius=10, border_width=1, border_color="#CCCCCC")
     ft.pack(fill='both', expand=True)
@@ -3170,7 +2477,6 @@ def abrir_modulo_clientes():
     # Scrollbar
     sy = ttk.Scrollbar(ft, orient='vertical', command=tree.yview)
     sy.pack(side='right', fill='y')
-    tree.configure(yscrollcommand=sy.set)
     tree.pack(fill='both', expand=True)
 
     tree.heading("ID", text="ID"); tree.column("ID", width=30)
@@ -3183,10 +2489,25 @@ def abrir_modulo_clientes():
     tree.heading("N. Apertura", text="N. Apertura"); tree.column("N. Apertura", width=80)
     tree.heading("Asesor", text="Asesor"); tree.column("Asesor", width=80)
 
+    # Grilla virtual: páginas por clave, orden y filtro en el servidor
+    grilla_clientes = GrillaVirtual(
+        tree, ejecutor_db, "Clientes c", "c.*", clave="c.id",
+        # (expresión SQL, la misma en Python) para ubicar filas guardadas sin recargar
+        ordenables={
+            "ID": ("c.id", lambda f: f['id']),
+            "Cédula": ("COALESCE(c.cedula, '')", lambda f: f['cedula'] or ''),
+            "Nombre": ("COALESCE(c.nombres, c.nombre, '')", lambda f: f['nombres'] or f['nombre'] or ''),
+            "Teléfono": ("COALESCE(c.telefono, '')", lambda f: f['telefono'] or ''),
+            "Producto": ("COALESCE(c.producto, '')", lambda f: f['producto'] or ''),
+            "N. Apertura": ("COALESCE(c.apertura, '')", lambda f: f['apertura'] or ''),
+            "Asesor": ("COALESCE(c.asesor, '')", lambda f: f['asesor'] or ''),
+        },
+        orden=("COALESCE(c.apertura, '')", False),
+        formatear=formatear_clientes, scrollbar=sy)
+
     tree.bind("<Double-1>", cargar_seleccion)
     tree.bind("<<TreeviewSelect>>", cargar_seleccion)
     mostrar_datos_tree()
-    mostrar_datos_tree()
     # app.mainloop() # Ya no es mainloop principal
 
 
@@ -3330,9 +2651,15 @@ def abrir_modulo_microcredito():
                     fecha_desembolso_real=%s, monto_aprobado=%s, tasa_interes=%s, plazo_meses=%s, valor_cuota=%s, dia_pago=%s
                     WHERE id=%s
                 """, (v_fec, v_mon, v_tas, v_pla, v_cuo, v_dia, id_micro_actual))
+                # Tabla de amortización (solo si el crédito está Desembolsado y aún no tiene cuotas pagadas)
+                n_cuotas = cuotas.generar(cursor, id_micro_actual)
                 conn.commit()
+                servicio_kpi.invalidar()
                 db_manager.release_connection(conn)
-                messagebox.showinfo("Guardado", "Detalles financieros guardados correctamente.", parent=t)
+                msg = "Detalles financieros guardados correctamente."
+                if n_cuotas:
+                    msg += f"\nTabla de amortización generada: {n_cuotas} cuotas."
+                messagebox.showinfo("Guardado", msg, parent=t)
                 t.destroy()
             except Exception as e:
                  messagebox.showerror("Error", f"Error al guardar: {e}", parent=t)
@@ -3402,17 +2729,22 @@ def abrir_modulo_microcredito():
     ctk.CTkLabel(sf_in, text="Cédula:", text_color="black").pack(side='left')
     e_cedula_micro = ctk.CTkEntry(sf_in, width=150, fg_color="white", text_color="black", border_color="grey")
     e_cedula_micro.pack(side='left', padx=5)
-    e_cedula_micro.bind('<KeyRelease>', buscar_micro_auto)
+    e_cedula_micro.bind('<KeyRelease>', con_espera(e_cedula_micro, buscar_micro_auto))
     
     ctk.CTkLabel(sf_in, text="RUC:", text_color="black").pack(side='left', padx=(15,0))
     e_ruc_micro = ctk.CTkEntry(sf_in, width=150, fg_color="white", text_color="black", border_color="grey")
     e_ruc_micro.pack(side='left', padx=5)
-    e_ruc_micro.bind('<KeyRelease>', buscar_micro_auto)
+    e_ruc_micro.bind('<KeyRelease>', con_espera(e_ruc_micro, buscar_micro_auto))
 
     ctk.CTkLabel(sf_in, text="Cliente:", text_color="black").pack(side='left', padx=(15,0))
     e_nombre_micro = ctk.CTkEntry(sf_in, width=350, fg_color="white", text_color="black", border_color="grey")
     e_nombre_micro.pack(side='left', padx=5)
-    e_nombre_micro.bind('<KeyRelease>', buscar_micro_auto)
+    e_nombre_micro.bind('<KeyRelease>', con_espera(e_nombre_micro, buscar_micro_auto))
+
+    def elegir_cliente_micro(entrada):
+        e_cedula_micro.delete(0, tk.END); e_cedula_micro.insert(0, entrada.cedula)
+        buscar_micro_auto()
+    activar_sugerencias(e_nombre_micro, elegir_cliente_micro)
 
     # NOTEBOOK (Pestañas) -> CTkTabview
     # Estilo mejorado: Botones más grandes, colores más vivos
@@ -4108,31 +3440,21 @@ def limpiar_form_micro():
 
 
 def buscar_micro_auto(event=None):
-    global cedula_micro_actual, id_micro_actual
-    
     ced = e_cedula_micro.get().strip()
     ruc = e_ruc_micro.get().strip()
     nom = e_nombre_micro.get().strip()
     
-    criteria = None
-    val = None
-    
-    # Determine search criteria based on valid input
-    if len(ced) == 10 and ced.isdigit():
-        criteria = "cedula"
-        val = ced
-    elif len(ruc) >= 10 and ruc.isdigit():
-         criteria = "ruc"
-         val = ruc
-    elif len(nom) >= 3:
-         criteria = "nombre"
-         val = nom
-    
+    # Determine search criteria based on valid input (directorio en memoria; lo que falte, en segundo plano)
+    resolver_cliente(e_nombre_micro, ced, ruc, nom,
+                     lambda criteria, entrada: mostrar_micro_auto(criteria, entrada, event),
+                     lambda: buscar_micro_auto(event))
+
+
+def mostrar_micro_auto(criteria, entrada, event=None):
+    global cedula_micro_actual, id_micro_actual
     if not criteria:
         return
 
-    conn, cursor = conectar_db()
-    
     res = None
     # Fetch result based on criteria
     # Including 'cedula' in SELECT to ensure we can load linked data
@@ -4148,17 +3470,12 @@ def buscar_micro_auto(event=None):
         FROM Clientes 
     """
     
-    if criteria == "cedula":
-         cursor.execute(query + " WHERE cedula = %s", (val,))
+    # Solo se consulta la ficha completa cuando el directorio identificó al cliente
+    if entrada:
+         conn, cursor = conectar_db()
+         cursor.execute(query + " WHERE cedula = %s", (entrada.cedula,))
          res = cursor.fetchone()
-    elif criteria == "ruc":
-         cursor.execute(query + " WHERE ruc = %s", (val,))
-         res = cursor.fetchone()
-    elif criteria == "nombre":
-         cursor.execute(query + " WHERE nombres LIKE %s LIMIT 1", (f"%{val}%",))
-         res = cursor.fetchone()
-    
-    db_manager.release_connection(conn)
+         db_manager.release_connection(conn)
     
     if res:
         # Avoid overwriting the active field to allow fluid typing
@@ -4512,6 +3829,8 @@ def guardar_microcredito():
                 vis_pisos=%s, vis_donde_vive=%s, vis_caracteristicas=%s, vis_destino_credito=%s, vis_hora=%s, vis_observaciones=%s, vis_imagenes_rutas=%s
                 WHERE id=%s
             """, vals[2:] + (id_micro_actual,))
+            # Si pasó a Desembolsado con los detalles ya cargados, falta su tabla de amortización
+            cuotas.generar(cursor, id_micro_actual, solo_si_falta=True)
             msg = "Datos actualizados."
         else:
             # Insert
@@ -4531,6 +3850,7 @@ def guardar_microcredito():
             msg = "Datos guardados."
             
         conn.commit()
+        servicio_kpi.invalidar()  # puede haber cambiado el estado de desembolso
         registrar_auditoria("Guardar Microcrédito", id_cliente=cedula_micro_actual, detalles=f"Se guardaron datos de microcrédito para el cliente {cedula_micro_actual}. Status: {status_micro_actual}")
         try:
             top = e_ruc_micro.winfo_toplevel()
@@ -4599,48 +3919,40 @@ def crear_modulo_generico(titulo, color_titulo="#1860C3", search_callback=None,
         
         def buscar_cliente_gen(event=None):
             ced = e_cedula.get().strip(); ruc = e_ruc.get().strip(); nom = e_nombre.get().strip()
-            criteria = None; val = None
-            if len(ced) == 10 and ced.isdigit(): criteria = "cedula"; val = ced
-            elif len(ruc) >= 10 and ruc.isdigit(): criteria = "ruc"; val = ruc
-            elif len(nom) >= 3: criteria = "nombre"; val = nom
-            
+            resolver_cliente(e_nombre, ced, ruc, nom,
+                             lambda criteria, res: mostrar_cliente_gen(criteria, res, event),
+                             lambda: buscar_cliente_gen(event))
+
+        def mostrar_cliente_gen(criteria, res, event=None):
             if not criteria:
                 if search_callback:
                     search_callback(None) # Clear callback
                 return
      
-            conn, cursor = conectar_db()
-            res = None
-            if criteria == "cedula":
-                 cursor.execute("SELECT nombre, ruc, cedula FROM Clientes WHERE cedula = %s", (val,))
-                 res = cursor.fetchone()
-            elif criteria == "ruc":
-                 cursor.execute("SELECT nombre, ruc, cedula FROM Clientes WHERE ruc = %s", (val,))
-                 res = cursor.fetchone()
-            elif criteria == "nombre":
-                 cursor.execute("SELECT nombres, ruc, cedula FROM Clientes WHERE nombres LIKE %s LIMIT 1", (f"%{val}%",))
-                 res = cursor.fetchone()
-            db_manager.release_connection(conn)
-            
             if res:
                 widget = event.widget if event else None
                 if criteria != "nombre" or (widget != e_nombre):
-                    e_nombre.delete(0, tk.END); e_nombre.insert(0, res[0])
+                    e_nombre.delete(0, tk.END); e_nombre.insert(0, res.nombres or "")
                 if criteria != "ruc" or (widget != e_ruc):
                     e_ruc.delete(0, tk.END)
-                    if res[1]: e_ruc.insert(0, res[1])
+                    if res.ruc: e_ruc.insert(0, res.ruc)
                 if criteria != "cedula" or (widget != e_cedula):
-                    e_cedula.delete(0, tk.END); e_cedula.insert(0, res[2])
+                    e_cedula.delete(0, tk.END); e_cedula.insert(0, res.cedula)
                 
                 if search_callback:
-                    search_callback(res[2]) # Trigger callback with cedula
+                    search_callback(res.cedula) # Trigger callback with cedula
             else:
                 if search_callback:
                     search_callback(None) # Clear callback if not found
      
-        e_cedula.bind('<KeyRelease>', buscar_cliente_gen)
-        e_ruc.bind('<KeyRelease>', buscar_cliente_gen)
-        e_nombre.bind('<KeyRelease>', buscar_cliente_gen)
+        e_cedula.bind('<KeyRelease>', con_espera(e_cedula, buscar_cliente_gen))
+        e_ruc.bind('<KeyRelease>', con_espera(e_ruc, buscar_cliente_gen))
+        e_nombre.bind('<KeyRelease>', con_espera(e_nombre, buscar_cliente_gen))
+
+        def elegir_cliente_gen(entrada):
+            e_cedula.delete(0, tk.END); e_cedula.insert(0, entrada.cedula)
+            buscar_cliente_gen()
+        activar_sugerencias(e_nombre, elegir_cliente_gen)
  
     # Logo
     try:
@@ -4803,30 +4115,7 @@ def abrir_modulo_rehabilitacion():
     # Referencias a widgets para bloqueo
     list_bloqueables = []
     
-    # --- AUTO-UPDATE DB SCHEMA ---
-    try:
-        conn_init, cursor_init = conectar_db()
-        # Verificar columnas y crearlas si faltan
-        table_info = cursor_init.execute("PRAGMA table_info(Rehabilitacion)").fetchall()
-        cols_present = [c[1] for c in table_info]
-        
-        new_cols = {
-            "val_empresas": "REAL", "desc_empresas": "TEXT",
-            "val_bancos": "REAL", "desc_bancos": "TEXT",
-            "val_cooperativas": "REAL", "desc_cooperativas": "TEXT",
-            "val_cobranzas": "REAL", "desc_cobranzas": "TEXT",
-            "fecha_cita": "TEXT", "informe_cita": "TEXT"
-        }
-        
-        for col_name, col_type in new_cols.items():
-            if col_name not in cols_present:
-                cursor_init.execute(f"ALTER TABLE Rehabilitacion ADD COLUMN {col_name} {col_type}")
-        
-        conn_init.commit()
-    except Exception as e:
-        print(f"Error updating schema: {e}")
-    finally:
-        db_manager.release_connection(conn_init)
+    # (Las columnas de Rehabilitacion las agrega la migración 7)
 
     def load_rehab_data(cedula):
         if not cedula:
@@ -6179,7 +5468,7 @@ def abrir_dashboard_estadisticas():
     f_kpi.pack(fill='x', padx=40, pady=10)
     
     # Función para crear Tarjetas KPI mejoradas
-    def crear_card_kpi(parent, title, val_func, color_bg, icon_char):
+    def crear_card_kpi(parent, title, color_bg, icon_char):
         # Frame Principal de la Tarjeta
         c = ctk.CTkFrame(parent, fg_color=color_bg, corner_radius=15, border_width=1, border_color="#E0E0E0")
         c.pack(side='left', fill='both', expand=True, padx=10)
@@ -6191,47 +5480,68 @@ def abrir_dashboard_estadisticas():
         # Columna 0: Icono
         ctk.CTkLabel(c, text=icon_char, font=('Arial', 40)).grid(row=0, column=0, rowspan=2, padx=(10,5), pady=10)
         
-        # Columna 1: Valor y Título
-        try:
-            val = val_func()
-        except Exception as e:
-            val = "Error"
-            print(f"Error KPI {title}: {e}")
-            
-        # Valor (Grande)
-        ctk.CTkLabel(c, text=str(val), text_color="white", font=('Arial', 32, 'bold')).grid(row=0, column=1, sticky='s', pady=(15,0), padx=5)
+        # Columna 1: Valor y Título (el valor se pinta al llegar la instantánea de KPI)
+        lbl_valor = ctk.CTkLabel(c, text="...", text_color="white", font=('Arial', 32, 'bold'))
+        lbl_valor.grid(row=0, column=1, sticky='s', pady=(15,0), padx=5)
         # Título (Pequeño)
         ctk.CTkLabel(c, text=title, text_color="#ECF0F1", font=('Arial', 12, 'bold')).grid(row=1, column=1, sticky='n', pady=(0,15), padx=5)
 
-        return c
-
-    conn, cursor = conectar_db()
-    
-    # Helpers query (Mismas queries, solo cambia UI)
-    def get_total_clientes():
-        cursor.execute("SELECT COUNT(*) FROM Clientes")
-        return cursor.fetchone()[0]
-    
-    def get_capital_prestado():
-        cursor.execute("SELECT SUM(monto_aprobado) FROM Microcreditos")
-        res = cursor.fetchone()[0]
-        return f"$ {res:,.2f}" if res else "$ 0.00"
-        
-    def get_total_recaudado():
-        try:
-            cursor.execute("SELECT SUM(total_pagado) FROM Pagos")
-            res = cursor.fetchone()[0]
-            return f"$ {res:,.2f}" if res else "$ 0.00"
-        except: return "$ 0.00"
+        return lbl_valor
 
     # Tarjetas con colores vibrantes e iconos
-    crear_card_kpi(f_kpi, "CLIENTES TOTALES", get_total_clientes, "#2E86C1", "👥")      # Azul
-    crear_card_kpi(f_kpi, "CAPITAL PRESTADO", get_capital_prestado, "#2ECC71", "💰")      # Verde
-    crear_card_kpi(f_kpi, "TOTAL RECAUDADO", get_total_recaudado, "#1ABC9C", "💵")       # Turquesa
-    crear_card_kpi(f_kpi, "CARTERA VENCIDA", lambda: "Por Calcular", "#E74C3C", "🚨")     # Rojo
+    lbl_clientes = crear_card_kpi(f_kpi, "CLIENTES TOTALES", "#2E86C1", "👥")      # Azul
+    lbl_capital = crear_card_kpi(f_kpi, "CAPITAL PRESTADO", "#2ECC71", "💰")      # Verde
+    lbl_recaudado = crear_card_kpi(f_kpi, "TOTAL RECAUDADO", "#1ABC9C", "💵")       # Turquesa
+    lbl_vencida = crear_card_kpi(f_kpi, "CARTERA VENCIDA", "#E74C3C", "🚨")     # Rojo
+
+    lbl_riesgo = ctk.CTkLabel(win, text="", text_color="#555", font=('Arial', 13, 'bold'))
+    lbl_riesgo.pack(pady=(15, 0))
+
+    # Tendencias (leídas de KpiDiario)
+    f_tend = ctk.CTkFrame(win, fg_color="white", corner_radius=15)
+    f_tend.pack(fill='x', padx=50, pady=(20, 0))
+    RANGOS_TENDENCIA = {"30 días": (30, "semana"), "90 días": (90, "semana"), "12 meses": (365, "mes")}
+    seg_rango = ctk.CTkSegmentedButton(f_tend, values=list(RANGOS_TENDENCIA), command=lambda v: cargar_tendencia())
+    seg_rango.set("90 días")
+    seg_rango.pack(pady=(10, 0))
+    f_graficos = ctk.CTkFrame(f_tend, fg_color="transparent")
+    f_graficos.pack(fill='x', padx=10, pady=10)
+    canvas_tend = []
+    for i in range(3):
+        f_graficos.grid_columnconfigure(i, weight=1)
+        cv = tk.Canvas(f_graficos, height=220, bg="white", highlightthickness=0)
+        cv.grid(row=0, column=i, sticky='ew', padx=5)
+        canvas_tend.append(cv)
+
+    def moneda_corta(v):
+        return f"$ {v / 1000:,.1f}k" if abs(v) >= 1000 else f"$ {v:,.0f}"
+
+    def pintar_tendencia(resultado):
+        base, filas = resultado
+        periodo = RANGOS_TENDENCIA[seg_rango.get()][1]
+        fechas = [f["fecha"].strftime("%d/%m") for f in filas]
+        graficos.lineas(canvas_tend[0], fechas, [
+            ("Saldo cartera", [f["saldo_cartera"] for f in filas], "#2E86C1"),
+            ("Cartera vencida", [f["cartera_vencida"] for f in filas], "#E74C3C"),
+        ], titulo="CARTERA", formato=moneda_corta)
+        recaudo = kpis.por_periodo(base, filas, "total_recaudado", periodo)
+        formato_periodo = "%m/%Y" if periodo == "mes" else "%d/%m"
+        graficos.barras(canvas_tend[1], [p.strftime(formato_periodo) for p, _ in recaudo], [v for _, v in recaudo],
+                        color="#1ABC9C", titulo=f"RECAUDACIÓN POR {periodo.upper()}", formato=moneda_corta)
+        graficos.lineas(canvas_tend[2], fechas, [
+            ("PAR30", [f["par30"] for f in filas], "#F39C12"),
+            ("PAR90", [f["par90"] for f in filas], "#8E44AD"),
+        ], titulo="PORTAFOLIO EN RIESGO", formato=lambda v: f"{v:.0%}")
+
+    def cargar_tendencia():
+        dias = RANGOS_TENDENCIA[seg_rango.get()][0]
+        ejecutor_db.ejecutar(win, kpis.leer_tendencia, dias, al_terminar=pintar_tendencia,
+                             al_fallar=lambda e: print(f"Error tendencia KPI: {e}"), clave="dashboard-tendencia")
+
+    cargar_tendencia()
 
     # Sección Alerta (Treeview)
-    ctk.CTkLabel(win, text="🚨 TOP 5 - MAYOR ENDEUDAMIENTO", text_color="#D32F2F", font=('Arial', 20, 'bold')).pack(pady=(40, 15))
+    ctk.CTkLabel(win, text="🚨 TOP 5 - MAYOR ENDEUDAMIENTO", text_color="#D32F2F", font=('Arial', 20, 'bold')).pack(pady=(25, 10))
     
     # Estilos Treeview (Zebra Striping)
     style = ttk.Style()
@@ -6265,25 +5575,36 @@ def abrir_dashboard_estadisticas():
     tree.tag_configure('odd', background='#2C3E50')
     tree.tag_configure('even', background='#34495E')
     
-    try:
-        cursor.execute("""
-            SELECT c.nombres, m.monto_aprobado, m.plazo_meses 
-            FROM Microcreditos m 
-            JOIN Clientes c ON m.cedula_cliente = c.cedula 
-            ORDER BY m.monto_aprobado DESC LIMIT 5
-        """)
-        rows = cursor.fetchall()
-        for i, r in enumerate(rows):
+    tree.pack(fill='x', padx=80, pady=10)
+
+    def pintar_kpis(snap):
+        lbl_clientes.configure(text=str(snap.total_clientes))
+        lbl_capital.configure(text=f"$ {snap.capital_prestado:,.2f}")
+        lbl_recaudado.configure(text=f"$ {snap.total_recaudado:,.2f}")
+        lbl_vencida.configure(text=f"$ {snap.cartera_vencida:,.2f}")
+        lbl_riesgo.configure(text=(
+            f"Saldo de cartera: $ {snap.saldo_cartera:,.2f}   |   PAR30: {snap.par30:.1%}   |   "
+            f"PAR90: {snap.par90:.1%}   |   Créditos en mora: {snap.creditos_en_mora}   |   "
+            f"Actualizado: {snap.calculado.strftime('%H:%M:%S')}"))
+        tree.delete(*tree.get_children())
+        for i, r in enumerate(snap.mayores_deudores):
             tag = 'odd' if i % 2 == 0 else 'even'
             m_fmt = f"$ {r[1]:,.2f}" if r[1] else "$ 0.00"
             tree.insert("", "end", values=(r[0], m_fmt, r[2]), tags=(tag,))
-    except Exception as e:
-        print(f"Error Tree Stats: {e}")
-        
-    tree.pack(fill='x', padx=80, pady=10)
-    
-    db_manager.release_connection(conn)
-    
+
+    def error_kpis(e):
+        print(f"Error KPI: {e}")
+        for lbl in (lbl_clientes, lbl_capital, lbl_recaudado, lbl_vencida):
+            lbl.configure(text="Error")
+
+    # Con la instantánea en caché se pinta al instante; si no, se calcula en segundo plano
+    snap = servicio_kpi.vigente()
+    if snap is not None:
+        pintar_kpis(snap)
+    else:
+        ejecutor_db.ejecutar(win, servicio_kpi.obtener, al_terminar=pintar_kpis, al_fallar=error_kpis,
+                             clave="dashboard-kpi")
+
     ctk.CTkButton(win, text="Cerrar Tablero", command=win.destroy, 
                   fg_color="#7F8C8D", hover_color="#95A5A6", 
                   width=150, font=('Arial', 12, 'bold')).pack(pady=30)
@@ -6319,8 +5640,10 @@ def abrir_modulo_consultas():
             ctk.CTkLabel(dashboard_frame, text="Realice una búsqueda para ver la información.", text_color="grey").pack(pady=20)
             return
         
-        conn, cursor = conectar_db()
-        try:
+        # Las consultas corren en segundo plano; la UI se pinta al volver el resultado
+        ctk.CTkLabel(dashboard_frame, text="Cargando información...", text_color="grey").pack(pady=20)
+
+        def consultar(cursor):
             # ------------------------------------------------------------------
             # PASO 1: OBTENER DATOS DEL CRÉDITO Y ESTADO
             # ------------------------------------------------------------------
@@ -6365,7 +5688,7 @@ def abrir_modulo_consultas():
             
             if tiene_credito:
                 # Calcular total pagado (Suma histórica)
-                cursor.execute("SELECT SUM(total_pagado) FROM Pagos WHERE cedula_cliente = %s", (cedula,))
+                cursor.execute("SELECT total_pagado FROM ResumenPagos WHERE cedula_cliente = %s", (cedula,))
                 res_sum = cursor.fetchone()
                 if res_sum and res_sum[0]:
                     total_pagado = res_sum[0]
@@ -6379,21 +5702,31 @@ def abrir_modulo_consultas():
                 """, (cedula,))
                 ultimos_pagos = cursor.fetchall()
 
+            # Crédito desembolsado: cuota, saldo y liquidación según su tabla de amortización
+            financiero = None
+            cursor.execute(motor_mora.SQL_CARTERA + " AND m.cedula_cliente = %s ORDER BY m.id DESC LIMIT 1", (cedula,))
+            fila = cursor.fetchone()
+            if fila:
+                financiero = (float(motor_mora.cuotas_de_filas([fila])[0]), motor_mora.liquidacion_de_fila(fila))
+
+            return monto, plazo, cuota, dia_p, status, tiene_credito, total_pagado, ultimos_pagos, financiero
+
+        def pintar(datos):
+            for widget in dashboard_frame.winfo_children():
+                widget.destroy()
+            monto, plazo, cuota, dia_p, status, tiene_credito, total_pagado, ultimos_pagos, financiero = datos
+
             # ------------------------------------------------------------------
             # PASO 3: CÁLCULOS FINANCIEROS
             # ------------------------------------------------------------------
-            # Proyección total deuda (Capital + Interés aprox simples) -> Cuota * Plazo
-            # (Ajustar lógica si su sistema maneja saldo de capital puro, pero usamos la proyección como aproximado)
-            total_deuda_proy = cuota * plazo
-            saldo_pendiente = total_deuda_proy - total_pagado
-            if saldo_pendiente < 0: saldo_pendiente = 0.0
-            
-            if status == "DESEMBOLSADO":
-                pass # Status OK
-            elif status == "SIN CRÉDITO ACTIVO":
-                pass
-            else:
-                saldo_pendiente = 0.0 # Si no está desembolsado, no debe nada "oficialmente" en cartera activa
+            # Saldo de capital y liquidación según la tabla de amortización (motor amortizacion).
+            # Si no está desembolsado, no debe nada "oficialmente" en cartera activa
+            saldo_pendiente = 0.0
+            sub_saldo = "Sin crédito desembolsado"
+            if financiero:
+                cuota, liq = financiero
+                saldo_pendiente = liq.capital
+                sub_saldo = f"Capital. Liquidación hoy: {formatear_moneda(liq.total)}"
             
             # Lógica de Mora Simple (Fecha actual vs Dia de Pago)
             # (Muy simplificada para visualización)
@@ -6424,7 +5757,7 @@ def abrir_modulo_consultas():
             
             # Tarjeta 2: SALDO (Importante)
             color_saldo = "#D32F2F" if saldo_pendiente > 0 else "green"
-            card_b = crear_tarjeta(grid_cards, "SALDO PENDIENTE EST.", formatear_moneda(saldo_pendiente), "Calculado (Cuota*Plazo - Pagos)", color_valor=color_saldo)
+            card_b = crear_tarjeta(grid_cards, "SALDO PENDIENTE EST.", formatear_moneda(saldo_pendiente), sub_saldo, color_valor=color_saldo)
             card_b.pack(side='left', fill='both', expand=True, padx=10)
             
             # Tarjeta 3: PRÓXIMA CUOTA
@@ -6467,11 +5800,13 @@ def abrir_modulo_consultas():
             elif tiene_credito:
                 ctk.CTkLabel(dashboard_frame, text="No se han registrado pagos en el sistema aún.", text_color="grey", font=('Arial', 11, 'italic')).pack(pady=20)
 
-        except Exception as e:
+        def mostrar_error(e):
+            for widget in dashboard_frame.winfo_children():
+                widget.destroy()
             ctk.CTkLabel(dashboard_frame, text=f"Error cargando dashboard: {e}", text_color="red").pack(pady=20)
             print(f"Error Dash: {e}")
-        finally:
-            db_manager.release_connection(conn)
+
+        ejecutor_db.ejecutar(dashboard_frame, consultar, al_terminar=pintar, al_fallar=mostrar_error, clave="consultas")
 
     def agregar_btn_stats(parent):
         btn_dashboard = ctk.CTkButton(parent, text="📊 VER ESTADÍSTICAS", command=abrir_dashboard_estadisticas,
@@ -7719,7 +7054,7 @@ def abrir_modulo_caja():
     lbl_aviso_cedula_caja.pack(fill='x', pady=(0, 8))
     lbl_aviso_cedula_caja.pack_forget() # Oculto por defecto
 
-    e_ced.bind('<KeyRelease>', buscar_cliente_caja)
+    e_ced.bind('<KeyRelease>', con_espera(e_ced, buscar_cliente_caja))
     
     # RUC
     ctk.CTkLabel(col_left, text="RUC:", font=('Arial', 12, 'bold'), text_color="#34495E").pack(anchor='w', pady=(5,0))
@@ -7918,6 +7253,10 @@ def abrir_modulo_cartera():
     ctk.CTkButton(f_top, text="🔄 Actualizar Lista", command=lambda: cargar_cartera(), 
                   fg_color="#17a2b8", width=150).pack(side='left', padx=10)
 
+    ctk.CTkLabel(f_top, text="🔎 Cédula / Nombre:", font=('Arial', 11, 'bold')).pack(side='left', padx=(20, 5))
+    e_filtro_cartera = ctk.CTkEntry(f_top, width=250)
+    e_filtro_cartera.pack(side='left')
+
     # Treeview
     cols = ("Cédula", "Cliente", "Monto Crédito", "Plazo", "Cuota", "Total Pagado", "Saldo Est.", "Estado", "Días Mora")
     tree_cartera = ttk.Treeview(tab, columns=cols, show='headings', height=20)
@@ -7930,9 +7269,8 @@ def abrir_modulo_cartera():
     tree_cartera.column("Cliente", width=200)
     tree_cartera.column("Estado", width=120)
     
-    # Scroll
+    # Scroll (la grilla virtual le pasa la posición)
     vsb = ttk.Scrollbar(tab, orient="vertical", command=tree_cartera.yview)
-    tree_cartera.configure(yscrollcommand=vsb.set)
     
     tree_cartera.pack(side='left', fill='both', expand=True, padx=(10,0))
     vsb.pack(side='right', fill='y', padx=(0,10))
@@ -7941,68 +7279,80 @@ def abrir_modulo_cartera():
     tree_cartera.tag_configure('mora', background='#FFCDD2', foreground='#D32F2F') # Rojo suave
     tree_cartera.tag_configure('aldia', background='#C8E6C9', foreground='#2E7D32') # Verde suave
     
-    def cargar_cartera():
-        # Limpiar tree
-        for i in tree_cartera.get_children():
-            tree_cartera.delete(i)
-            
-        conn, cursor = conectar_db()
-        try:
-            # Query con JOIN y Subconsultas para pagos
-            # CORRECCIÓN: Calcular saldo real y total pagado
-            query = """
-                SELECT
-                    m.cedula_cliente,
-                    c.nombres,
-                    m.monto_aprobado,
-                    m.plazo_meses,
-                    m.valor_cuota,
-                    m.fecha_desembolso_real,
-                    COALESCE((SELECT SUM(p.valor_capital) FROM Pagos p WHERE p.cedula_cliente = m.cedula_cliente), 0) as capital_pagado,
-                    COALESCE((SELECT SUM(p.total_pagado) FROM Pagos p WHERE p.cedula_cliente = m.cedula_cliente), 0) as total_cash_paid
-                FROM Microcreditos m
-                LEFT JOIN Clientes c ON m.cedula_cliente = c.cedula
-                WHERE m.sub_status = 'Desembolsado'
-            """
-            cursor.execute(query)
-            creditos = cursor.fetchall()
-            
-            for row in creditos:
-                cedula = row[0]
-                cliente = row[1] if row[1] else "Desconocido"
-                
-                monto = row[2] if row[2] else 0.0
-                plazo = row[3] if row[3] else 0
-                cuota = row[4] if row[4] else 0.0
-                
-                capital_pagado = row[6]
-                total_cash_paid = row[7]
-                
-                saldo_est = max(0.0, monto - capital_pagado)
-                
-                monto_str = f"$ {monto:,.2f}"
-                cuota_str = f"$ {cuota:,.2f}"
-                
-                total_pagado_str = f"$ {total_cash_paid:,.2f}"
-                saldo_est_str = f"$ {saldo_est:,.2f}"
-                
-                # Estado simple: Si saldo es 0, Pagado
-                estado = "Vigente"
-                if saldo_est <= 0.1: # Tolerancia
-                    estado = "Pagado"
-                
-                dias_mora = "0" # Pendiente lógica compleja de mora global
-                
-                tree_cartera.insert("", "end", values=(
-                    cedula, cliente, monto_str, plazo, cuota_str, 
-                    total_pagado_str, saldo_est_str, estado, dias_mora
-                ))
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al cargar cartera: {e}")
-            print(f"Error cargar_cartera: {e}")
-        finally:
-            db_manager.release_connection(conn)
+    def formatear_cartera(creditos):
+        # Mora de la página en una sola pasada vectorizada (motor_mora)
+        mora = motor_mora.mora_de_filas(creditos)
+        cuotas_cred = motor_mora.cuotas_de_filas(creditos)
+        saldos = motor_mora.saldos_de_filas(creditos)
+        filas = []
+        for i, row in enumerate(creditos):
+            cedula = row[0]
+            cliente = row[1] if row[1] else "Desconocido"
+            
+            monto = row[2] if row[2] else 0.0
+            plazo = row[3] if row[3] else 0
+            cuota = float(cuotas_cred[i])
+            
+            total_cash_paid = row[7]
+            
+            saldo_est = float(saldos[i])
+            
+            monto_str = f"$ {monto:,.2f}"
+            cuota_str = f"$ {cuota:,.2f}"
+            
+            total_pagado_str = f"$ {total_cash_paid:,.2f}"
+            saldo_est_str = f"$ {saldo_est:,.2f}"
+            
+            # Estado simple: Si saldo es 0, Pagado
+            estado = "Vigente"
+            if saldo_est <= 0.1: # Tolerancia
+                estado = "Pagado"
+            
+            dias_mora = int(mora.dias_mora[i])
+            tag = 'aldia'
+            if dias_mora > 0 and estado != "Pagado":
+                estado = "En Mora"
+                tag = 'mora'
+            
+            filas.append(((
+                cedula, cliente, monto_str, plazo, cuota_str, 
+                total_pagado_str, saldo_est_str, estado, dias_mora
+            ), (tag,)))
+        return filas
+
+    def error_cartera(e):
+        messagebox.showerror("Error", f"Error al cargar cartera: {e}")
+        print(f"Error cargar_cartera: {e}")
+
+    # Grilla virtual: páginas por clave, orden y filtro en el servidor
+    grilla_cartera = GrillaVirtual(
+        tree_cartera, ejecutor_db, motor_mora.ORIGEN_CARTERA, motor_mora.COLUMNAS_CARTERA, clave="m.id",
+        # Cuota y saldo se muestran según amortizacion; para ordenar en el servidor se usan
+        # la cuota digitada y monto - capital pagado, que coinciden salvo centavos
+        ordenables={
+            "Cédula": "COALESCE(m.cedula_cliente, '')",
+            "Cliente": "COALESCE(c.nombres, '')",
+            "Monto Crédito": "COALESCE(m.monto_aprobado, 0)",
+            "Plazo": "COALESCE(m.plazo_meses, 0)",
+            "Cuota": "COALESCE(m.valor_cuota, 0)",
+            "Total Pagado": "COALESCE(r.total_pagado, 0)",
+            "Saldo Est.": "COALESCE(m.monto_aprobado, 0) - COALESCE(r.capital_pagado, 0)",
+        },
+        formatear=formatear_cartera, scrollbar=vsb, al_fallar=error_cartera)
+
+    def cargar_cartera(event=None):
+        term = e_filtro_cartera.get().strip()
+        if not term:
+            grilla_cartera.filtrar(motor_mora.FILTRO_CARTERA)
+        elif any(ch.isdigit() for ch in term):
+            grilla_cartera.filtrar(motor_mora.FILTRO_CARTERA + " AND m.cedula_cliente LIKE %s", (term + '%',))
+        else:
+            def por_nombre(cursor):
+                filtro, params = filtro_por_nombre(db_manager, cursor, term)
+                return f"{motor_mora.FILTRO_CARTERA} AND {filtro}", params
+            grilla_cartera.filtrar(por_nombre)
+
+    e_filtro_cartera.bind("<KeyRelease>", con_espera(e_filtro_cartera, cargar_cartera, 300))
 
 
     # Cargar al inicio
@@ -8039,6 +7389,7 @@ def abrir_ventana_recaudacion():
     var_recibido = tk.DoubleVar(value=0.0)
     var_cambio = tk.DoubleVar(value=0.0)
     var_estado_visual = tk.StringVar(value="ESPERANDO BÚSQUEDA")
+    credito_actual = {}  # id, número de cuota y si tiene tabla de amortización (para registrar_pago)
     
     # --- UI LAYOUT ---
     
@@ -8050,27 +7401,45 @@ def abrir_ventana_recaudacion():
     e_cedula_rec = ctk.CTkEntry(f_top, textvariable=var_cedula_busq, width=150, font=('Arial', 14))
     e_cedula_rec.pack(side='left', padx=10)
     
+    def consultar_credito(cursor, ced):
+        # 1. Buscar Crédito Desembolsado
+        # CORRECCIÓN: 'Desembolsado' está en sub_status
+        cursor.execute("""
+            SELECT id, fecha_desembolso_real, monto_aprobado, tasa_interes, plazo_meses, valor_cuota, dia_pago
+            FROM Microcreditos 
+            WHERE cedula_cliente = %s AND sub_status = 'Desembolsado'
+            ORDER BY id DESC LIMIT 1
+        """, (ced,))
+        credito = cursor.fetchone()
+        
+        # Buscar nombre del cliente
+        cursor.execute("SELECT nombres, nombre FROM Clientes WHERE cedula = %s", (ced,))
+        cli = cursor.fetchone()
+
+        # 2. Cuotas pagadas y próxima cuota de la tabla de amortización
+        pagos_info = proxima = None
+        con_tabla = False
+        if credito:
+            cursor.execute("SELECT cuotas_pagadas, capital_pagado FROM ResumenPagos WHERE cedula_cliente = %s", (ced,))
+            pagos_info = cursor.fetchone() or (0, 0.0)
+            proxima = cuotas.proxima_cuota(cursor, credito[0])
+            con_tabla = proxima is not None or cuotas.tiene_tabla(cursor, credito[0])
+        return credito, cli, pagos_info, proxima, con_tabla
+
     def buscar_credito_activo():
         ced = var_cedula_busq.get().strip()
         if not ced:
             messagebox.showwarning("Aviso", "Ingrese una cédula", parent=toplevel)
             return
-            
-        conn, cursor = conectar_db()
+
+        ejecutor_db.ejecutar(toplevel, consultar_credito, ced, al_terminar=mostrar_credito,
+                             al_fallar=lambda e: messagebox.showerror("Error", f"Error buscando crédito: {e}"),
+                             clave="recaudacion")
+
+    def mostrar_credito(datos):
+        credito, cli, pagos_info, proxima, con_tabla = datos
+        credito_actual.clear()
         try:
-            # 1. Buscar Crédito Desembolsado
-            # CORRECCIÓN: 'Desembolsado' está en sub_status
-            cursor.execute("""
-                SELECT id, fecha_desembolso_real, monto_aprobado, tasa_interes, plazo_meses, valor_cuota, dia_pago
-                FROM Microcreditos 
-                WHERE cedula_cliente = %s AND sub_status = 'Desembolsado'
-                ORDER BY id DESC LIMIT 1
-            """, (ced,))
-            credito = cursor.fetchone()
-            
-            # Buscar nombre del cliente
-            cursor.execute("SELECT nombres, nombre FROM Clientes WHERE cedula = %s", (ced,))
-            cli = cursor.fetchone()
             if cli: 
                 # Priorizar 'nombres'
                 var_nombre_cliente.set(cli[0] if cli[0] else (cli[1] if cli[1] else ""))
@@ -8088,63 +7457,38 @@ def abrir_ventana_recaudacion():
             val_cuota = credito[5] or 0.0
             dia_pago = credito[6] or 1
             
-            # 2. Calcular cuotas pagadas
-            cursor.execute("SELECT COUNT(*), SUM(valor_capital) FROM Pagos WHERE cedula_cliente = %s", (ced,))
-            pagos_info = cursor.fetchone()
-            cuotas_pagadas = pagos_info[0] or 0
-            capital_pagado = pagos_info[1] or 0.0
-            
-            cuota_actual = cuotas_pagadas + 1
-            if cuota_actual > plazo:
-                messagebox.showinfo("Info", "El crédito parece estar totalmente pagado.", parent=toplevel)
-                return
-            
-            var_nro_cuota.set(f"{cuota_actual} / {plazo}")
-            var_capital.set(round(val_cuota, 2))
+            if con_tabla:
+                # Próxima cuota sin pagar de la tabla de amortización
+                if proxima is None:
+                    messagebox.showinfo("Info", "El crédito está totalmente pagado.", parent=toplevel)
+                    return
+                cuota_actual, f_venc_str, val_cuota, interes, capital, _ = proxima
+                f_venc = datetime.datetime.strptime(str(f_venc_str)[:10], "%Y-%m-%d").date()
+            else:
+                # Crédito sin tabla (faltan monto, plazo o fecha de desembolso): cuota completa como capital
+                cuota_actual = (pagos_info[0] or 0) + 1
+                if cuota_actual > plazo:
+                    messagebox.showinfo("Info", "El crédito parece estar totalmente pagado.", parent=toplevel)
+                    return
+                interes, capital = 0.0, val_cuota
+                desembolso = motor_mora.fecha_iso(f_desemb_str)
+                f_ini = (datetime.datetime.strptime(desembolso, "%Y-%m-%d").date() if desembolso
+                         else datetime.date.today())  # Fallback
+                f_venc = cuotas.vencimiento(f_ini, dia_pago, cuota_actual)
 
-            # User request: "el credito que se creo puede ser cobrado"
-            # Asumiremos cuota nivelada donde el usuario paga el valor_cuota completo.
-            # Para visualización, pondremos el valor_cuota en "Capital" y 0 en Interés para no complicar sin amortización generada.
-            var_capital.set(round(val_cuota, 2))
-            var_interes.set(0.00)
-            
-            # 3. Calcular Vencimiento
-            # Logic: Fecha desembolso -> Primer pago al siguiente mes el día 'dia_pago'
-            # Cuota N: Fecha desembolso + N meses (ajustando día)
-            try:
-                # Parsear fecha desembolso
-                f_ini = datetime.datetime.strptime(f_desemb_str.split(' ')[0], "%d/%m/%Y")
-            except:
-                try:
-                    f_ini = datetime.datetime.strptime(f_desemb_str.split(' ')[0], "%Y-%m-%d")
-                except:
-                    f_ini = datetime.datetime.today() # Fallback
-            
-            # Calcular fecha vencimiento de la cuota actual
-            # Aprox: f_ini + cuota_actual meses. 
-            # Python no tiene add_months directo simple, usamos lógica simple:
-            mes_venc = f_ini.month + cuota_actual
-            anio_venc = f_ini.year + (mes_venc - 1) // 12
-            mes_venc = (mes_venc - 1) % 12 + 1
-            
-            # Validar día
-            try:
-                f_venc = datetime.date(anio_venc, mes_venc, int(dia_pago))
-            except ValueError:
-                # Si el día no existe (ej: 31 feb), usar el último del mes
-                import calendar
-                last_day = calendar.monthrange(anio_venc, mes_venc)[1]
-                f_venc = datetime.date(anio_venc, mes_venc, last_day)
-                
+            credito_actual.update(id=cred_id, numero=cuota_actual, con_tabla=con_tabla)
+            var_nro_cuota.set(f"{cuota_actual} / {plazo}")
+            var_capital.set(round(capital, 2))
+            var_interes.set(round(interes, 2))
             var_vencimiento.set(f_venc.strftime("%Y-%m-%d"))
             
-            # 4. Mora
+            # 3. Mora
             hoy = datetime.date.today()
             delta = (hoy - f_venc).days
             dias_mora = max(0, delta)
             var_dias_mora.set(dias_mora)
             
-            mora = round(val_cuota * 0.011 * dias_mora, 2) # 1.1% por dia sobre cuota
+            mora = round(val_cuota * motor_mora.TASA_MORA_DIARIA * dias_mora, 2) # 1.1% por dia sobre cuota
             var_mora.set(mora)
             
             total = val_cuota + mora
@@ -8164,8 +7508,6 @@ def abrir_ventana_recaudacion():
             
         except Exception as e:
             messagebox.showerror("Error", f"Error buscando crédito: {e}")
-        finally:
-            db_manager.release_connection(conn)
         
     def generar_recibo_pdf():
         try:
@@ -8355,22 +7697,31 @@ def abrir_ventana_recaudacion():
             
             fecha_pago = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            cursor.execute("""
-                INSERT INTO Pagos (fecha, cedula_cliente, cuota_nro, valor_capital, valor_interes, valor_mora, total_pagado, usuario)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                fecha_pago,
-                ced,
-                nro,
-                var_capital.get(),
-                var_interes.get(),
-                var_mora.get(),
-                var_total_pagar.get(),
-                USUARIO_ACTIVO
-            ))
-            
-            conn.commit()
-            db_manager.release_connection(conn)
+            try:
+                cursor.execute("""
+                    INSERT INTO Pagos (fecha, cedula_cliente, cuota_nro, valor_capital, valor_interes, valor_mora, total_pagado, usuario)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    fecha_pago,
+                    ced,
+                    nro,
+                    var_capital.get(),
+                    var_interes.get(),
+                    var_mora.get(),
+                    var_total_pagar.get(),
+                    USUARIO_ACTIVO
+                ))
+                # Mismo commit que el pago: el resumen nunca queda desfasado de Pagos
+                resumen_pagos.sumar_pago(cursor, ced, nro, var_capital.get(), var_total_pagar.get(), fecha_pago)
+                if credito_actual.get("con_tabla"):
+                    cuotas.marcar_pagada(cursor, credito_actual["id"], nro, fecha_pago)
+                conn.commit()
+                servicio_kpi.invalidar()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                db_manager.release_connection(conn)
 
             messagebox.showinfo("Éxito", "Pago Registrado Correctamente.", parent=toplevel)
             
@@ -8398,7 +7749,6 @@ if __name__ == '__main__':
     if 'streamlit' in sys.modules:
         pass
     else:
-        verificar_integridad_db()
         win = ctk.CTk()
         habilitar_enter_como_tab(win)
         win.title("Acceso al Sistema - Alianza C3F")
@@ -8466,6 +7816,9 @@ if __name__ == '__main__':
     
         win.mainloop()
 
+        if db_manager and db_manager.metricas:
+            db_manager.metricas.imprimir_resumen()
+
 
 # --- AGREGAR AL FINAL DE basededatos_v3.0.py ---
 
@@ -0,0 +1,100 @@
+"""
+Búsqueda de clientes por nombre, sin distinguir mayúsculas ni tildes y ordenada por relevancia.
+
+PostgreSQL: índice GIN pg_trgm sobre alz_normalizar(nombres) (migración 11); el
+LIKE '%término%' lo resuelve el índice de trigramas y similarity() ordena.
+SQLite: tabla FTS5 clientes_fts (tokenizer unicode61 sin diacríticos) que los
+triggers mantienen al día; se busca por prefijo de palabra y se ordena por bm25.
+Sin pg_trgm (sin privilegio para instalarla) o sin FTS5 se busca con LIKE sin índice.
+"""
+import unicodedata
+
+# Expresión indexada en PostgreSQL: debe coincidir con la del índice idx_clientes_nombre_trgm
+EXPR_NOMBRE_PG = "alz_normalizar(COALESCE(nombres, nombre, ''))"
+# La misma expresión calificada con el alias c (el índice la reconoce igual)
+_EXPR_NOMBRE_C = "alz_normalizar(COALESCE(c.nombres, c.nombre, ''))"
+TABLA_FTS = "clientes_fts"
+
+# None hasta consultar si el servidor tiene pg_trgm (una vez por proceso)
+_hay_trigramas = None
+
+
+def normalizar_nombre(texto):
+    """minúsculas y sin tildes (la misma regla que alz_normalizar en el servidor)."""
+    texto = unicodedata.normalize("NFD", (texto or "").lower())
+    return "".join(ch for ch in texto if unicodedata.category(ch) != "Mn")
+
+
+def _palabras(termino):
+    return [p for p in normalizar_nombre(termino).split() if p]
+
+
+def _escapar_like(palabra):
+    return palabra.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _consulta_fts(palabras):
+    # "juan"* "per"* -> todas las palabras, cada una como prefijo
+    return " ".join('"%s"*' % p.replace('"', '""') for p in palabras)
+
+
+def trigramas_disponibles(cursor):
+    """True si pg_trgm quedó instalada (la migración 11 sigue sin ella si no hay privilegios)."""
+    global _hay_trigramas
+    if _hay_trigramas is None:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        _hay_trigramas = cursor.fetchone() is not None
+    return _hay_trigramas
+
+
+def filtro_por_nombre(dbm, cursor, termino):
+    """
+    Condición (sql, params) sobre Clientes c que deja los clientes cuyo nombre contiene
+    todas las palabras de `termino`; para consultas con su propio orden (p. ej. grillas).
+    """
+    palabras = _palabras(termino)
+    if dbm.mode == "POSTGRES":
+        return (" AND ".join(f"{_EXPR_NOMBRE_C} LIKE %s" for _ in palabras),
+                tuple(f"%{_escapar_like(p)}%" for p in palabras))
+    if dbm.check_table_exists(cursor, TABLA_FTS):
+        return (f"c.id IN (SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s)",
+                (_consulta_fts(palabras),))
+    return (" AND ".join("COALESCE(c.nombres, c.nombre, '') LIKE %s" for _ in palabras),
+            tuple(f"%{p}%" for p in palabras))
+
+
+def buscar_por_nombre(dbm, cursor, termino, columnas=("*",), limite=20):
+    """
+    Clientes cuyo nombre contiene todas las palabras de `termino`, los más parecidos primero.
+    `columnas` son columnas de Clientes (se califican con el alias c).
+    """
+    palabras = _palabras(termino)
+    if not palabras:
+        return []
+    cols = ", ".join("c." + col for col in columnas)
+
+    if dbm.mode == "POSTGRES":
+        filtros, params = filtro_por_nombre(dbm, cursor, termino)
+        if trigramas_disponibles(cursor):
+            cursor.execute(
+                f"SELECT {cols} FROM Clientes c WHERE {filtros} "
+                f"ORDER BY similarity({_EXPR_NOMBRE_C}, %s) DESC LIMIT %s",
+                params + (" ".join(palabras), limite))
+        else:
+            # Sin pg_trgm: el mismo LIKE sobre alz_normalizar, sin índice ni relevancia
+            cursor.execute(
+                f"SELECT {cols} FROM Clientes c WHERE {filtros} ORDER BY {_EXPR_NOMBRE_C} LIMIT %s",
+                params + (limite,))
+        return cursor.fetchall()
+
+    if dbm.check_table_exists(cursor, TABLA_FTS):
+        cursor.execute(
+            f"SELECT {cols} FROM {TABLA_FTS} JOIN Clientes c ON c.id = {TABLA_FTS}.rowid "
+            f"WHERE {TABLA_FTS} MATCH %s ORDER BY {TABLA_FTS}.rank LIMIT %s",
+            (_consulta_fts(palabras), limite))
+        return cursor.fetchall()
+
+    # SQLite compilado sin FTS5: LIKE sin índice (y sin ignorar tildes)
+    filtros, params = filtro_por_nombre(dbm, cursor, termino)
+    cursor.execute(f"SELECT {cols} FROM Clientes c WHERE {filtros} LIMIT %s", params + (limite,))
+    return cursor.fetchall()
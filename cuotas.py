@@ -0,0 +1,148 @@
+"""
+Tabla de amortización de cada crédito (tabla Cuotas), sistema francés.
+Los valores salen del motor de amortizacion; aquí solo se guardan y consultan.
+
+Se genera al desembolsar (detalles financieros del microcrédito): una fila por
+cuota con vencimiento, valor de la cuota, interés, capital y saldo. Recaudación
+cobra la próxima fila sin pagar (búsqueda por índice) y registrar_pago la marca
+pagada en la misma transacción que el pago.
+
+Los vencimientos siguen la regla de motor_mora: la cuota k vence k meses después
+del desembolso, el día `dia_pago` (o el último día del mes si ese día no existe).
+"""
+import calendar
+import datetime
+
+import amortizacion
+from motor_mora import fecha_iso
+
+TABLA = "Cuotas"
+
+SQL_CREAR = f"""
+    CREATE TABLE IF NOT EXISTS {TABLA} (
+        id_credito INTEGER NOT NULL,
+        numero INTEGER NOT NULL,
+        cedula_cliente TEXT,
+        fecha_vencimiento TEXT NOT NULL,
+        cuota REAL NOT NULL,
+        interes REAL NOT NULL,
+        capital REAL NOT NULL,
+        saldo REAL NOT NULL,
+        fecha_pago TEXT,
+        PRIMARY KEY (id_credito, numero)
+    )
+"""
+SQL_INDICE = f"CREATE INDEX IF NOT EXISTS idx_cuotas_credito_venc ON {TABLA} (id_credito, fecha_vencimiento)"
+
+_SQL_INSERTAR = f"""
+    INSERT INTO {TABLA} (id_credito, numero, cedula_cliente, fecha_vencimiento, cuota, interes, capital, saldo)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def vencimiento(desembolso, dia_pago, k):
+    """Fecha de vencimiento de la cuota k."""
+    meses = desembolso.month - 1 + k
+    anio, mes = desembolso.year + meses // 12, meses % 12 + 1
+    dia = min(max(int(dia_pago or 1), 1), calendar.monthrange(anio, mes)[1])
+    return datetime.date(anio, mes, dia)
+
+
+def generar(cursor, id_credito, solo_si_falta=False):
+    """
+    Escribe la tabla del crédito si está Desembolsado y tiene monto, plazo y fecha.
+    Reemplaza una tabla anterior mientras no tenga cuotas pagadas.
+    Retorna cuántas cuotas escribió (0 si no hizo nada).
+    """
+    cursor.execute("""
+        SELECT cedula_cliente, sub_status, fecha_desembolso_real, monto_aprobado, tasa_interes, plazo_meses, dia_pago
+        FROM Microcreditos WHERE id = %s
+    """, (id_credito,))
+    credito = cursor.fetchone()
+    if not credito or credito[1] != "Desembolsado":
+        return 0
+    cedula, _, fecha, monto, tasa, plazo, dia_pago = credito
+    desembolso = fecha_iso(fecha)
+    if not desembolso or not monto or not plazo:
+        return 0
+
+    cursor.execute(f"SELECT COUNT(*), COUNT(fecha_pago) FROM {TABLA} WHERE id_credito = %s", (id_credito,))
+    existentes, pagadas = cursor.fetchone()
+    if pagadas or (existentes and solo_si_falta):
+        return 0
+
+    desembolso = datetime.datetime.strptime(desembolso, "%Y-%m-%d").date()
+    filas = [(id_credito, n, cedula, vencimiento(desembolso, dia_pago, n).strftime("%Y-%m-%d"), cuota, interes, capital, saldo)
+             for n, cuota, interes, capital, saldo in amortizacion.tabla(float(monto), float(tasa or 0), int(plazo))]
+    cursor.execute(f"DELETE FROM {TABLA} WHERE id_credito = %s", (id_credito,))
+    cursor.executemany(_SQL_INSERTAR, filas)
+    return len(filas)
+
+
+def generar_faltantes(cursor):
+    """
+    Tablas de los créditos desembolsados que aún no tienen (bases anteriores a Cuotas).
+    Las primeras cuotas_pagadas de ResumenPagos quedan marcadas con la fecha del último pago.
+    """
+    cursor.execute(f"""
+        SELECT m.id FROM Microcreditos m
+        WHERE m.sub_status = 'Desembolsado'
+          AND NOT EXISTS (SELECT 1 FROM {TABLA} q WHERE q.id_credito = m.id)
+    """)
+    total = 0
+    for (id_credito,) in cursor.fetchall():
+        if generar(cursor, id_credito):
+            total += 1
+            cursor.execute(f"""
+                UPDATE {TABLA} SET fecha_pago = (
+                    SELECT r.fecha_ultimo_pago FROM ResumenPagos r WHERE r.cedula_cliente = {TABLA}.cedula_cliente)
+                WHERE id_credito = %s AND numero <= (
+                    SELECT COALESCE(MAX(r.cuotas_pagadas), 0) FROM ResumenPagos r WHERE r.cedula_cliente = {TABLA}.cedula_cliente)
+            """, (id_credito,))
+    return total
+
+
+def regenerar_tras_replicar(cursor, desde):
+    """
+    Pone al día Cuotas en el servidor después de replicar el diario offline (Cuotas
+    no se replica: sus filas usan el id local del crédito). Genera las tablas que
+    falten y marca pagadas las cuotas de los pagos registrados desde `desde`, en el
+    último crédito desembolsado de cada cédula (el que cobra recaudación).
+    Retorna cuántas tablas generó.
+    """
+    generadas = generar_faltantes(cursor)
+    cursor.execute("SELECT cedula_cliente, cuota_nro, fecha FROM Pagos WHERE fecha >= %s AND cuota_nro > 0 ORDER BY fecha",
+                   (desde,))
+    creditos = {}
+    for cedula, numero, fecha in cursor.fetchall():
+        if cedula not in creditos:
+            cursor.execute("""
+                SELECT id FROM Microcreditos WHERE cedula_cliente = %s AND sub_status = 'Desembolsado'
+                ORDER BY id DESC LIMIT 1
+            """, (cedula,))
+            fila = cursor.fetchone()
+            creditos[cedula] = fila[0] if fila else None
+        if creditos[cedula] is not None:
+            marcar_pagada(cursor, creditos[cedula], numero, str(fecha))
+    return generadas
+
+
+def proxima_cuota(cursor, id_credito):
+    """(numero, fecha_vencimiento, cuota, interes, capital, saldo) de la primera cuota sin pagar, o None."""
+    cursor.execute(f"""
+        SELECT numero, fecha_vencimiento, cuota, interes, capital, saldo FROM {TABLA}
+        WHERE id_credito = %s AND fecha_pago IS NULL
+        ORDER BY numero LIMIT 1
+    """, (id_credito,))
+    return cursor.fetchone()
+
+
+def tiene_tabla(cursor, id_credito):
+    cursor.execute(f"SELECT 1 FROM {TABLA} WHERE id_credito = %s LIMIT 1", (id_credito,))
+    return cursor.fetchone() is not None
+
+
+def marcar_pagada(cursor, id_credito, numero, fecha):
+    """Marca la cuota pagada. Llamar con el mismo cursor/transacción del INSERT en Pagos."""
+    cursor.execute(f"UPDATE {TABLA} SET fecha_pago = %s WHERE id_credito = %s AND numero = %s AND fecha_pago IS NULL",
+                   (fecha, id_credito, numero))
@@ -2,6 +2,8 @@ import hashlib
 import datetime
 import os
 from db_manager import DatabaseManager
+from migraciones import aplicar_migraciones
+from busqueda_clientes import buscar_por_nombre
 import psycopg2.extras
 import sqlite3 # Mantenido solo para atrapar excepciones específicas si quedara alguna
 
@@ -57,218 +59,15 @@ def check_table_exists(c, t): return db_manager.check_table_exists(c, t)
 # =================================================================
 
 def crear_tablas():
-    conn, cursor = conectar_db()
-    try:
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Clientes (
-                id {sql_type("SERIAL PRIMARY KEY")}, 
-                cedula TEXT UNIQUE NOT NULL,  
-                ruc TEXT,
-                nombre TEXT NOT NULL,
-                estado_civil TEXT,
-                cargas_familiares INTEGER,
-                email TEXT,
-                telefono TEXT,
-                direccion TEXT,
-                parroquia TEXT,
-                tipo_vivienda TEXT,
-                profesion TEXT,
-                ingresos_mensuales REAL,
-                referencia1 TEXT,
-                referencia2 TEXT,
-                asesor TEXT,
-                apertura TEXT,
-                numero_carpeta TEXT,
-                "fecha nacimiento" TEXT,
-                producto TEXT,
-                observaciones TEXT,
-                "cartera castigada" INTEGER DEFAULT 0,
-                "valor cartera" REAL,
-                "demanda judicial" INTEGER DEFAULT 0,
-                "valor demanda" REAL,
-                "problemas justicia" INTEGER DEFAULT 0,
-                "detalle justicia" TEXT
-            )
-        """)
-        
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS Usuarios (
-                id {sql_type("SERIAL PRIMARY KEY")},
-                usuario TEXT UNIQUE NOT NULL,
-                clave_hash TEXT NOT NULL, 
-                nivel_acceso INTEGER NOT NULL
-            )
-        """)
-        
-        cursor.execute("SELECT COUNT(*) FROM Usuarios")
-        if cursor.fetchone()[0] == 0:
-            hash_admin = generar_hash('cyberpol2022') 
-            cursor.execute("INSERT INTO Usuarios (usuario, clave_hash, nivel_acceso) VALUES (%s, %s, %s)", ('Paul', hash_admin, 1))
-
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Error DB: {e}")
-    finally: db_manager.release_connection(conn)
+    """Compatibilidad: el esquema base ahora es la migración 1 (ver migraciones.py)."""
+    migrar_db()
 
 def migrar_db():
-    conn, cursor = conectar_db()
+    """Aplica las migraciones pendientes; si el esquema está al día solo compara la versión."""
     try:
-        # Verificar si existe la column_name de Clientes
-        columnas = get_column_names(cursor, 'Clientes')
-        
-        # Lista de columnas a verificar/agregar en Clientes
-        cols_to_add = [
-            ('referencia_vivienda', 'TEXT'),
-            ('situacion_financiera', 'TEXT'),
-            ('terreno', 'INTEGER DEFAULT 0'),
-            ('valor_terreno', 'REAL'),
-            ('hipotecado', 'TEXT'),
-            ('fuente_ingreso', 'TEXT'),
-            ('ingresos_mensuales_2', 'REAL'),
-            ('fuente_ingreso_2', 'TEXT'),
-            ('casa_dep', 'INTEGER DEFAULT 0'),
-            ('valor_casa_dep', 'REAL'),
-            ('hipotecado_casa_dep', 'TEXT'),
-            ('local', 'INTEGER DEFAULT 0'),
-            ('valor_local', 'REAL'),
-            ('hipotecado_local', 'TEXT'),
-            ('score_buro', 'INTEGER'),
-            ('egresos', 'REAL'),
-            ('total_disponible', 'REAL'),
-            ('valor_apertura', 'REAL')
-        ]
-
-        for col_name, col_type in cols_to_add:
-            if col_name not in columnas:
-                print(f"Migrando DB: Agregando columna '{col_name}' a Clientes...")
-                cursor.execute(f"ALTER TABLE Clientes ADD COLUMN {col_name} {col_type}")
-                conn.commit()
-
-        # Migración Usuarios
-        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'usuarios'")
-        cols_user = [row[0] for row in cursor.fetchall()]
-        if 'estado' not in cols_user:
-            print("Migrando DB: Agregando 'estado' a Usuarios...")
-            cursor.execute("ALTER TABLE Usuarios ADD COLUMN estado INTEGER DEFAULT 1")
-            conn.commit()
-        if 'rol' not in cols_user:
-            print("Migrando DB: Agregando 'rol' a Usuarios...")
-            cursor.execute("ALTER TABLE Usuarios ADD COLUMN rol TEXT")
-            cursor.execute("UPDATE Usuarios SET rol = 'Administrador' WHERE nivel_acceso = 1")
-            cursor.execute("UPDATE Usuarios SET rol = 'Usuario' WHERE nivel_acceso = 2")
-            conn.commit()
-
-        # Tabla Auditoria
-        if not check_table_exists(cursor, 'Auditoria'):
-            print("Migrando DB: Creando tabla 'Auditoria'...")
-            cursor.execute(f"""
-                CREATE TABLE Auditoria (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    id_usuario TEXT,
-                    accion TEXT,
-                    id_cliente TEXT,
-                    detalles TEXT,
-                    timestamp TEXT
-                )
-            """)
-            conn.commit()
-
-        # Tabla Documentos
-        if not check_table_exists(cursor, 'Documentos'):
-            print("Migrando DB: Creando tabla 'Documentos'...")
-            cursor.execute(f"""
-                CREATE TABLE Documentos (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT NOT NULL,
-                    nombre_archivo TEXT NOT NULL,
-                    tipo_documento TEXT,
-                    ruta_archivo TEXT NOT NULL,
-                    fecha_subida TEXT NOT NULL,
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-
-        # Tabla Microcreditos
-        if not check_table_exists(cursor, 'Microcreditos'):
-            print("Migrando DB: Creando tabla 'Microcreditos'...")
-            cursor.execute(f"""
-                CREATE TABLE Microcreditos (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT NOT NULL,
-                    ruc TEXT,
-                    observaciones TEXT,
-                    observaciones_info TEXT,
-                    
-                    ref1_relacion TEXT, ref1_tiempo_conocer TEXT, ref1_direccion TEXT, ref1_tipo_vivienda TEXT, ref1_cargas TEXT, ref1_patrimonio TEXT, ref1_responsable TEXT,
-                    ref2_relacion TEXT, ref2_tiempo_conocer TEXT, ref2_direccion TEXT, ref2_tipo_vivienda TEXT, ref2_cargas TEXT, ref2_patrimonio TEXT, ref2_responsable TEXT,
-                    
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-        else:
-            # Si ya existe, verificar columnas faltantes
-            cols_micro = get_column_names(cursor, 'Microcreditos')
-            
-            micro_cols_to_add = [
-                ('observaciones_info', 'TEXT'),
-                ('ref1_fecha', 'TEXT'), ('ref1_hora', 'TEXT'), ('ref1_nombre', 'TEXT'), ('ref1_telefono', 'TEXT'),
-                ('ref2_fecha', 'TEXT'), ('ref2_hora', 'TEXT'), ('ref2_nombre', 'TEXT'), ('ref2_telefono', 'TEXT'),
-                ('status', 'TEXT'), ('sub_status', 'TEXT'),
-                ('fecha_desembolsado', 'TEXT'), ('fecha_negado', 'TEXT'), ('fecha_desistimiento', 'TEXT'), ('fecha_comite', 'TEXT')
-            ]
-            
-            for col_name, col_type in micro_cols_to_add:
-                if col_name not in cols_micro:
-                    print(f"Migrando DB: Agregando columna '{col_name}' a Microcreditos...")
-                    cursor.execute(f"ALTER TABLE Microcreditos ADD COLUMN {col_name} {col_type}")
-                    conn.commit()
-
-        # Tabla Rehabilitacion
-        if not check_table_exists(cursor, 'Rehabilitacion'):
-            print("Migrando DB: Creando tabla 'Rehabilitacion'...")
-            cursor.execute(f"""
-                CREATE TABLE Rehabilitacion (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT UNIQUE NOT NULL,
-                    fecha_inicio TEXT,
-                    terminos TEXT,
-                    resultado TEXT,
-                    finalizado INTEGER DEFAULT 0,
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-
-        # Tabla visitas_microcredito
-        if not check_table_exists(cursor, 'visitas_microcredito'):
-            print("Migrando DB: Creando tabla 'visitas_microcredito'...")
-            cursor.execute(f"""
-                CREATE TABLE visitas_microcredito (
-                    id {sql_type("SERIAL PRIMARY KEY")},
-                    cedula_cliente TEXT NOT NULL,
-                    fecha TEXT,
-                    observaciones TEXT,
-                    FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
-                )
-            """)
-            conn.commit()
-
-        # Migración Usuario Admin -> Paul
-        cursor.execute("SELECT id FROM Usuarios WHERE usuario='admin'")
-        admin_user = cursor.fetchone()
-        if admin_user:
-            print("Migrando usuario admin a Paul...")
-            new_hash = generar_hash('cyberpol2022')
-            cursor.execute("UPDATE Usuarios SET usuario=%s, clave_hash=%s WHERE id=%s", ('Paul', new_hash, admin_user[0]))
-            conn.commit()
-            
+        aplicar_migraciones(db_manager)
     except Exception as e:
-        conn.rollback()
         print(f"Error Migración: {e}")
-    finally: db_manager.release_connection(conn)
 
 def registrar_auditoria(usuario, accion, id_cliente=None, detalles=None):
     """Registra una acción en la tabla de Auditoria"""
@@ -282,7 +81,6 @@ def registrar_auditoria(usuario, accion, id_cliente=None, detalles=None):
     finally: db_manager.release_connection(conn)
 
 # Inicializar DB al importar
-crear_tablas()
 migrar_db()
 
 # =================================================================
@@ -415,7 +213,9 @@ def buscar_clientes_db(termino):
     conn, cursor = conectar_db()
     t = '%' + termino + '%'
     cursor.row_factory = sqlite3.Row
-    cursor.execute("SELECT * FROM Clientes WHERE nombre LIKE %s OR cedula LIKE %s OR ruc LIKE %s OR numero_carpeta LIKE %s", (t,t,t,t))
+    if not any(ch.isdigit() for ch in termino):
+        return [dict(row) for row in buscar_por_nombre(db_manager, cursor, termino, limite=200)]
+    cursor.execute("SELECT * FROM Clientes WHERE cedula LIKE %s OR ruc LIKE %s OR numero_carpeta LIKE %s", (t,t,t))
     return [dict(row) for row in cursor.fetchall()]
 
 def eliminar_cliente_db(id_cliente):
@@ -2,24 +2,396 @@ import psycopg2
 from psycopg2 import pool, OperationalError
 import psycopg2.extras
 import sqlite3
+import csv
+import io
 import os
+import re
+import threading
+import time
+import weakref
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from diario_offline import DiarioOffline, clasificar_escritura
+from metricas_sql import MetricasSQL
+
+# =================================================================
+# COMPILADOR DE DIALECTO
+# =================================================================
+
+# Tablas cuyas búsquedas puntuales se preparan en el servidor (PostgreSQL)
+TABLAS_PREPARADAS = ("clientes", "pagos", "caja")
+_RE_TABLA_CALIENTE = re.compile(r"\bFROM\s+(%s)\b" % "|".join(TABLAS_PREPARADAS), re.IGNORECASE)
+# Proyecciones con * (SELECT *, c.*, t.*, ...): COUNT(*) no cuenta
+_RE_SELECT_TODO = re.compile(r"(^|[\s,.])\*\s*(,|FROM\b)", re.IGNORECASE)
+
+# Sentencias ya preparadas por conexión: {nombre: sql_prepare} (se liberan con la conexión)
+_PREPARADAS = weakref.WeakKeyDictionary()
+_PREPARADAS_LOCK = threading.Lock()
+
+SentenciaCompilada = namedtuple("SentenciaCompilada", "sql nombre sql_prepare n_params")
+
+
+def _traducir(query, marcador):
+    """
+    Recorre la sentencia respetando literales ('...') e identificadores ("...").
+    `marcador(n)` devuelve el reemplazo del n-ésimo %s, o None para dejarlo igual.
+    Retorna (sql, n_params, usa_nombres).
+    """
+    out = []
+    i, n, comilla, usa_nombres = 0, 0, None, False
+    largo = len(query)
+    while i < largo:
+        ch = query[i]
+        if comilla:
+            if ch == comilla:
+                comilla = None
+            elif ch == "%" and query.startswith("%%", i):
+                out.append("%")
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+            continue
+        if ch in ("'", '"'):
+            comilla = ch
+        elif ch == "%":
+            if query.startswith("%%", i):
+                out.append("%")
+                i += 2
+                continue
+            if query.startswith("%s", i):
+                n += 1
+                rep = marcador(n)
+                out.append(rep if rep is not None else "%s")
+                i += 2
+                continue
+            if query.startswith("%(", i):
+                fin = query.find(")s", i)
+                if fin != -1:
+                    usa_nombres = True
+                    out.append(":" + query[i + 2:fin])
+                    i = fin + 2
+                    continue
+        out.append(ch)
+        i += 1
+    return "".join(out), n, usa_nombres
+
+
+@lru_cache(maxsize=1024)
+def compilar_sql(query, mode):
+    """
+    Traduce una sentencia con marcadores de psycopg2 (%s, %(nombre)s) al motor activo.
+    El resultado se cachea por texto, así cada sentencia distinta se traduce una sola vez.
+    """
+    if mode == "SQLITE":
+        sql, n, _ = _traducir(query, lambda _: "?")
+        return SentenciaCompilada(sql, None, None, n)
+
+    # PostgreSQL: psycopg2 interpola el texto original; solo se arma la versión PREPARE
+    # para las búsquedas puntuales de las tablas calientes.
+    # (SELECT * y alias.* quedan fuera: un ALTER TABLE invalidaría el plan preparado)
+    texto = query.strip()
+    if (not texto[:6].upper() == "SELECT" or ";" in texto or "%(" in texto
+            or _RE_SELECT_TODO.search(texto) or not _RE_TABLA_CALIENTE.search(texto)):
+        return SentenciaCompilada(query, None, None, texto.count("%s"))
+
+    sql_prep, n, _ = _traducir(texto, lambda k: f"${k}")
+    if n == 0:
+        return SentenciaCompilada(query, None, None, 0)
+    nombre = "alz_" + hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+    return SentenciaCompilada(query, nombre, f"PREPARE {nombre} AS {sql_prep}", n)
+
+
+# =================================================================
+# CATÁLOGO DE ESQUEMA
+# =================================================================
+
+_RE_DDL = re.compile(r"\s*(CREATE\s+(TEMP\w*\s+|VIRTUAL\s+)?TABLE|ALTER\s+TABLE|DROP\s+TABLE)\b", re.IGNORECASE)
+
+
+class CatalogoEsquema:
+    """
+    Caché de tablas y columnas del esquema.
+    Se carga con una sola consulta y solo se invalida cuando la aplicación ejecuta DDL.
+    """
+    SQL_CATALOGO = {
+        "POSTGRES": """
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+            ORDER BY table_name, ordinal_position
+        """,
+        "SQLITE": """
+            SELECT m.name, p.name FROM sqlite_master m, pragma_table_info(m.name) p
+            WHERE m.type = 'table'
+            ORDER BY m.name, p.cid
+        """,
+    }
+
+    def __init__(self, mode):
+        self.mode = mode
+        self._tablas = None  # nombre en minúsculas -> [columnas]
+        self._lock = threading.Lock()
+        self.cargas = 0
+
+    def _asegurar(self, cursor):
+        with self._lock:
+            if self._tablas is not None:
+                return self._tablas
+        cursor.execute(self.SQL_CATALOGO[self.mode])
+        tablas = {}
+        for row in cursor.fetchall():
+            tablas.setdefault(row[0].lower(), []).append(row[1])
+        with self._lock:
+            self._tablas = tablas
+            self.cargas += 1
+        return tablas
+
+    def columnas(self, cursor, tabla):
+        return list(self._asegurar(cursor).get(tabla.lower(), []))
+
+    def existe(self, cursor, tabla):
+        return tabla.lower() in self._asegurar(cursor)
+
+    def invalidar(self):
+        with self._lock:
+            self._tablas = None
+
 
 class CursorProxy:
     """Proxy para el cursor que normaliza consultas entre PostgreSQL y SQLite"""
-    def __init__(self, cursor, mode):
+    _medicion = None
+
+    def __init__(self, cursor, mode, catalogo=None, diario=None, metricas=None):
         self.cursor = cursor
         self.mode = mode
+        self.catalogo = catalogo
+        self.diario = diario
+        self.metricas = metricas
+
     def execute(self, query, params=None):
-        if self.mode == "SQLITE":
-            query = query.replace("%s", "?")
-        if params is not None:
-            return self.cursor.execute(query, params)
-        return self.cursor.execute(query)
+        if self.metricas is not None:
+            return self._medir(self._despachar, query, params)
+        return self._despachar(query, params)
+
+    def _despachar(self, query, params):
+        if self.diario is not None:
+            escritura = clasificar_escritura(query)
+            if escritura:
+                return self._execute_con_diario(query, params, *escritura)
+        return self._execute(query, params)
+
+    def _execute_con_diario(self, query, params, tipo, tabla):
+        """Modo LOCAL: ejecuta la escritura y la anota en el diario offline."""
+        cedula = self.diario.cedula_de(self.cursor, query, params, tipo, tabla)
+        sql_diario, params_diario = self.diario.con_clave_natural(self.cursor, query, params, tipo, tabla)
+        resultado = self._execute(query, params)
+        self.diario.registrar(self.cursor.connection, sql_diario, params_diario, tipo, tabla, cedula)
+        return resultado
+
+    def _execute(self, query, params):
+        if params is None:
+            if self.catalogo is not None and _RE_DDL.match(query):
+                self.catalogo.invalidar()
+            # Sin parámetros ningún driver interpreta los marcadores
+            return self.cursor.execute(query)
+
+        comp = compilar_sql(query, self.mode)
+        if comp.nombre and isinstance(params, (tuple, list)) and len(params) == comp.n_params:
+            return self._execute_preparada(comp, params)
+        return self.cursor.execute(comp.sql, params)
+
+    # --- Instrumentación (solo si DatabaseManager.activar_metricas) ---
+
+    def _medir(self, funcion, query, params):
+        self._cerrar_medicion()
+        medicion = self.metricas.iniciar(query)
+        try:
+            return funcion(query, params)
+        finally:
+            medicion.segundos = time.perf_counter() - medicion.inicio
+            medicion.filas = self.cursor.rowcount
+            self._medicion = medicion
+
+    def _cerrar_medicion(self, filas=None):
+        medicion, self._medicion = self._medicion, None
+        if medicion is not None:
+            self.metricas.cerrar(medicion, filas)
+
+    def _leer(self, metodo, *args):
+        if self._medicion is None:
+            return getattr(self.cursor, metodo)(*args)
+        inicio = time.perf_counter()
+        resultado = getattr(self.cursor, metodo)(*args)
+        self._medicion.segundos += time.perf_counter() - inicio
+        return resultado
+
+    def fetchall(self):
+        filas = self._leer("fetchall")
+        if self._medicion is not None:
+            self._cerrar_medicion(len(filas))
+        return filas
+
+    def fetchone(self):
+        return self._leer("fetchone")
+
+    def fetchmany(self, *args):
+        return self._leer("fetchmany", *args)
+
+    def close(self):
+        self._cerrar_medicion()
+        return self.cursor.close()
+
+    def __del__(self):
+        if self._medicion is not None:
+            self._cerrar_medicion()
+
+    def executemany(self, query, seq_params):
+        if self.metricas is not None:
+            return self._medir(self._executemany, query, seq_params)
+        return self._executemany(query, seq_params)
+
+    def _executemany(self, query, seq_params):
+        escritura = clasificar_escritura(query) if self.diario is not None else None
+        if escritura and escritura[0] == "INSERT":
+            # Un solo executemany para los datos y otro para el diario
+            seq_params = list(seq_params)
+            tipo, tabla = escritura
+            cedulas = [self.diario.cedula_de(self.cursor, query, p, tipo, tabla) for p in seq_params]
+            resultado = self.cursor.executemany(compilar_sql(query, self.mode).sql, seq_params)
+            self.diario.registrar_lote(self.cursor.connection, query, seq_params, tipo, tabla, cedulas)
+            return resultado
+        if escritura:
+            # UPDATE/DELETE: la cédula se busca fila por fila antes de escribir
+            for params in seq_params:
+                self.execute(query, params)
+            return self.cursor
+        return self.cursor.executemany(compilar_sql(query, self.mode).sql, seq_params)
+
+    def _execute_preparada(self, comp, params):
+        """Ejecuta una sentencia preparada en el servidor (PREPARE una vez por conexión)."""
+        conn = self.cursor.connection
+        try:
+            with _PREPARADAS_LOCK:
+                preparadas = _PREPARADAS.setdefault(conn, {})
+        except TypeError:
+            # Conexión sin soporte de weakref: ejecución normal
+            return self.cursor.execute(comp.sql, params)
+        previa = preparadas.get(comp.nombre)
+        if previa != comp.sql_prepare:
+            if previa is not None:
+                # Colisión de nombre con otra sentencia: no reutilizar su plan
+                return self.cursor.execute(comp.sql, params)
+            self.cursor.execute(comp.sql_prepare)
+            preparadas[comp.nombre] = comp.sql_prepare
+        marcadores = ", ".join(["%s"] * comp.n_params)
+        try:
+            return self.cursor.execute(f"EXECUTE {comp.nombre} ({marcadores})", params)
+        except psycopg2.Error as e:
+            if getattr(e, "pgcode", None) == "26000":  # invalid_sql_statement_name
+                preparadas.clear()
+            raise
+
     def __getattr__(self, name):
         return getattr(self.cursor, name)
     def __iter__(self):
         return iter(self.cursor)
 
+class SQLitePool:
+    """
+    Pool de conexiones SQLite para el modo LOCAL.
+    Mantiene conexiones "calientes" por hilo y aplica un perfil de rendimiento
+    (WAL, busy timeout, mmap, caché de páginas) al abrirlas.
+    """
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA mmap_size=268435456",   # 256 MB
+        "PRAGMA cache_size=-20000",     # ~20 MB de caché de páginas
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    def __init__(self, db_path, max_idle_per_thread=4):
+        self.db_path = db_path
+        self.max_idle_per_thread = max_idle_per_thread
+        self._lock = threading.Lock()
+        self._idle = {}      # thread_id -> [conexiones libres]
+        self._in_use = set()
+        self._stats = {"abiertas": 0, "reutilizadas": 0, "cerradas": 0, "descartadas": 0}
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.Error as e:
+                print(f"Aviso SQLite ({pragma}): {e}")
+        with self._lock:
+            self._stats["abiertas"] += 1
+        return conn
+
+    def _cerrar(self, conn):
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._stats["cerradas"] += 1
+
+    def getconn(self):
+        tid = threading.get_ident()
+        with self._lock:
+            libres = self._idle.get(tid)
+            if libres:
+                conn = libres.pop()
+                self._stats["reutilizadas"] += 1
+                self._in_use.add(id(conn))
+                return conn
+        conn = self._abrir()
+        with self._lock:
+            self._in_use.add(id(conn))
+        return conn
+
+    def putconn(self, conn):
+        # Igual que el pool de psycopg2: no devolver transacciones abiertas
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._lock:
+                self._in_use.discard(id(conn))
+                self._stats["descartadas"] += 1
+            self._cerrar(conn)
+            return
+
+        tid = threading.get_ident()
+        with self._lock:
+            self._in_use.discard(id(conn))
+            libres = self._idle.setdefault(tid, [])
+            if len(libres) < self.max_idle_per_thread:
+                libres.append(conn)
+                return
+        self._cerrar(conn)
+
+    def closeall(self):
+        with self._lock:
+            pendientes = [c for libres in self._idle.values() for c in libres]
+            self._idle.clear()
+        for conn in pendientes:
+            self._cerrar(conn)
+
+    def stats(self):
+        with self._lock:
+            libres = sum(len(l) for l in self._idle.values())
+            return dict(self._stats, libres=libres, en_uso=len(self._in_use), hilos=len(self._idle))
+
+
 class DatabaseManager:
     """
     Clase centralizada para la gestión de conexiones PostgreSQL con Pooling.
@@ -36,9 +408,18 @@ class DatabaseManager:
             "client_encoding": "utf8"
         }
         self.connection_pool = None
+        self.sqlite_pool = None
         self.mode = "POSTGRES"
         self.db_local = "Alianza_Backup_Local.db"
+        self.diario = DiarioOffline(self.db_local)
+        self.intervalo_sonda = 30  # segundos entre intentos de reconexión
+        self._min_conn, self._max_conn = min_conn, max_conn
+        self._modo_lock = threading.Lock()
+        self._detener_sonda = threading.Event()
+        self.metricas = None  # ver activar_metricas()
+        self.conflictos_sin_avisar = 0  # conflictos de la última replicación (ver tomar_conflictos)
         self._initialize_pool(min_conn, max_conn)
+        self.catalogo = CatalogoEsquema(self.mode)
 
     def _initialize_pool(self, min_conn, max_conn):
         try:
@@ -46,36 +427,190 @@ class DatabaseManager:
                 min_conn, max_conn, **self.config
             )
             print("PostgreSQL Connection Pool inicializado correctamente.")
+            # Escrituras offline de una sesión anterior
+            if os.path.exists(self.db_local) and self.diario.pendientes():
+                threading.Thread(target=self._replicar_pendientes, daemon=True).start()
         except (OperationalError, Exception) as e:
             print(f"PostgreSQL no disponible ({e}). Activando modo LOCAL (SQLite).")
             self.mode = "SQLITE"
+            self.sqlite_pool = SQLitePool(self.db_local)
+            conn = self.sqlite_pool.getconn()
+            try:
+                self.diario.asegurar_tabla(conn)
+            finally:
+                self.sqlite_pool.putconn(conn)
+            threading.Thread(target=self._sonda_reconexion, daemon=True).start()
+
+    # -----------------------------------------------------------------
+    # Fail-back SQLite -> PostgreSQL
+    # -----------------------------------------------------------------
+
+    def _replicar_pendientes(self):
+        """Replica el diario offline usando una conexión del pool de PostgreSQL."""
+        conn = self.connection_pool.getconn()
+        try:
+            desde = self.diario.inicio_pendientes()
+            resumen = self.diario.replicar(conn)
+            if resumen["replicadas"] or resumen["conflictos"]:
+                print(f"Diario offline replicado: {resumen['replicadas']} escrituras, "
+                      f"{resumen['conflictos']} conflictos (ver tabla diario_offline).")
+            self.conflictos_sin_avisar += resumen["conflictos"]
+            if desde:
+                self._regenerar_cuotas(conn, desde)
+        except Exception as e:
+            print(f"Error replicando diario offline: {e}")
+        finally:
+            self.connection_pool.putconn(conn)
+
+    def tomar_conflictos(self):
+        """Conflictos de replicación aún no avisados en la interfaz (y los marca avisados)."""
+        n, self.conflictos_sin_avisar = self.conflictos_sin_avisar, 0
+        return n
+
+    def _regenerar_cuotas(self, conn, desde):
+        """Cuotas no viaja en el diario: el servidor genera las tablas y marca los pagos offline."""
+        import cuotas  # diferido: cuotas depende de numpy (amortizacion)
+        try:
+            cursor = self.get_cursor(conn)
+            if not self.check_table_exists(cursor, cuotas.TABLA):
+                return
+            generadas = cuotas.regenerar_tras_replicar(cursor, desde)
+            conn.commit()
+            if generadas:
+                print(f"Tablas de amortización generadas en el servidor: {generadas}")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error regenerando Cuotas en el servidor: {e}")
+
+    def _sonda_reconexion(self):
+        """Hilo de fondo: reintenta el servidor y, al volver, replica y cambia de modo."""
+        while not self._detener_sonda.wait(self.intervalo_sonda):
+            try:
+                nuevo_pool = pool.ThreadedConnectionPool(self._min_conn, self._max_conn, **self.config)
+            except Exception:
+                continue
+            print("Servidor PostgreSQL disponible nuevamente. Replicando escrituras offline...")
+            with self._modo_lock:
+                self.connection_pool = nuevo_pool
+                self.mode = "POSTGRES"
+                self.catalogo = CatalogoEsquema("POSTGRES")
+            # Lo escrito en conexiones SQLite que seguían abiertas durante el cambio
+            # también queda en el diario, por eso se replica después de cambiar.
+            self._replicar_pendientes()
+            return
 
     def get_connection(self):
         """Obtiene una conexión."""
-        if self.mode == "SQLITE":
-            conn = sqlite3.connect(self.db_local)
-            conn.row_factory = sqlite3.Row
-            return conn
-        
+        with self._modo_lock:
+            if self.mode == "SQLITE":
+                return self.sqlite_pool.getconn()
+
         if not self.connection_pool:
             raise ConnectionError("No hay conexión con el servidor y el pool no está inicializado.")
         return self.connection_pool.getconn()
 
-    def get_cursor(self, conn):
-        """Retorna un cursor normalizado (CursorProxy)."""
-        if self.mode == "SQLITE":
-            return CursorProxy(conn.cursor(), "SQLITE")
-        return CursorProxy(conn.cursor(cursor_factory=psycopg2.extras.DictCursor), "POSTGRES")
+    def get_cursor(self, conn, diario=True):
+        """
+        Retorna un cursor normalizado (CursorProxy).
+        En modo LOCAL las escrituras se anotan en el diario offline salvo diario=False.
+        """
+        if isinstance(conn, sqlite3.Connection):
+            return CursorProxy(conn.cursor(), "SQLITE", self.catalogo, self.diario if diario else None, self.metricas)
+        return CursorProxy(conn.cursor(cursor_factory=psycopg2.extras.DictCursor), "POSTGRES", self.catalogo,
+                           metricas=self.metricas)
 
     def release_connection(self, conn):
-        """Libera o cierra una conexión."""
-        if self.mode == "SQLITE":
-            conn.close()
+        """Devuelve la conexión a su pool."""
+        if isinstance(conn, sqlite3.Connection):
+            self.sqlite_pool.putconn(conn)
             return
-            
+
         if self.connection_pool:
             self.connection_pool.putconn(conn)
 
+    # -----------------------------------------------------------------
+    # Escrituras masivas
+    # -----------------------------------------------------------------
+
+    @staticmethod
+    def _filas_csv(filas):
+        """Buffer CSV para COPY FROM STDIN; None se escribe como \\N (marcador NULL del COPY)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for fila in filas:
+            writer.writerow([r"\N" if v is None else v for v in fila])
+        buffer.seek(0)
+        return buffer
+
+    def insertar_lote(self, tabla, columnas, filas, conn=None, copy=False, tamano_pagina=1000):
+        """
+        Inserta muchas filas de una vez.
+        PostgreSQL: execute_values (o COPY FROM STDIN con copy=True).
+        SQLite: executemany dentro de una sola transacción (anotado en el diario offline).
+        Si se pasa `conn`, el commit queda a cargo de quien llama. Retorna la cantidad de filas.
+        """
+        filas = [tuple(f) for f in filas]
+        if not filas:
+            return 0
+        cols = ", ".join(columnas)
+
+        def escribir(c):
+            if isinstance(c, sqlite3.Connection):
+                marcas = ", ".join(["%s"] * len(columnas))
+                self.get_cursor(c).executemany(f"INSERT INTO {tabla} ({cols}) VALUES ({marcas})", filas)
+                return
+            cursor = c.cursor()
+            try:
+                if copy:
+                    cursor.copy_expert(f"COPY {tabla} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", self._filas_csv(filas))
+                else:
+                    psycopg2.extras.execute_values(
+                        cursor, f"INSERT INTO {tabla} ({cols}) VALUES %s", filas, page_size=tamano_pagina)
+            finally:
+                cursor.close()
+
+        self._en_transaccion(conn, escribir)
+        return len(filas)
+
+    def ejecutar_lote(self, query, seq_params, conn=None, tamano_pagina=1000):
+        """
+        Ejecuta la misma sentencia (UPDATE/DELETE/INSERT) para cada juego de parámetros.
+        PostgreSQL: execute_batch (menos viajes al servidor). SQLite: executemany en una transacción.
+        """
+        seq_params = list(seq_params)
+        if not seq_params:
+            return 0
+
+        def escribir(c):
+            if isinstance(c, sqlite3.Connection):
+                self.get_cursor(c).executemany(query, seq_params)
+                return
+            cursor = c.cursor()
+            try:
+                psycopg2.extras.execute_batch(cursor, query, seq_params, page_size=tamano_pagina)
+            finally:
+                cursor.close()
+
+        self._en_transaccion(conn, escribir)
+        return len(seq_params)
+
+    def _en_transaccion(self, conn, funcion):
+        """Corre funcion(conn); con conexión propia hace commit/rollback y la devuelve al pool."""
+        if conn is not None:
+            return funcion(conn)
+        conn = self.get_connection()
+        try:
+            if isinstance(conn, sqlite3.Connection):
+                conn.execute("BEGIN")
+            resultado = funcion(conn)
+            conn.commit()
+            return resultado
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
     def sql_type(self, type_str):
         """Normaliza tipos de datos según el motor activo."""
         if self.mode == "SQLITE":
@@ -84,23 +619,42 @@ class DatabaseManager:
         return type_str
 
     def get_column_names(self, cursor, table_name):
-        """Retorna lista de nombres de columnas."""
-        if self.mode == "SQLITE":
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            return [info[1] for info in cursor.fetchall()]
-        else:
-            cursor.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_name.lower()}'")
-            return [row[0] for row in cursor.fetchall()]
+        """Retorna lista de nombres de columnas (desde el catálogo en caché)."""
+        return self.catalogo.columnas(cursor, table_name)
 
     def check_table_exists(self, cursor, table_name):
-        """Verifica si una tabla existe."""
+        """Verifica si una tabla existe (desde el catálogo en caché)."""
+        return self.catalogo.existe(cursor, table_name)
+
+    def pool_stats(self):
+        """Estadísticas del pool activo (para diagnóstico)."""
         if self.mode == "SQLITE":
-            cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        else:
-            cursor.execute(f"SELECT table_name FROM information_schema.tables WHERE table_name = '{table_name.lower()}'")
-        return cursor.fetchone() is not None
+            return dict(self.sqlite_pool.stats(), modo="SQLITE")
+        if not self.connection_pool:
+            return {"modo": "POSTGRES", "disponible": False}
+        return {
+            "modo": "POSTGRES",
+            "libres": len(self.connection_pool._pool),
+            "en_uso": len(self.connection_pool._used),
+            "max": self.connection_pool.maxconn,
+        }
+
+    def activar_metricas(self, umbral_ms=300, umbrales=None, archivo="consultas_lentas.log", **kwargs):
+        """
+        Activa la instrumentación por sentencia (latencia, filas, módulo que llama)
+        y el log rotativo de consultas lentas. Aplica a los cursores creados desde ahora.
+        """
+        self.metricas = MetricasSQL(umbral_ms=umbral_ms, umbrales=umbrales, archivo=archivo, **kwargs)
+        return self.metricas
+
+    def resumen_consultas(self, top=20):
+        """p50/p95/p99 por sentencia normalizada ([] si la instrumentación está apagada)."""
+        return self.metricas.resumen(top) if self.metricas else []
 
     def close_all_connections(self):
         """Cierra todas las conexiones al salir."""
+        self._detener_sonda.set()
+        if self.sqlite_pool:
+            self.sqlite_pool.closeall()
         if self.mode == "POSTGRES" and self.connection_pool:
             self.connection_pool.closeall()
@@ -0,0 +1,291 @@
+"""
+Diario de escrituras offline y replicación hacia PostgreSQL.
+
+Mientras DatabaseManager trabaja en modo LOCAL (SQLite), cada INSERT/UPDATE/DELETE
+se anota en la tabla diario_offline con el SQL original (dialecto psycopg2) y sus
+parámetros, dentro de la misma transacción que la escritura. Cuando el servidor
+vuelve, replicar() envía el diario a PostgreSQL en lotes, detectando conflictos
+por cédula.
+
+Los ids locales no existen en el servidor: un UPDATE/DELETE "WHERE id=%s" se
+replica por cédula (TABLAS_CEDULA_UNICA) o se anota ya traducido a una clave
+natural (TABLAS_CLAVE_NATURAL). Lo que no se puede aplicar queda como CONFLICTO
+y la interfaz lo avisa (conflictos()).
+"""
+import base64
+import datetime
+import json
+import re
+import sqlite3
+from functools import lru_cache
+
+_RE_ESCRITURA = re.compile(r"\s*(INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+\"?(\w+)\"?", re.IGNORECASE)
+_RE_COLUMNAS_INSERT = re.compile(r"INSERT\s+INTO\s+\"?\w+\"?\s*\((.*?)\)\s*VALUES\s*\((.*?)\)\s*$", re.IGNORECASE | re.DOTALL)
+_RE_WHERE_ID = re.compile(r"\bWHERE\s+id\s*=\s*%s\s*$", re.IGNORECASE)
+
+# Tablas cuya cédula es UNIQUE: permiten traducir "WHERE id=%s" (ids locales) a la cédula
+TABLAS_CEDULA_UNICA = {
+    "clientes": "cedula",
+    "rehabilitacion": "cedula_cliente",
+    "intermediacion_detalles": "cedula_cliente",
+}
+# Tablas sin cédula única: "WHERE id=%s" se traduce al anotar a la n-ésima fila (por id)
+# con los mismos valores en estas columnas, que el servidor resuelve con sus propios ids
+TABLAS_CLAVE_NATURAL = {
+    "microcreditos": ("cedula_cliente",),
+    "documentos": ("cedula_cliente", "ruta_archivo"),
+    "caja": ("cedula", "ruc"),
+    "usuarios": ("usuario",),
+}
+# Cuotas se escribe por id de crédito local: no se replica, el servidor la regenera
+# (DatabaseManager._replicar_pendientes -> cuotas.regenerar_tras_replicar)
+TABLAS_EXCLUIDAS = ("schema_version", "diario_offline", "cuotas")
+
+
+@lru_cache(maxsize=512)
+def clasificar_escritura(query):
+    """Retorna (tipo, tabla) si la sentencia es INSERT/UPDATE/DELETE; None en otro caso."""
+    m = _RE_ESCRITURA.match(query)
+    if not m:
+        return None
+    tabla = m.group(2).lower()
+    if tabla in TABLAS_EXCLUIDAS:
+        return None
+    return m.group(1).split()[0].upper(), tabla
+
+
+@lru_cache(maxsize=512)
+def _indice_cedula_insert(query, col_cedula):
+    """Posición del parámetro de la cédula en un INSERT ... VALUES (%s, ...)."""
+    m = _RE_COLUMNAS_INSERT.search(query.strip())
+    if not m:
+        return None
+    columnas = [c.strip().strip('"').lower() for c in m.group(1).split(",")]
+    valores = [v.strip() for v in m.group(2).split(",")]
+    if col_cedula not in columnas or any(v != "%s" for v in valores):
+        return None
+    return columnas.index(col_cedula)
+
+
+def _serializar(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return json.dumps({"__dict__": {k: _valor_json(v) for k, v in params.items()}})
+    return json.dumps([_valor_json(v) for v in params])
+
+
+def _valor_json(v):
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return {"__b64__": base64.b64encode(bytes(v)).decode("ascii")}
+    if isinstance(v, (datetime.date, datetime.datetime)):
+        return v.isoformat()
+    return v
+
+
+def _deserializar(texto):
+    if texto is None:
+        return None
+    data = json.loads(texto)
+    if isinstance(data, dict):
+        return {k: _valor_python(v) for k, v in data["__dict__"].items()}
+    return tuple(_valor_python(v) for v in data)
+
+
+def _valor_python(v):
+    if isinstance(v, dict) and "__b64__" in v:
+        return base64.b64decode(v["__b64__"])
+    return v
+
+
+class DiarioOffline:
+    """Diario append-only de escrituras hechas en modo LOCAL."""
+    TABLA = "diario_offline"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def asegurar_tabla(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLA} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                registrado TEXT,
+                tipo TEXT,
+                tabla TEXT,
+                cedula TEXT,
+                sql TEXT NOT NULL,
+                params TEXT,
+                estado TEXT DEFAULT 'PENDIENTE',
+                detalle TEXT
+            )
+        """)
+        conn.commit()
+
+    def cedula_de(self, cursor, query, params, tipo, tabla):
+        """Cédula afectada por la escritura (se consulta ANTES de ejecutarla)."""
+        col = TABLAS_CEDULA_UNICA.get(tabla)
+        if not col or params is None or isinstance(params, dict):
+            return None
+        try:
+            if tipo == "INSERT":
+                idx = _indice_cedula_insert(query, col)
+                return params[idx] if idx is not None and idx < len(params) else None
+            if _RE_WHERE_ID.search(query):
+                row = cursor.execute(f"SELECT {col} FROM {tabla} WHERE id = ?", (params[-1],)).fetchone()
+                return row[0] if row else None
+        except (sqlite3.Error, IndexError):
+            pass
+        return None
+
+    def con_clave_natural(self, cursor, query, params, tipo, tabla):
+        """
+        (query, params) para anotar: en TABLAS_CLAVE_NATURAL, "WHERE id=%s" pasa a
+        ubicar la fila por sus columnas naturales y su posición entre las iguales
+        (se consulta ANTES de ejecutar la escritura).
+        """
+        columnas = TABLAS_CLAVE_NATURAL.get(tabla)
+        if (not columnas or tipo not in ("UPDATE", "DELETE") or params is None
+                or isinstance(params, dict) or not _RE_WHERE_ID.search(query)):
+            return query, params
+        id_local = params[-1]
+        try:
+            fila = cursor.execute(f"SELECT {', '.join(columnas)} FROM {tabla} WHERE id = ?", (id_local,)).fetchone()
+            if fila is None:
+                return query, params
+            iguales = " AND ".join(f"{c} IS ?" for c in columnas)
+            posicion = cursor.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {iguales} AND id < ?",
+                                      tuple(fila) + (id_local,)).fetchone()[0]
+        except (sqlite3.Error, IndexError):
+            return query, params
+        filtro = " AND ".join(f"{c} = %s" for c in columnas)
+        sql = _RE_WHERE_ID.sub(
+            f"WHERE id = (SELECT id FROM {tabla} WHERE {filtro} ORDER BY id LIMIT 1 OFFSET %s)", query)
+        return sql, tuple(params[:-1]) + tuple(fila) + (posicion,)
+
+    def registrar(self, conn, query, params, tipo, tabla, cedula):
+        """Anota la escritura en la misma transacción SQLite que la ejecutó."""
+        conn.execute(
+            f"INSERT INTO {self.TABLA} (registrado, tipo, tabla, cedula, sql, params) VALUES (?, ?, ?, ?, ?, ?)",
+            (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), tipo, tabla, cedula, query, _serializar(params)),
+        )
+
+    def registrar_lote(self, conn, query, seq_params, tipo, tabla, cedulas):
+        """Anota un executemany completo con un único executemany sobre el diario."""
+        registrado = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany(
+            f"INSERT INTO {self.TABLA} (registrado, tipo, tabla, cedula, sql, params) VALUES (?, ?, ?, ?, ?, ?)",
+            [(registrado, tipo, tabla, cedula, query, _serializar(params))
+             for params, cedula in zip(seq_params, cedulas)],
+        )
+
+    def pendientes(self):
+        """Cantidad de escrituras aún no replicadas (0 si no hay base local)."""
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            try:
+                row = conn.execute(f"SELECT COUNT(*) FROM {self.TABLA} WHERE estado = 'PENDIENTE'").fetchone()
+                return row[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return 0
+
+    def conflictos(self, limite=20):
+        """[(registrado, tabla, cedula, detalle)] de las últimas escrituras que no se pudieron replicar."""
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            try:
+                return conn.execute(
+                    f"SELECT registrado, tabla, cedula, detalle FROM {self.TABLA} "
+                    f"WHERE estado = 'CONFLICTO' ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return []
+
+    def inicio_pendientes(self):
+        """Fecha-hora de la escritura pendiente más antigua (None si no hay)."""
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            try:
+                row = conn.execute(f"SELECT MIN(registrado) FROM {self.TABLA} WHERE estado = 'PENDIENTE'").fetchone()
+                return row[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    # -----------------------------------------------------------------
+    # Replicación
+    # -----------------------------------------------------------------
+
+    def _replicar_entrada(self, pg_cursor, tipo, tabla, cedula, sql, params):
+        """Aplica una entrada en PostgreSQL. Retorna (estado, detalle)."""
+        col = TABLAS_CEDULA_UNICA.get(tabla)
+        if col and tipo == "INSERT" and cedula:
+            pg_cursor.execute(f"SELECT 1 FROM {tabla} WHERE {col} = %s", (cedula,))
+            if pg_cursor.fetchone():
+                return "CONFLICTO", f"La cédula {cedula} ya existe en el servidor"
+
+        if tipo in ("UPDATE", "DELETE") and _RE_WHERE_ID.search(sql):
+            # Los ids locales no coinciden con los del servidor
+            if not (col and cedula):
+                return "CONFLICTO", "Escritura por id local sin cédula ni clave natural equivalente"
+            sql = _RE_WHERE_ID.sub(f"WHERE {col} = %s", sql)
+            params = tuple(params[:-1]) + (cedula,)
+
+        pg_cursor.execute(sql, params)
+        if tipo == "UPDATE" and pg_cursor.rowcount == 0:
+            return "CONFLICTO", "El registro no existe en el servidor"
+        return "REPLICADO", None
+
+    def replicar(self, pg_conn, tamano_lote=200):
+        """
+        Envía las entradas pendientes a PostgreSQL en transacciones por lote.
+        Cada entrada va en su propio SAVEPOINT: un conflicto no aborta el lote.
+        Retorna un resumen {'replicadas': n, 'conflictos': n}.
+        """
+        resumen = {"replicadas": 0, "conflictos": 0}
+        local = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            self.asegurar_tabla(local)
+            ultimo_id = 0
+            while True:
+                lote = local.execute(
+                    f"SELECT id, tipo, tabla, cedula, sql, params FROM {self.TABLA} "
+                    f"WHERE estado = 'PENDIENTE' AND id > ? ORDER BY id LIMIT ?",
+                    (ultimo_id, tamano_lote),
+                ).fetchall()
+                if not lote:
+                    break
+
+                resultados = []
+                pg_cursor = pg_conn.cursor()
+                try:
+                    for id_entrada, tipo, tabla, cedula, sql, params in lote:
+                        pg_cursor.execute("SAVEPOINT diario")
+                        try:
+                            estado, detalle = self._replicar_entrada(
+                                pg_cursor, tipo, tabla, cedula, sql, _deserializar(params))
+                        except Exception as e:
+                            estado, detalle = "CONFLICTO", str(e)
+                        if estado == "REPLICADO":
+                            pg_cursor.execute("RELEASE SAVEPOINT diario")
+                        else:
+                            pg_cursor.execute("ROLLBACK TO SAVEPOINT diario")
+                        resultados.append((estado, detalle, id_entrada))
+                    pg_conn.commit()
+                except Exception:
+                    pg_conn.rollback()
+                    raise
+                finally:
+                    pg_cursor.close()
+
+                local.executemany(f"UPDATE {self.TABLA} SET estado = ?, detalle = ? WHERE id = ?", resultados)
+                local.commit()
+                for estado, _, _ in resultados:
+                    resumen["replicadas" if estado == "REPLICADO" else "conflictos"] += 1
+                ultimo_id = lote[-1][0]
+        finally:
+            local.close()
+        return resumen
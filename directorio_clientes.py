@@ -0,0 +1,353 @@
+"""
+Directorio de clientes en memoria para las búsquedas mientras se escribe.
+
+Carga una sola vez (cedula, ruc, nombres, carpeta) de todos los clientes y arma
+índices de prefijos compactos (listas ordenadas paralelas: clave -> id) para:
+  - claves numéricas: cédula, RUC y carpeta;
+  - nombres completos normalizados (sin tildes ni mayúsculas);
+  - cada palabra del nombre.
+Una búsqueda es un bisect y recorrer los primeros resultados: no toca la base.
+Al guardar/eliminar un cliente se actualiza solo su entrada; los clientes
+creados en otras estaciones se incorporan periódicamente.
+
+Ni la carga ni ninguna consulta corren en el hilo de la interfaz: mientras la
+carga no termina, resolver() responde "cargando" por nombre (el formulario
+reintenta con after()). Lo que falta en memoria (requiere_base: una cédula o
+RUC completo de un cliente recién creado en otra estación, o un nombre si la
+carga falló) se busca con consultar_base() a través de EjecutorDB.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from busqueda_clientes import buscar_por_nombre, normalizar_nombre
+
+Entrada = namedtuple("Entrada", "id cedula ruc nombres carpeta")
+
+_SQL_DIRECTORIO = """
+    SELECT id, cedula, ruc, COALESCE(nombres, nombre), COALESCE(numero_carpeta, apertura)
+    FROM Clientes
+"""
+
+
+class _IndicePrefijos:
+    """Pares (clave, id) ordenados en dos arreglos paralelos; busca por prefijo con bisect."""
+
+    def __init__(self, pares=()):
+        pares = sorted(pares)
+        self.claves = [c for c, _ in pares]
+        self.ids = array("q", (i for _, i in pares))
+
+    def agregar(self, clave, id_cliente):
+        lo = bisect.bisect_left(self.claves, clave)
+        hi = bisect.bisect_right(self.claves, clave, lo)
+        pos = bisect.bisect_left(self.ids, id_cliente, lo, hi)
+        self.claves.insert(pos, clave)
+        self.ids.insert(pos, id_cliente)
+
+    def quitar(self, clave, id_cliente):
+        lo = bisect.bisect_left(self.claves, clave)
+        hi = bisect.bisect_right(self.claves, clave, lo)
+        pos = bisect.bisect_left(self.ids, id_cliente, lo, hi)
+        if pos < hi and self.ids[pos] == id_cliente:
+            del self.claves[pos]
+            del self.ids[pos]
+
+    def con_prefijo(self, prefijo):
+        """ids cuyas claves empiezan con `prefijo`, en orden de clave."""
+        i = bisect.bisect_left(self.claves, prefijo)
+        claves, ids = self.claves, self.ids
+        while i < len(claves) and claves[i].startswith(prefijo):
+            yield ids[i]
+            i += 1
+
+    def cuantos(self, prefijo):
+        # prefijo + U+10FFFF es mayor que cualquier clave que empiece con prefijo
+        return (bisect.bisect_left(self.claves, prefijo + "\U0010ffff")
+                - bisect.bisect_left(self.claves, prefijo))
+
+
+class DirectorioClientes:
+    """Índices en memoria de Clientes; thread-safe, se carga en segundo plano."""
+    INTERVALO_NUEVOS = 60        # segundos entre lecturas de clientes nuevos (otras estaciones)
+    INTERVALO_RECARGA = 15 * 60  # segundos entre recargas completas (ediciones de otras estaciones)
+    REINTENTO_MS = 300           # espera de los formularios mientras el directorio carga
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._lock = threading.RLock()
+        self._cargado = threading.Event()
+        self._cargando = False
+        self._por_id = {}
+        self._por_cedula = {}
+        self._por_ruc = {}
+        self._nombres = {}                    # id -> nombre normalizado
+        self._idx_claves = _IndicePrefijos()  # cédula, RUC, carpeta
+        self._idx_nombres = _IndicePrefijos() # nombre completo normalizado
+        self._idx_palabras = _IndicePrefijos()
+        self._ultimo_id = 0
+        self._ultima_carga = 0.0
+        self._ultimos_nuevos = 0.0
+        self._ultimo_fallo = None
+
+    # -----------------------------------------------------------------
+    # Carga y mantenimiento
+    # -----------------------------------------------------------------
+
+    @property
+    def listo(self):
+        return self._cargado.is_set()
+
+    @property
+    def cargando(self):
+        """True mientras la primera carga corre en segundo plano."""
+        return self._cargando and not self.listo
+
+    def cargar_en_fondo(self):
+        with self._lock:
+            if self._cargando:
+                return
+            self._cargando = True
+        threading.Thread(target=self.cargar, daemon=True).start()
+
+    def cargar(self):
+        """Lee todos los clientes y reemplaza los índices de una sola vez."""
+        try:
+            filas = self._leer(_SQL_DIRECTORIO)
+        except Exception as e:
+            print(f"Directorio de clientes: no se pudo cargar ({e})")
+            with self._lock:
+                self._cargando = False
+                self._ultimo_fallo = time.monotonic()
+            return
+
+        por_id, por_cedula, por_ruc, nombres = {}, {}, {}, {}
+        pares_claves, pares_nombres, pares_palabras = [], [], []
+        palabras_unicas = {}  # una sola copia de cada palabra
+        for fila in filas:
+            e = Entrada(*fila)
+            norm = normalizar_nombre(e.nombres)
+            por_id[e.id] = e
+            nombres[e.id] = norm
+            pares_nombres.append((norm, e.id))
+            for p in set(norm.split()):
+                pares_palabras.append((palabras_unicas.setdefault(p, p), e.id))
+            for clave in self._claves_de(e):
+                pares_claves.append((clave, e.id))
+            if e.cedula:
+                por_cedula[e.cedula] = e.id
+            if e.ruc:
+                por_ruc[e.ruc] = e.id
+        idx_claves = _IndicePrefijos(pares_claves)
+        idx_nombres = _IndicePrefijos(pares_nombres)
+        idx_palabras = _IndicePrefijos(pares_palabras)
+
+        with self._lock:
+            self._por_id, self._por_cedula, self._por_ruc, self._nombres = por_id, por_cedula, por_ruc, nombres
+            self._idx_claves, self._idx_nombres, self._idx_palabras = idx_claves, idx_nombres, idx_palabras
+            self._ultimo_id = max(por_id, default=0)
+            self._ultima_carga = self._ultimos_nuevos = time.monotonic()
+            self._cargando = False
+        self._cargado.set()
+
+    def actualizar(self, id_cliente=None, cedula=None):
+        """Relee un cliente (por id o cédula) después de guardarlo; si ya no existe lo quita."""
+        if not self.listo:
+            return
+        try:
+            if id_cliente is not None:
+                filas = self._leer(_SQL_DIRECTORIO + " WHERE id = %s", (id_cliente,))
+            else:
+                filas = self._leer(_SQL_DIRECTORIO + " WHERE cedula = %s", (cedula,))
+        except Exception as e:
+            print(f"Directorio de clientes: {e}")
+            return
+        with self._lock:
+            if id_cliente is not None and not filas:
+                self._quitar(id_cliente)
+            for fila in filas:
+                self._poner(Entrada(*fila))
+
+    def quitar(self, id_cliente):
+        with self._lock:
+            self._quitar(id_cliente)
+
+    def _poner(self, e):
+        self._quitar(e.id)
+        norm = normalizar_nombre(e.nombres)
+        self._por_id[e.id] = e
+        self._nombres[e.id] = norm
+        self._idx_nombres.agregar(norm, e.id)
+        for p in set(norm.split()):
+            self._idx_palabras.agregar(p, e.id)
+        for clave in self._claves_de(e):
+            self._idx_claves.agregar(clave, e.id)
+        if e.cedula:
+            self._por_cedula[e.cedula] = e.id
+        if e.ruc:
+            self._por_ruc[e.ruc] = e.id
+        self._ultimo_id = max(self._ultimo_id, e.id)
+
+    def _quitar(self, id_cliente):
+        try:
+            id_cliente = int(id_cliente)  # los ids que vienen del Treeview son texto
+        except (TypeError, ValueError):
+            return
+        e = self._por_id.pop(id_cliente, None)
+        if e is None:
+            return
+        norm = self._nombres.pop(id_cliente, "")
+        self._idx_nombres.quitar(norm, id_cliente)
+        for p in set(norm.split()):
+            self._idx_palabras.quitar(p, id_cliente)
+        for clave in self._claves_de(e):
+            self._idx_claves.quitar(clave, id_cliente)
+        if self._por_cedula.get(e.cedula) == id_cliente:
+            del self._por_cedula[e.cedula]
+        if self._por_ruc.get(e.ruc) == id_cliente:
+            del self._por_ruc[e.ruc]
+
+    def _claves_de(self, e):
+        return {str(c).strip() for c in (e.cedula, e.ruc, e.carpeta) if c and str(c).strip()}
+
+    def _leer(self, sql, params=None):
+        conn = self.db_manager.get_connection()
+        try:
+            cursor = self.db_manager.get_cursor(conn)
+            cursor.execute(sql, params)
+            return [tuple(f) for f in cursor.fetchall()]
+        finally:
+            self.db_manager.release_connection(conn)
+
+    def _refrescar_si_vencido(self):
+        """Programa en segundo plano la lectura de clientes nuevos o la recarga completa."""
+        ahora = time.monotonic()
+        if ahora - self._ultima_carga > self.INTERVALO_RECARGA:
+            self._ultima_carga = ahora
+            self.cargar_en_fondo()
+        elif ahora - self._ultimos_nuevos > self.INTERVALO_NUEVOS:
+            self._ultimos_nuevos = ahora
+            threading.Thread(target=self._leer_nuevos, daemon=True).start()
+
+    def _leer_nuevos(self):
+        try:
+            filas = self._leer(_SQL_DIRECTORIO + " WHERE id > %s", (self._ultimo_id,))
+        except Exception as e:
+            print(f"Directorio de clientes: {e}")
+            return
+        with self._lock:
+            for fila in filas:
+                self._poner(Entrada(*fila))
+
+    def _asegurar_carga(self):
+        """Lanza la carga en segundo plano si hace falta; nunca espera por ella."""
+        if self.listo:
+            self._refrescar_si_vencido()
+        elif not self._cargando and (self._ultimo_fallo is None
+                                     or time.monotonic() - self._ultimo_fallo > self.INTERVALO_NUEVOS):
+            self.cargar_en_fondo()
+
+    # -----------------------------------------------------------------
+    # Consultas (sin tocar la base)
+    # -----------------------------------------------------------------
+
+    def por_cedula(self, cedula):
+        self._asegurar_carga()
+        with self._lock:
+            i = self._por_cedula.get(cedula)
+            return self._por_id.get(i) if i is not None else None
+
+    def por_ruc(self, ruc):
+        self._asegurar_carga()
+        with self._lock:
+            i = self._por_ruc.get(ruc)
+            return self._por_id.get(i) if i is not None else None
+
+    def buscar(self, texto, limite=8):
+        """
+        Top-N de clientes. Numérico: prefijo de cédula/RUC/carpeta. Texto: primero los
+        nombres que empiezan con lo escrito y luego los que tienen todas las palabras
+        como inicio de alguna palabra del nombre.
+        """
+        texto = (texto or "").strip()
+        if not texto:
+            return []
+        self._asegurar_carga()
+        with self._lock:
+            if texto.isdigit():
+                ids = self._idx_claves.con_prefijo(texto)
+            else:
+                ids = self._ids_por_nombre(normalizar_nombre(texto))
+            resultado, vistos = [], set()
+            for i in ids:
+                if i not in vistos:
+                    vistos.add(i)
+                    resultado.append(self._por_id[i])
+                    if len(resultado) >= limite:
+                        break
+            return resultado
+
+    def resolver(self, cedula="", ruc="", nombre=""):
+        """
+        El cliente que identifican los campos de búsqueda de un formulario (la misma
+        prioridad que usaban las búsquedas por tecla): cédula completa, RUC o nombre (3+ letras).
+        Retorna (criterio, Entrada o None); (None, None) si no hay criterio y
+        ("cargando", None) si se busca por nombre antes de que el directorio esté listo.
+        """
+        if len(cedula) == 10 and cedula.isdigit():
+            return "cedula", self.por_cedula(cedula)
+        if len(ruc) >= 10 and ruc.isdigit():
+            return "ruc", self.por_ruc(ruc)
+        if len(nombre) >= 3:
+            if not self.listo:
+                self._asegurar_carga()
+                if self.cargando:
+                    return "cargando", None
+                return "nombre", None
+            encontrados = self.buscar(nombre, 1)
+            return "nombre", encontrados[0] if encontrados else None
+        return None, None
+
+    def requiere_base(self, criterio, entrada):
+        """
+        True si lo que resolver() no encontró debe buscarse en la base: una cédula o
+        RUC completo (cliente recién creado en otra estación) o un nombre cuando la
+        carga del directorio falló.
+        """
+        return entrada is None and (criterio in ("cedula", "ruc") or (criterio == "nombre" and not self.listo))
+
+    def consultar_base(self, cursor, criterio, valor):
+        """
+        Búsqueda indexada de lo que faltó en memoria; corre en un hilo de EjecutorDB
+        con su cursor. El cliente encontrado se incorpora al directorio.
+        """
+        if criterio == "nombre":
+            filas = buscar_por_nombre(self.db_manager, cursor, valor,
+                                      ("id", "cedula", "ruc", "nombres", "numero_carpeta"), limite=1)
+            return Entrada(*tuple(filas[0])) if filas else None
+        cursor.execute(_SQL_DIRECTORIO + f" WHERE {criterio} = %s", (valor,))
+        fila = cursor.fetchone()
+        if fila is None:
+            return None
+        e = Entrada(*tuple(fila))
+        if self.listo:
+            with self._lock:
+                self._poner(e)
+        return e
+
+    def _ids_por_nombre(self, consulta):
+        palabras = consulta.split()
+        if not palabras:
+            return
+        # 1) El nombre completo empieza con lo escrito
+        yield from self._idx_nombres.con_prefijo(consulta)
+        # 2) Todas las palabras son inicio de alguna palabra del nombre. Se recorre
+        #    la palabra menos frecuente y se verifican las demás sobre el nombre.
+        guia = min(palabras, key=self._idx_palabras.cuantos)
+        otras = [" " + p for p in palabras if p != guia]
+        for i in self._idx_palabras.con_prefijo(guia):
+            nombre = " " + self._nombres[i]
+            if all(p in nombre for p in otras):
+                yield i
@@ -0,0 +1,108 @@
+"""
+Ejecutor de consultas en segundo plano para la interfaz Tk/CustomTkinter.
+
+Las consultas corren en un pool de hilos que toma sus conexiones de
+DatabaseManager; el resultado vuelve al hilo de Tk mediante after() (sondeo
+desde el propio hilo de la interfaz, que es el único que puede tocar widgets).
+Las peticiones con la misma `clave` se reemplazan: si llega una nueva, la
+anterior se cancela o, si ya estaba corriendo, su resultado se descarta.
+"""
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+
+class EjecutorDB:
+    """Pool de hilos dueño de sus conexiones que devuelve futures."""
+    INTERVALO_SONDEO_MS = 30
+
+    def __init__(self, db_manager, max_workers=4):
+        self.db_manager = db_manager
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alianza-db")
+        self._lock = threading.Lock()
+        self._vigentes = {}  # clave -> future más reciente
+
+    def enviar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta funcion(cursor, *args, **kwargs) en un hilo del pool.
+        Hace commit si termina bien y rollback si lanza excepción. Retorna un Future.
+        """
+        return self._pool.submit(self._correr, funcion, args, kwargs)
+
+    def _correr(self, funcion, args, kwargs):
+        if not self.db_manager:
+            raise ConnectionError("No hay conexión con el servidor de base de datos.")
+        conn = self.db_manager.get_connection()
+        try:
+            cursor = self.db_manager.get_cursor(conn)
+            resultado = funcion(cursor, *args, **kwargs)
+            conn.commit()
+            return resultado
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.db_manager.release_connection(conn)
+
+    def ejecutar(self, widget, funcion, *args, al_terminar=None, al_fallar=None, clave=None, **kwargs):
+        """
+        Envía la consulta y entrega el resultado en el hilo de Tk.
+        Debe llamarse desde el hilo de la interfaz. `widget` es la ventana dueña:
+        si se destruye antes de terminar, el resultado se descarta.
+        """
+        return self._programar(widget, self.enviar(funcion, *args, **kwargs), al_terminar, al_fallar, clave)
+
+    def ejecutar_tarea(self, widget, funcion, *args, al_terminar=None, al_fallar=None, clave=None, **kwargs):
+        """Como ejecutar(), para trabajo pesado que no usa la base (p. ej. escribir un Excel)."""
+        future = self._pool.submit(funcion, *args, **kwargs)
+        return self._programar(widget, future, al_terminar, al_fallar, clave)
+
+    def _programar(self, widget, future, al_terminar, al_fallar, clave):
+        if clave is not None:
+            with self._lock:
+                anterior = self._vigentes.get(clave)
+                self._vigentes[clave] = future
+            if anterior is not None:
+                anterior.cancel()
+        self._sondear(widget, future, al_terminar, al_fallar, clave)
+        return future
+
+    def _sondear(self, widget, future, al_terminar, al_fallar, clave):
+        try:
+            if not future.done():
+                widget.after(self.INTERVALO_SONDEO_MS, self._sondear, widget, future, al_terminar, al_fallar, clave)
+                return
+        except tk.TclError:
+            future.cancel()  # ventana cerrada
+            return
+
+        if clave is not None:
+            with self._lock:
+                vigente = self._vigentes.get(clave) is future
+                if vigente:
+                    del self._vigentes[clave]
+            if not vigente:
+                return  # petición obsoleta: llegó una más nueva
+
+        try:
+            resultado = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            if al_fallar:
+                al_fallar(e)
+            else:
+                print(f"Error en consulta de fondo: {e}")
+            return
+        if al_terminar:
+            al_terminar(resultado)
+
+    def cancelar(self, clave):
+        """Descarta la petición pendiente asociada a `clave`."""
+        with self._lock:
+            future = self._vigentes.pop(clave, None)
+        if future is not None:
+            future.cancel()
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,531 @@
+"""
+Exportación de informes por tramos, con memoria constante.
+
+La consulta se lee de a TAMANO_TRAMO filas y cada tramo se escribe en el
+archivo antes de pedir el siguiente: ni la consulta completa ni el libro
+quedan en memoria.
+  - PostgreSQL: cursor con nombre (del lado del servidor), el servidor entrega
+    las filas por partes;
+  - SQLite: fetchmany sobre el cursor normal;
+
+El formato sale de la extensión del archivo (FORMATOS):
+  - Excel: xlsxwriter en modo constant_memory (cada fila se vuelca al disco al
+    pasar a la siguiente). Si una hoja llega al límite de filas de Excel se
+    sigue en otra hoja del mismo libro;
+  - CSV (UTF-8): en PostgreSQL, si el informe no transforma filas, lo escribe
+    el propio servidor con COPY ... TO STDOUT; si no, csv.writer por tramos;
+  - Parquet: columnas con tipo (números, enteros, fechas) según Informe.tipos,
+    comprimido con zstd. Requiere pyarrow (solo para este formato).
+
+exportar_cambios() exporta solo lo nuevo desde la última vez, por informe y
+usuario (ver marcas_exportacion).
+
+exportar_paquete() escribe varios informes en un libro de Excel, leídos de
+una misma instantánea de la base (ver su docstring).
+
+Ambas corren en un hilo de fondo: informan el avance con progreso(filas,
+total) y se detienen si `cancelado` (threading.Event) se activa; en ese caso
+borran el archivo a medio escribir y lanzan ExportacionCancelada.
+"""
+import csv
+import datetime
+import io
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import xlsxwriter
+
+import marcas_exportacion
+
+TAMANO_TRAMO = 2000
+MAX_FILAS_HOJA = 1048575  # filas de datos por hoja de Excel (sin el encabezado)
+HILOS_PAQUETE = 4   # lectores en paralelo del paquete de informes (PostgreSQL)
+TRAMOS_EN_COLA = 4  # tramos leídos que esperan al escritor, por informe
+FILAS_GRUPO_PARQUET = 50000  # filas por row group de Parquet
+
+FORMATOS = {"Excel": ".xlsx", "CSV": ".csv", "Parquet": ".parquet"}
+
+_FIN = object()
+
+_contador = itertools.count(1)
+
+
+class ExportacionCancelada(Exception):
+    """El usuario canceló la exportación."""
+
+
+# ---------------------------------------------------------------------
+# Lectura por tramos
+# ---------------------------------------------------------------------
+
+def contar(dbm, conn, sql, params=()):
+    """Filas que devolverá la consulta (para la barra de progreso)."""
+    cursor = dbm.get_cursor(conn, diario=False)
+    cursor.execute(f"SELECT COUNT(*) FROM ({sql}) t", tuple(params) or None)
+    return int(cursor.fetchone()[0] or 0)
+
+
+def tramos(dbm, conn, sql, params=(), tamano=TAMANO_TRAMO):
+    """Genera (nombres_columnas, filas) de a `tamano` filas, con la conexión dada."""
+    if isinstance(conn, sqlite3.Connection):
+        cursor = dbm.get_cursor(conn, diario=False)
+        cursor.execute(sql, tuple(params) or None)
+    else:
+        # Cursor con nombre: las filas quedan en el servidor hasta que se piden
+        cursor = conn.cursor(name=f"exportar_{os.getpid()}_{next(_contador)}")
+        cursor.itersize = tamano
+        cursor.execute(sql, tuple(params) or None)
+    try:
+        nombres = None
+        while True:
+            filas = cursor.fetchmany(tamano)
+            if nombres is None:
+                nombres = [d[0] for d in cursor.description or ()]
+            if not filas:
+                return
+            yield nombres, [tuple(f) for f in filas]
+    finally:
+        cursor.close()
+
+
+# ---------------------------------------------------------------------
+# Escritura
+# ---------------------------------------------------------------------
+
+_BINARIOS = (bytes, bytearray, memoryview)
+
+
+def _sin_binarios(fila):
+    """Las celdas binarias (p. ej. una imagen BYTEA) quedan vacías en el archivo."""
+    return [None if isinstance(v, _BINARIOS) else v for v in fila]
+
+class EscritorXlsx:
+    """Libro de Excel en modo constant_memory; las filas se escriben en orden."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.libro = xlsxwriter.Workbook(ruta, {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "remove_timezone": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        })
+        self._formatos = {}
+        self._hoja = None
+        self._fila = 0
+
+    def _formato_encabezado(self, color):
+        if color not in self._formatos:
+            self._formatos[color] = self.libro.add_format({"bold": True, "bg_color": color, "border": 1})
+        return self._formatos[color]
+
+    def nueva_hoja(self, informe, titulos, tipos):
+        """Agrega una hoja con su encabezado; las filas siguientes van a esta hoja."""
+        nombre = informe.hoja
+        self._encabezado = (nombre, titulos, informe.color, informe.ancho_min, informe.margen)
+        self._parte = 1
+        self._abrir_hoja(nombre[:31])
+
+    def _abrir_hoja(self, nombre):
+        _, titulos, color, ancho_min, margen = self._encabezado
+        self._hoja = self.libro.add_worksheet(nombre)
+        self._fila = 0
+        formato = self._formato_encabezado(color)
+        for col, titulo in enumerate(titulos):
+            self._hoja.set_column(col, col, max(len(str(titulo)), ancho_min) + margen)
+            self._hoja.write(0, col, titulo, formato)
+
+    def escribir(self, filas):
+        for fila in filas:
+            if self._fila >= MAX_FILAS_HOJA:
+                self._parte += 1
+                self._abrir_hoja(f"{self._encabezado[0][:25]} ({self._parte})")
+            self._fila += 1
+            self._hoja.write_row(self._fila, 0, _sin_binarios(fila))
+
+    def cerrar(self):
+        self.libro.close()
+
+    def descartar(self):
+        """Cierra y borra el archivo incompleto."""
+        try:
+            self.libro.close()
+        except Exception:
+            pass
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+class EscritorCsv:
+    """CSV UTF-8 (con BOM, para que Excel respete los acentos), separado por comas."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.archivo = open(ruta, "w", newline="", encoding="utf-8-sig")
+        self._csv = csv.writer(self.archivo, lineterminator="\n")
+
+    def nueva_hoja(self, informe, titulos, tipos):
+        self._csv.writerow(titulos)
+
+    def escribir(self, filas):
+        self._csv.writerows(map(_sin_binarios, filas))
+
+    def cerrar(self):
+        self.archivo.close()
+
+    def descartar(self):
+        self.archivo.close()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+_FORMATOS_FECHA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+
+
+@lru_cache(maxsize=65536)
+def _fecha_texto(texto):
+    texto = texto.strip().split(".")[0]
+    for formato in _FORMATOS_FECHA:
+        try:
+            return datetime.datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    return None
+
+
+def _a_fecha_hora(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.replace(tzinfo=None)
+    if isinstance(valor, datetime.date):
+        return datetime.datetime(valor.year, valor.month, valor.day)
+    return _fecha_texto(str(valor)) if valor else None
+
+
+def _a_fecha(valor):
+    valor = _a_fecha_hora(valor)
+    return valor.date() if valor else None
+
+
+def _a_numero(valor):
+    if valor is None or valor == "":
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _a_entero(valor):
+    numero = _a_numero(valor)
+    return int(numero) if numero is not None else None
+
+
+def _a_texto(valor):
+    return None if valor is None or isinstance(valor, _BINARIOS) else str(valor)
+
+
+class EscritorParquet:
+    """
+    Parquet con un tipo por columna (Informe.tipos); lo que no se puede
+    convertir al tipo declarado (p. ej. una fecha mal digitada) queda nulo.
+    Las filas se juntan hasta FILAS_GRUPO_PARQUET y se escriben como un row group.
+    """
+
+    def __init__(self, ruta):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Para exportar en Parquet instale el paquete pyarrow (pip install pyarrow).")
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.ruta = ruta
+        self._escritor = None
+        self._columnas = []
+
+    def nueva_hoja(self, informe, titulos, tipos):
+        pa = self.pa
+        tipo_pa = {"texto": pa.string(), "numero": pa.float64(), "entero": pa.int64(),
+                   "fecha": pa.date32(), "fecha_hora": pa.timestamp("s")}
+        convertir = {"texto": _a_texto, "numero": _a_numero, "entero": _a_entero,
+                     "fecha": _a_fecha, "fecha_hora": _a_fecha_hora}
+        self._schema = pa.schema([(t, tipo_pa[tipo]) for t, tipo in zip(titulos, tipos)])
+        self._convertir = [convertir[tipo] for tipo in tipos]
+        self._columnas = [[] for _ in titulos]
+        self._escritor = self.pq.ParquetWriter(self.ruta, self._schema, compression="zstd")
+
+    def escribir(self, filas):
+        for fila in filas:
+            for columna, convertir, valor in zip(self._columnas, self._convertir, fila):
+                columna.append(convertir(valor))
+        if len(self._columnas[0]) >= FILAS_GRUPO_PARQUET:
+            self._volcar()
+
+    def _volcar(self):
+        if self._columnas and self._columnas[0]:
+            self._escritor.write_table(self.pa.Table.from_arrays(
+                [self.pa.array(c, type=campo.type) for c, campo in zip(self._columnas, self._schema)],
+                schema=self._schema))
+            self._columnas = [[] for _ in self._columnas]
+
+    def cerrar(self):
+        self._volcar()
+        if self._escritor is not None:
+            self._escritor.close()
+
+    def descartar(self):
+        try:
+            if self._escritor is not None:
+                self._escritor.close()
+        except Exception:
+            pass
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+_ESCRITORES = {".xlsx": EscritorXlsx, ".csv": EscritorCsv, ".parquet": EscritorParquet}
+
+
+def escritor_para(ruta):
+    """Escritor según la extensión del archivo (Excel si no se reconoce)."""
+    return _ESCRITORES.get(os.path.splitext(ruta)[1].lower(), EscritorXlsx)(ruta)
+
+
+class _SalidaCopy:
+    """Archivo binario para COPY TO STDOUT: cuenta filas para el avance y permite cancelar."""
+
+    def __init__(self, archivo, avance, progreso, cancelado):
+        self.archivo, self.avance, self.progreso, self.cancelado = archivo, avance, progreso, cancelado
+
+    def write(self, datos):
+        if self.cancelado is not None and self.cancelado.is_set():
+            raise ExportacionCancelada()
+        self.archivo.write(datos)
+        # Aproximado: un salto de línea dentro de un texto también cuenta
+        self.avance[0] = min(self.avance[0] + datos.count(b"\n"), self.avance[1])
+        if self.progreso:
+            self.progreso(*self.avance)
+
+
+def _copiar_csv(conn, informe, sql, params, ruta, total, progreso, cancelado):
+    """CSV con COPY (SELECT ...) TO STDOUT: el servidor arma el CSV, Python solo lo copia al archivo."""
+    cursor = conn.cursor()
+    if params:
+        sql = cursor.mogrify(sql, params).decode("utf-8")  # COPY no recibe parámetros
+    cursor.execute(f"SELECT * FROM ({sql}) t LIMIT 0")
+    nombres = [d[0] for d in cursor.description]
+    titulos, indices = informe.columnas(nombres)
+    if indices is not None:
+        lista = ", ".join('"{}"'.format(nombres[i].replace('"', '""')) for i in indices)
+        sql = f"SELECT {lista} FROM ({sql}) t"
+    try:
+        with open(ruta, "wb") as archivo:
+            encabezado = io.StringIO()
+            csv.writer(encabezado, lineterminator="\n").writerow(titulos)
+            archivo.write(("\ufeff" + encabezado.getvalue()).encode("utf-8"))
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)",
+                               _SalidaCopy(archivo, [0, total], progreso, cancelado))
+    except BaseException:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+    finally:
+        cursor.close()
+    if progreso:
+        progreso(total, total)
+    return total
+
+
+# ---------------------------------------------------------------------
+# Exportación completa
+# ---------------------------------------------------------------------
+
+def _escribir_informe(escritor, informe, fuente, avance, progreso, cancelado):
+    """Escribe en una hoja nueva los tramos de `fuente`; avance = [filas escritas, total]."""
+    escritas, indices = 0, False
+    for nombres, filas in fuente:
+        if cancelado is not None and cancelado.is_set():
+            raise ExportacionCancelada()
+        if indices is False:  # primer tramo: ya se conocen las columnas
+            titulos, indices = informe.columnas(nombres)
+            escritor.nueva_hoja(informe, titulos, informe.tipos_de(nombres, indices))
+        if informe.procesar:
+            filas = informe.procesar(filas)
+        if indices is not None:
+            filas = [[f[i] for i in indices] for f in filas]
+        escritor.escribir(filas)
+        escritas += len(filas)
+        avance[0] += len(filas)
+        if progreso:
+            progreso(*avance)
+    return escritas
+
+
+def exportar(dbm, informe, ruta, progreso=None, cancelado=None, tamano=TAMANO_TRAMO, desde=None, hasta=None):
+    """
+    Escribe el informe (ver informes.Informe) en `ruta`, en el formato de su
+    extensión, y retorna la cantidad de filas. Con 0 filas no deja archivo.
+    desde/hasta limitan las filas por la marca del informe (exportar_cambios).
+    """
+    conn = dbm.get_connection()
+    try:
+        return _exportar(dbm, conn, informe, ruta, progreso, cancelado, tamano, desde, hasta)
+    finally:
+        conn.rollback()  # solo lectura: cierra la transacción del cursor con nombre
+        dbm.release_connection(conn)
+
+
+def _exportar(dbm, conn, informe, ruta, progreso, cancelado, tamano, desde, hasta):
+    """exportar() con la conexión (y la transacción) de quien llama."""
+    sql, params = informe.consulta(desde, hasta)
+    escritor = None
+    try:
+        total = contar(dbm, conn, sql, params)
+        if progreso:
+            progreso(0, total)
+        if not total:
+            return 0
+        if ruta.lower().endswith(".csv") and not informe.procesar and not isinstance(conn, sqlite3.Connection):
+            return _copiar_csv(conn, informe, sql, params, ruta, total, progreso, cancelado)
+        escritor = escritor_para(ruta)
+        escritas = _escribir_informe(escritor, informe, tramos(dbm, conn, sql, params, tamano),
+                                     [0, total], progreso, cancelado)
+        escritor.cerrar()
+        escritor = None
+        return escritas
+    finally:
+        if escritor is not None:
+            escritor.descartar()
+
+
+def exportar_cambios(dbm, informe, ruta, usuario, progreso=None, cancelado=None, tamano=TAMANO_TRAMO):
+    """
+    Exporta solo las filas nuevas (o modificadas, según la marca) desde la última
+    exportación de cambios de `usuario` (informe con marca) y avanza su marca.
+    Retorna (filas, fecha de la exportación anterior o None si es la primera, que trae todo).
+    La marca máxima y las filas se leen de la misma instantánea (REPEATABLE READ
+    en PostgreSQL, una transacción de lectura en SQLite): lo que se confirma
+    mientras tanto no entra en `hasta` y queda para la próxima.
+    """
+    conn = dbm.get_connection()
+    try:
+        cursor = dbm.get_cursor(conn, diario=False)
+        local = isinstance(conn, sqlite3.Connection)
+        cursor.execute("BEGIN" if local else "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        desde, anterior = marcas_exportacion.leer(cursor, informe.clave, usuario)
+        hasta = marcas_exportacion.maxima(cursor, informe)
+        if hasta is None or (desde is not None and hasta <= desde):
+            if progreso:
+                progreso(0, 0)
+            return 0, anterior
+        filas = _exportar(dbm, conn, informe, ruta, progreso, cancelado, tamano, desde, hasta)
+    finally:
+        conn.rollback()
+        dbm.release_connection(conn)
+    marcas_exportacion.guardar(dbm, informe.clave, usuario, hasta, filas)
+    return filas, anterior
+
+
+# ---------------------------------------------------------------------
+# Paquete de informes (un libro, una hoja por informe)
+# ---------------------------------------------------------------------
+
+def _poner(cola, item, detener):
+    while not detener.is_set():
+        try:
+            cola.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _leer_a_cola(dbm, snapshot, informe, cola, detener, tamano):
+    """Hilo lector (PostgreSQL): lee el informe con la instantánea exportada y deja los tramos en la cola."""
+    conn = None
+    try:
+        # Dentro del try: si no hay conexión (pool agotado), el error llega a la cola
+        conn = dbm.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        cursor.close()
+        for tramo in tramos(dbm, conn, *informe.consulta(), tamano=tamano):
+            if not _poner(cola, tramo, detener):
+                return
+        _poner(cola, _FIN, detener)
+    except Exception as e:
+        _poner(cola, e, detener)
+    finally:
+        if conn is not None:
+            conn.rollback()
+            dbm.release_connection(conn)
+
+
+def _desde_cola(cola):
+    while True:
+        item = cola.get()
+        if item is _FIN:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def exportar_paquete(dbm, lista, ruta, progreso=None, cancelado=None, tamano=TAMANO_TRAMO):
+    """
+    Escribe varios informes en un solo libro (una hoja por informe, los vacíos
+    se omiten) y retorna {clave: filas}. Todo se lee de la misma instantánea:
+      - PostgreSQL: transacción REPEATABLE READ READ ONLY cuya instantánea se
+        exporta (pg_export_snapshot) a HILOS_PAQUETE lectores en paralelo; cada
+        uno llena una cola acotada y el libro se escribe hoja por hoja;
+      - SQLite: una sola transacción de lectura (BEGIN) y lectura en orden.
+    """
+    conn = dbm.get_connection()
+    escritor = lectores = None
+    detener = threading.Event()
+    try:
+        cursor = dbm.get_cursor(conn, diario=False)
+        local = isinstance(conn, sqlite3.Connection)
+        cursor.execute("BEGIN" if local else "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        totales = [contar(dbm, conn, *inf.consulta()) for inf in lista]
+        lista = [(inf, n) for inf, n in zip(lista, totales) if n]
+        avance = [0, sum(totales)]
+        if progreso:
+            progreso(*avance)
+        if not lista:
+            return {}
+
+        if local:
+            fuentes = [lambda inf=inf: tramos(dbm, conn, *inf.consulta(), tamano=tamano) for inf, _ in lista]
+        else:
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot = cursor.fetchone()[0]
+            lectores = ThreadPoolExecutor(max_workers=min(HILOS_PAQUETE, len(lista)),
+                                          thread_name_prefix="alianza-paquete")
+            fuentes = []
+            for inf, _ in lista:
+                cola = queue.Queue(maxsize=TRAMOS_EN_COLA)
+                lectores.submit(_leer_a_cola, dbm, snapshot, inf, cola, detener, tamano)
+                fuentes.append(lambda cola=cola: _desde_cola(cola))
+
+        escritor = EscritorXlsx(ruta)
+        resultado = {}
+        for (inf, _), fuente in zip(lista, fuentes):
+            resultado[inf.clave] = _escribir_informe(escritor, inf, fuente(), avance, progreso, cancelado)
+        escritor.cerrar()
+        escritor = None
+        return resultado
+    finally:
+        detener.set()
+        if lectores is not None:
+            lectores.shutdown(wait=True)  # la instantánea vive mientras dure la transacción de `conn`
+        if escritor is not None:
+            escritor.descartar()
+        conn.rollback()
+        dbm.release_connection(conn)
@@ -0,0 +1,89 @@
+"""
+Gráficos simples sobre tk.Canvas (líneas y barras) para los tableros.
+
+Sin dependencias extra: se dibuja con create_line/create_rectangle y se vuelve
+a dibujar cuando el canvas cambia de tamaño.
+"""
+MARGEN_IZQ, MARGEN_DER, MARGEN_SUP, MARGEN_INF = 70, 15, 30, 30
+COLOR_EJES = "#7F8C8D"
+COLOR_GUIAS = "#E5E8E8"
+FUENTE = ('Arial', 9)
+FUENTE_TITULO = ('Arial', 11, 'bold')
+
+
+def _redibujar(canvas, dibujar):
+    """Dibuja ahora y cada vez que cambie el tamaño del canvas."""
+    canvas.bind("<Configure>", lambda e: dibujar())
+    dibujar()
+
+
+def _marco(canvas, titulo, minimo, maximo, formato):
+    """Limpia el canvas, dibuja título, guías horizontales y retorna (x0, y0, x1, y1, a_y)."""
+    canvas.delete("all")
+    ancho, alto = canvas.winfo_width(), canvas.winfo_height()
+    x0, y0, x1, y1 = MARGEN_IZQ, MARGEN_SUP, ancho - MARGEN_DER, alto - MARGEN_INF
+    canvas.create_text(ancho / 2, 12, text=titulo, font=FUENTE_TITULO, fill="#2C3E50")
+    if maximo == minimo:
+        maximo = minimo + 1
+
+    def a_y(valor):
+        return y1 - (valor - minimo) / (maximo - minimo) * (y1 - y0)
+
+    for i in range(5):
+        valor = minimo + (maximo - minimo) * i / 4
+        y = a_y(valor)
+        canvas.create_line(x0, y, x1, y, fill=COLOR_GUIAS)
+        canvas.create_text(x0 - 5, y, text=formato(valor), anchor='e', font=FUENTE, fill=COLOR_EJES)
+    canvas.create_line(x0, y1, x1, y1, fill=COLOR_EJES)
+    return x0, y0, x1, y1, a_y
+
+
+def _etiquetas_x(canvas, etiquetas, posiciones, y1, maximo=8):
+    paso = max(1, -(-len(etiquetas) // maximo))  # a lo sumo `maximo` etiquetas
+    for i in range(0, len(etiquetas), paso):
+        canvas.create_text(posiciones[i], y1 + 12, text=etiquetas[i], font=FUENTE, fill=COLOR_EJES)
+
+
+def _sin_datos(canvas, titulo):
+    canvas.delete("all")
+    canvas.create_text(canvas.winfo_width() / 2, 12, text=titulo, font=FUENTE_TITULO, fill="#2C3E50")
+    canvas.create_text(canvas.winfo_width() / 2, canvas.winfo_height() / 2,
+                       text="Sin datos todavía", font=FUENTE, fill=COLOR_EJES)
+
+
+def lineas(canvas, etiquetas, series, titulo="", formato=str):
+    """series: [(nombre, valores, color)] con un valor por etiqueta (None = sin dato)."""
+    def dibujar():
+        valores = [v for _, vals, _ in series for v in vals if v is not None]
+        if not valores or canvas.winfo_width() < 2 * MARGEN_IZQ:
+            return _sin_datos(canvas, titulo)
+        x0, y0, x1, y1, a_y = _marco(canvas, titulo, min(0, min(valores)), max(valores), formato)
+        n = len(etiquetas)
+        xs = [x0 + (x1 - x0) * (i / (n - 1) if n > 1 else 0.5) for i in range(n)]
+        for j, (nombre, vals, color) in enumerate(series):
+            puntos = [c for x, v in zip(xs, vals) if v is not None for c in (x, a_y(v))]
+            if len(puntos) >= 4:
+                canvas.create_line(*puntos, fill=color, width=2)
+            elif puntos:
+                canvas.create_oval(puntos[0] - 3, puntos[1] - 3, puntos[0] + 3, puntos[1] + 3, fill=color, outline="")
+            # Leyenda arriba a la izquierda
+            canvas.create_line(x0 + 5 + j * 130, y0 - 8, x0 + 20 + j * 130, y0 - 8, fill=color, width=2)
+            canvas.create_text(x0 + 24 + j * 130, y0 - 8, text=nombre, anchor='w', font=FUENTE, fill="#2C3E50")
+        _etiquetas_x(canvas, etiquetas, xs, y1)
+    _redibujar(canvas, dibujar)
+
+
+def barras(canvas, etiquetas, valores, color="#2E86C1", titulo="", formato=str):
+    """Una barra por etiqueta."""
+    def dibujar():
+        if not valores or canvas.winfo_width() < 2 * MARGEN_IZQ:
+            return _sin_datos(canvas, titulo)
+        x0, y0, x1, y1, a_y = _marco(canvas, titulo, min(0, min(valores)), max(valores), formato)
+        ancho = (x1 - x0) / len(valores)
+        xs = []
+        for i, v in enumerate(valores):
+            izq = x0 + i * ancho
+            canvas.create_rectangle(izq + ancho * 0.15, a_y(v), izq + ancho * 0.85, a_y(0), fill=color, outline="")
+            xs.append(izq + ancho / 2)
+        _etiquetas_x(canvas, etiquetas, xs, y1)
+    _redibujar(canvas, dibujar)
@@ -0,0 +1,271 @@
+"""
+Grilla virtual para ttk.Treeview: paginación por clave (keyset) y ventana deslizante.
+
+El Treeview solo guarda una ventana de filas (max_filas). Al acercarse al final
+del scroll se pide la página siguiente con WHERE (orden, clave) > (última fila)
+y se descartan filas del principio; al volver hacia arriba se pide la página
+anterior con la comparación invertida. Orden y filtro se resuelven en el
+servidor: cambiar cualquiera de los dos recarga desde la primera página.
+
+Las consultas corren en EjecutorDB; el Treeview se toca solo en el hilo de Tk.
+
+Después de guardar un registro no hace falta recargar: actualizar_fila(fila) y
+quitar_fila(clave) corrigen solo ese item, en su posición según el orden activo
+y sin perder la selección.
+
+Uso (sobre un Treeview ya armado):
+    grilla = GrillaVirtual(tree, ejecutor_db, "Clientes c", "c.*", clave="c.id",
+                           ordenables={"Cédula": ("COALESCE(c.cedula, '')", lambda f: f['cedula'] or '')},
+                           formatear=filas_a_valores, scrollbar=sy)
+    grilla.filtrar("c.asesor = %s", ("Ana",))
+"""
+import itertools
+
+_FLECHAS = {False: " ▲", True: " ▼"}
+_contador = itertools.count(1)
+
+
+class GrillaVirtual:
+    """Carga por páginas las filas de `origen` en un ttk.Treeview existente."""
+    TAMANO_PAGINA = 100
+    MAX_FILAS = 500      # filas que conserva el Treeview (≈ 5 páginas)
+    MARGEN_SCROLL = 0.02  # fracción del scroll a la que se pide la siguiente página
+
+    def __init__(self, tree, ejecutor, origen, columnas, clave="id", ordenables=None, orden=None,
+                 formatear=None, scrollbar=None, tamano_pagina=None, max_filas=None, al_fallar=None,
+                 columna_clave="id"):
+        """
+        origen: FROM (tabla o joins); columnas: lista SELECT; clave: expresión única (id).
+        ordenables: {columna del Treeview: expresión SQL sin NULL} para ordenar al hacer clic;
+            el valor puede ser (expresión, funcion(fila)) para que actualizar_fila ubique la
+            fila sin consultar (la función debe dar el mismo valor que la expresión).
+        orden: (expresión, descendente) inicial; por defecto la clave ascendente.
+        formatear: funcion(filas) -> [(values, tags)] aplicada a cada página.
+        columna_clave: nombre de la clave en las filas que recibe actualizar_fila.
+        """
+        self.tree = tree
+        self.ejecutor = ejecutor
+        self.origen = origen
+        self.columnas = columnas
+        self.clave = clave
+        self.ordenables, self._orden_python = {}, {}
+        for col, expr in (ordenables or {}).items():
+            if isinstance(expr, tuple):
+                expr, funcion = expr
+                self._orden_python[expr] = funcion
+            self.ordenables[col] = expr
+        self.columna_clave = columna_clave
+        self._orden_python.setdefault(clave, lambda fila: fila[columna_clave])
+        self.orden = orden or (clave, False)
+        self.formatear = formatear or (lambda filas: [(tuple(f)[:-2], ()) for f in filas])
+        self.scrollbar = scrollbar
+        self.tamano_pagina = tamano_pagina or self.TAMANO_PAGINA
+        self.max_filas = max(max_filas or self.MAX_FILAS, 2 * self.tamano_pagina)
+        self.al_fallar = al_fallar
+        self.filtro, self.params_filtro = None, ()
+
+        self._id_peticion = f"grilla-{next(_contador)}"
+        self._claves = {}  # iid -> (orden, clave) de la fila
+        self._iids = {}    # clave -> iid
+        self._mas_adelante = self._mas_atras = False
+        self._cargando = False
+
+        tree.configure(yscrollcommand=self._al_desplazar)
+        self._titulos = {col: tree.heading(col, "text") for col in self.ordenables}
+        for col in self.ordenables:
+            tree.heading(col, command=lambda c=col: self.ordenar_por(c))
+        self._pintar_titulos()
+
+    # -----------------------------------------------------------------
+    # API
+    # -----------------------------------------------------------------
+
+    def recargar(self):
+        """Vuelve a la primera página con el filtro y orden actuales."""
+        self._pedir(adelante=True, reiniciar=True)
+
+    def filtrar(self, filtro=None, params=()):
+        """
+        filtro: condición SQL con marcadores %s, o funcion(cursor) -> (sql, params)
+        que se evalúa en el hilo de la consulta. None quita el filtro.
+        """
+        self.filtro, self.params_filtro = filtro, tuple(params)
+        self.recargar()
+
+    def ordenar_por(self, columna):
+        """Ordena por la expresión de `columna`; un segundo clic invierte el sentido."""
+        expr = self.ordenables[columna]
+        self.orden = (expr, not self.orden[1] if self.orden[0] == expr else False)
+        self._pintar_titulos()
+        self.recargar()
+
+    def actualizar_fila(self, fila):
+        """
+        Inserta o corrige la fila recién guardada (mismas columnas que `columnas`).
+        La ubica según el orden activo; si cae fuera de la ventana cargada se quita.
+        No evalúa el filtro: una fila recién guardada se muestra aunque no lo cumpla.
+        """
+        if fila is None:
+            return
+        clave = fila[self.columna_clave]
+        iid = self._iids.get(clave)
+        valores, tags = self.formatear([fila])[0]
+        funcion = self._orden_python.get(self.orden[0])
+        pos = None
+        if funcion is not None:
+            llave = (funcion(fila), clave)
+            pos = self._posicion(llave, excluir=iid)
+        elif iid is not None:
+            pos = self.tree.index(iid)  # sin forma de ubicarla: queda donde estaba
+        if pos is None:
+            if iid is not None:
+                self.quitar_fila(clave)
+            return
+        if iid is None:
+            iid = self.tree.insert("", pos, values=valores, tags=tags)
+            self._iids[clave] = iid
+        else:
+            self.tree.item(iid, values=valores, tags=tags)
+            self.tree.move(iid, "", pos)  # mover (no recrear) conserva la selección
+        if funcion is not None:
+            self._claves[iid] = llave
+
+    def quitar_fila(self, clave):
+        """Quita del Treeview la fila con esa clave (p. ej. después de eliminarla)."""
+        iid = self._iids.pop(clave, None)
+        if iid is not None and self.tree.exists(iid):
+            self.tree.delete(iid)
+        self._claves.pop(iid, None)
+
+    def _posicion(self, llave, excluir=None):
+        """Índice donde va `llave` en la ventana; None si queda antes o después de lo cargado."""
+        hijos = [h for h in self.tree.get_children() if h != excluir]
+        descendente = self.orden[1]
+        try:
+            for i, hijo in enumerate(hijos):
+                actual = self._claves[hijo]
+                if (actual < llave) if descendente else (actual > llave):
+                    break
+            else:
+                i = len(hijos)
+        except TypeError:
+            return None  # valores no comparables (p. ej. None contra texto)
+        if (i == 0 and self._mas_atras) or (i == len(hijos) and self._mas_adelante):
+            return None
+        return i
+
+    # -----------------------------------------------------------------
+    # Consulta (hilo del ejecutor)
+    # -----------------------------------------------------------------
+
+    def _consultar(self, cursor, orden, adelante, desde, filtro, params_filtro):
+        expr, descendente = orden
+        # Página anterior = misma consulta con el sentido invertido, luego se da vuelta
+        desc = descendente != (not adelante)
+        condiciones, params = [], []
+        if callable(filtro):
+            filtro, params_filtro = filtro(cursor)
+        if filtro:
+            condiciones.append(f"({filtro})")
+            params.extend(params_filtro)
+        if desde is not None:
+            op = "<" if desc else ">"
+            condiciones.append(f"({expr} {op} %s OR ({expr} = %s AND {self.clave} {op} %s))")
+            params.extend((desde[0], desde[0], desde[1]))
+        direccion = "DESC" if desc else "ASC"
+        sql = (f"SELECT {self.columnas}, {expr} AS orden_grilla, {self.clave} AS clave_grilla "
+               f"FROM {self.origen}"
+               + (" WHERE " + " AND ".join(condiciones) if condiciones else "")
+               + f" ORDER BY {expr} {direccion}, {self.clave} {direccion} LIMIT %s")
+        params.append(self.tamano_pagina + 1)
+        cursor.execute(sql, tuple(params))
+        filas = cursor.fetchall()
+        hay_mas = len(filas) > self.tamano_pagina
+        filas = filas[:self.tamano_pagina]
+        if not adelante:
+            filas.reverse()
+        return filas, hay_mas
+
+    # -----------------------------------------------------------------
+    # Ventana de filas (hilo de Tk)
+    # -----------------------------------------------------------------
+
+    def _pedir(self, adelante, reiniciar=False):
+        if reiniciar:
+            desde = None
+        else:
+            hijos = self.tree.get_children()
+            if not hijos:
+                return
+            desde = self._claves[hijos[-1] if adelante else hijos[0]]
+        self._cargando = True
+        self.ejecutor.ejecutar(self.tree, self._consultar, self.orden, adelante, desde, self.filtro, self.params_filtro,
+                               al_terminar=lambda res: self._recibir(res, adelante, reiniciar),
+                               al_fallar=self._fallo, clave=self._id_peticion)
+
+    def _fallo(self, e):
+        self._cargando = False
+        if self.al_fallar:
+            self.al_fallar(e)
+        else:
+            print(f"Error cargando grilla: {e}")
+
+    def _recibir(self, resultado, adelante, reiniciar):
+        self._cargando = False
+        filas, hay_mas = resultado
+        tree = self.tree
+        if reiniciar:
+            tree.delete(*tree.get_children())
+            self._claves.clear()
+            self._iids.clear()
+            self._mas_atras = False
+            tree.yview_moveto(0)
+        ancla = None if reiniciar else self._fila_visible()
+
+        for i, (fila, (valores, tags)) in enumerate(zip(filas, self.formatear(filas))):
+            iid = tree.insert("", "end" if adelante else i, values=valores, tags=tags)
+            self._claves[iid] = (fila[-2], fila[-1])
+            self._iids[fila[-1]] = iid
+        if adelante:
+            self._mas_adelante = hay_mas
+        else:
+            self._mas_atras = hay_mas
+
+        # Descartar del extremo opuesto lo que exceda la ventana
+        hijos = tree.get_children()
+        sobran = len(hijos) - self.max_filas
+        if sobran > 0:
+            quitar = hijos[:sobran] if adelante else hijos[-sobran:]
+            tree.delete(*quitar)
+            for iid in quitar:
+                self._iids.pop(self._claves.pop(iid)[1], None)
+            if adelante:
+                self._mas_atras = True
+            else:
+                self._mas_adelante = True
+
+        if ancla is not None and tree.exists(ancla):
+            # Mantener a la vista la misma fila aunque cambien las de arriba
+            tree.yview_moveto(tree.index(ancla) / max(len(tree.get_children()), 1))
+
+    def _fila_visible(self):
+        hijos = self.tree.get_children()
+        if not hijos:
+            return None
+        inicio = float(self.tree.yview()[0])
+        return hijos[min(int(round(inicio * len(hijos))), len(hijos) - 1)]
+
+    def _al_desplazar(self, primero, ultimo):
+        if self.scrollbar is not None:
+            self.scrollbar.set(primero, ultimo)
+        if self._cargando:
+            return
+        if float(ultimo) >= 1 - self.MARGEN_SCROLL and self._mas_adelante:
+            self._pedir(adelante=True)
+        elif float(primero) <= self.MARGEN_SCROLL and self._mas_atras:
+            self._pedir(adelante=False)
+
+    def _pintar_titulos(self):
+        for col, texto in self._titulos.items():
+            flecha = _FLECHAS[self.orden[1]] if self.ordenables[col] == self.orden[0] else ""
+            self.tree.heading(col, text=texto + flecha)
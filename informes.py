@@ -0,0 +1,234 @@
+"""
+Catálogo de los informes de Gestión de Informes.
+
+Cada Informe trae la consulta, los títulos de las columnas y el formato de su
+hoja; exportador.exportar() lo lee por tramos y lo escribe. La interfaz
+(abrir_modulo_informes) solo elige el informe y el archivo.
+
+`titulos` es una lista (una por columna de la consulta) o, para consultas con
+SELECT *, un dict {columna: título}: las columnas que no están en el dict
+salen con su nombre y las que tienen título None no se exportan.
+`tipos` da el tipo de cada columna para Parquet ("texto", "numero", "entero",
+"fecha", "fecha_hora"): una lista como `titulos` o un dict {columna: tipo};
+lo que no se indica es texto.
+`marca` = (expresión, origen) habilita la exportación de solo cambios (ver
+marcas_exportacion): la expresión es un id o fecha-hora creciente y el
+`{donde}` de la consulta recibe el filtro por marca. Pagos, Buró y Auditoría
+no se modifican después y usan el id (filas nuevas); Caja se edita y usa
+Caja.modificado, que los triggers de la migración 16 ponen en cada INSERT y
+UPDATE (filas nuevas o modificadas). Los demás se exportan completos.
+`procesar(filas)` transforma cada tramo antes de escribirlo (p. ej. la mora de
+Cartera, que se calcula con motor_mora sobre las filas del tramo).
+"""
+from collections import namedtuple
+
+import motor_mora
+
+_CAMPOS = "clave nombre hoja sql titulos color archivo mensaje_ok mensaje_vacio tipos ancho_min margen procesar marca"
+
+
+class Informe(namedtuple("Informe", _CAMPOS, defaults=(None, 12, 2, None, None))):
+    __slots__ = ()
+
+    def consulta(self, desde=None, hasta=None):
+        """(sql, params); con marca, solo las filas con desde < marca <= hasta."""
+        condiciones, params = [], []
+        if self.marca and desde is not None:
+            condiciones.append(f"{self.marca[0]} > %s")
+            params.append(desde)
+        if self.marca and hasta is not None:
+            condiciones.append(f"{self.marca[0]} <= %s")
+            params.append(hasta)
+        donde = "WHERE " + " AND ".join(condiciones) if condiciones else ""
+        return self.sql.replace("{donde}", donde), tuple(params)
+
+    def columnas(self, nombres):
+        """(títulos, índices de las columnas a exportar o None si van todas)."""
+        if not isinstance(self.titulos, dict):
+            return list(self.titulos), None
+        indices = [i for i, n in enumerate(nombres) if self.titulos.get(n, n) is not None]
+        return [self.titulos.get(nombres[i], nombres[i]) for i in indices], indices
+
+    def tipos_de(self, nombres, indices):
+        """Tipo de cada columna exportada (mismo orden que columnas())."""
+        if isinstance(self.tipos, dict):
+            return [self.tipos.get(nombres[i], "texto") for i in (range(len(nombres)) if indices is None else indices)]
+        n = len(nombres) if indices is None else len(indices)
+        return list(self.tipos or ["texto"] * n)
+
+
+TITULOS_CLIENTES = {
+    'id': 'ID', 'cedula': 'Cédula', 'ruc': 'RUC', 'nombre': 'Nombres y Apellidos',
+    'estado_civil': 'Estado Civil', 'cargas_familiares': 'Cargas Familiares',
+    'email': 'Email', 'telefono': 'Teléfono', 'direccion': 'Dirección Domicilio',
+    'parroquia': 'Parroquia', 'tipo_vivienda': 'Tipo Vivienda',
+    'referencia_vivienda': 'Referencia Vivienda', 'profesion': 'Profesión/Actividad',
+    'ingresos_mensuales': 'Ingresos Principal ($)', 'ingresos_mensuales_2': 'Ingresos Secundarios ($)',
+    'egresos': 'Egresos Mensuales ($)', 'total_disponible': 'Total Disponible ($)',
+    'referencia1': 'Referencia Personal 1', 'referencia2': 'Referencia Personal 2',
+    'asesor': 'Asesor Asignado', 'apertura': 'Número de Carpeta',
+    'fecha nacimiento': 'Fecha de Nacimiento',
+    'producto': 'Producto', 'observaciones': 'Observaciones Generales',
+    'cartera castigada': 'Cartera', 'valor cartera': 'Valor Cartera ($)',
+    'demanda judicial': 'Demanda', 'valor demanda': 'Valor Demanda ($)',
+    'problemas justicia': 'Justicia', 'detalle justicia': 'Detalle Justicia',
+    'situacion_financiera': 'Situación Financiera', 'terreno': 'Tiene Terreno',
+    'valor_terreno': 'Valor Terreno ($)', 'hipotecado': 'Terreno Hipotecado',
+    'casa_dep': 'Tiene Casa/Dep', 'valor_casa_dep': 'Valor Casa/Dep ($)',
+    'hipotecado_casa_dep': 'Casa Hipotecada', 'local': 'Tiene Local',
+    'valor_local': 'Valor Local ($)', 'hipotecado_local': 'Local Hipotecado',
+    'score_buro': 'Score Buró', 'fecha_registro': 'Fecha de Apertura',
+    'numero_carpeta': None, 'imagen_deposito': None,
+}
+
+TIPOS_CLIENTES = {
+    'id': 'entero', 'cargas_familiares': 'entero',
+    'ingresos_mensuales': 'numero', 'ingresos_mensuales_2': 'numero', 'egresos': 'numero',
+    'total_disponible': 'numero', 'valor cartera': 'numero', 'valor demanda': 'numero',
+    'valor_terreno': 'numero', 'valor_casa_dep': 'numero', 'valor_local': 'numero', 'score_buro': 'numero',
+    'fecha nacimiento': 'fecha', 'fecha_registro': 'fecha_hora',
+}
+
+
+def filas_cartera(filas, hoy=None):
+    """Cuota, saldo, estado y mora de cada crédito del tramo (columnas de motor_mora.COLUMNAS_CARTERA)."""
+    cuotas = motor_mora.cuotas_de_filas(filas)
+    saldos = motor_mora.saldos_de_filas(filas)
+    mora = motor_mora.mora_de_filas(filas, hoy)
+    resultado = []
+    for i, row in enumerate(filas):
+        saldo = float(saldos[i])
+        estado = "Vigente"
+        if saldo <= 0.1:
+            estado = "Pagado"
+        elif mora.dias_mora[i] > 0:
+            estado = "En Mora"
+        resultado.append((
+            row[0], row[1] or "Desconocido", row[2] or 0.0, row[3] or 0, float(cuotas[i]), row[7], saldo, estado,
+            int(mora.dias_mora[i]), int(mora.cuotas_vencidas[i]), float(mora.monto_vencido[i]), float(mora.mora[i]),
+        ))
+    return resultado
+
+
+INFORMES = {}
+
+
+def _registrar(*args, **kwargs):
+    informe = Informe(*args, **kwargs)
+    INFORMES[informe.clave] = informe
+
+
+_registrar(
+    "caja", "Caja Global", "Reporte Caja", """
+        SELECT
+            fecha_hora, cedula, nombres_completos, ruc, telefono,
+            email, direccion, valor_apertura, numero_apertura,
+            buro_credito, observaciones
+        FROM Caja
+        {donde}
+    """,
+    ["Fecha de Registro", "Cédula", "Nombres y Apellidos", "RUC", "Teléfono", "Correo", "Dirección",
+     "Valor Apertura ($)", "No. Apertura", "Buró de Crédito", "Observaciones"],
+    "#D7E4BC", "Reporte_Global_Caja", "Reporte global exportado correctamente.",
+    "No hay datos registrados en Caja para exportar.",
+    ["fecha_hora", "texto", "texto", "texto", "texto", "texto", "texto", "numero", "texto", "texto", "texto"],
+    ancho_min=0, margen=5, marca=("modificado", "Caja"))
+
+_registrar(
+    "clientes", "Base Maestra de Clientes", "Base Maestra", "SELECT * FROM Clientes",
+    TITULOS_CLIENTES, "#C6EFCE", "Master_Base_Clientes", "Exportación completada.",
+    "No hay clientes registrados.", TIPOS_CLIENTES, ancho_min=15)
+
+_registrar(
+    "cartera", "Cartera", "Cartera", motor_mora.SQL_CARTERA,
+    ["Cédula", "Cliente", "Monto Crédito ($)", "Plazo (Meses)", "Cuota ($)", "Total Pagado ($)",
+     "Saldo Est. ($)", "Estado", "Días Mora", "Cuotas Vencidas", "Monto Vencido ($)", "Mora ($)"],
+    "#9BC2E6", "Reporte_Cartera", "Reporte de Cartera exportado correctamente.",
+    "No hay créditos desembolsados para reporte.",
+    ["texto", "texto", "numero", "entero", "numero", "numero", "numero", "texto", "entero", "entero", "numero", "numero"],
+    procesar=filas_cartera)
+
+_registrar(
+    "microcredito", "Microcrédito", "Microcredito", """
+        SELECT
+            m.cedula_cliente, c.nombres, c.asesor, m.status, m.sub_status,
+            m.monto_aprobado, m.plazo_meses, m.valor_cuota,
+            m.fecha_desembolso_real, m.dia_pago, m.observaciones
+        FROM Microcreditos m
+        LEFT JOIN Clientes c ON m.cedula_cliente = c.cedula
+    """,
+    ["Cédula", "Cliente", "Asesor", "Estado", "Sub-Estado", "Monto Aprobado ($)", "Plazo (Meses)",
+     "Cuota ($)", "Fecha Desembolso", "Día de Pago", "Observaciones"],
+    "#FFD966", "Reporte_Microcredito", "Reporte de Microcrédito exportado correctamente.",
+    "No hay microcréditos registrados para reporte.",
+    ["texto", "texto", "texto", "texto", "texto", "numero", "entero", "numero", "fecha", "entero", "texto"])
+
+_registrar(
+    "pagos", "Pagos", "Pagos", """
+        SELECT
+            p.fecha, p.cedula_cliente, COALESCE(c.nombres, 'Desconocido'), p.cuota_nro,
+            p.valor_capital, p.valor_interes, p.valor_mora, p.total_pagado, p.usuario
+        FROM Pagos p
+        LEFT JOIN Clientes c ON p.cedula_cliente = c.cedula
+        {donde}
+        ORDER BY p.id DESC
+    """,
+    ["Fecha", "Cédula", "Cliente", "Nro. Cuota", "Capital ($)", "Interés ($)", "Mora ($)",
+     "Total Pagado ($)", "Usuario"],
+    "#E2EFDA", "Reporte_Pagos", "Reporte de Pagos exportado correctamente.",
+    "No hay pagos registrados para reporte.",
+    ["fecha_hora", "texto", "texto", "entero", "numero", "numero", "numero", "numero", "texto"],
+    marca=("p.id", "Pagos p"))
+
+_registrar(
+    "buro", "Buró", "Buro", """
+        SELECT b.fecha, b.cedula_cliente, b.nombre_cliente, b.monto, b.usuario
+        FROM PagosBuro b
+        {donde}
+        ORDER BY b.id DESC
+    """,
+    ["Fecha", "Cédula", "Cliente", "Monto ($)", "Usuario"],
+    "#D7BDE2", "Reporte_Buro", "Reporte de Buró exportado correctamente.",
+    "No hay cobros de buró registrados para reporte.",
+    ["fecha", "texto", "texto", "numero", "texto"], marca=("b.id", "PagosBuro b"))
+
+_registrar(
+    "intermediacion", "Intermediación", "Intermediacion", """
+        SELECT
+            i.cedula_cliente, c.nombres, i.fecha_cita, i.informe_cita,
+            i.fecha_desembolso_inter, i.desc_informe
+        FROM Intermediacion_Detalles i
+        LEFT JOIN Clientes c ON i.cedula_cliente = c.cedula
+    """,
+    ["Cédula", "Cliente", "Fecha Cita", "Informe Cita", "Fecha Desembolso", "Descripción Informe"],
+    "#AED6F1", "Reporte_Intermediacion", "Reporte de Intermediación exportado correctamente.",
+    "No hay registros de intermediación para reporte.",
+    ["texto", "texto", "fecha", "texto", "fecha", "texto"], ancho_min=15)
+
+_registrar(
+    "rehabilitacion", "Rehabilitación", "Rehabilitacion", """
+        SELECT
+            r.cedula_cliente, c.nombres, r.fecha_inicio, r.terminos, r.resultado,
+            CASE WHEN r.finalizado = 1 THEN 'Sí' ELSE 'No' END
+        FROM Rehabilitacion r
+        LEFT JOIN Clientes c ON r.cedula_cliente = c.cedula
+    """,
+    ["Cédula", "Cliente", "Fecha Inicio", "Términos", "Resultado", "Finalizado"],
+    "#F5B7B1", "Reporte_Rehabilitacion", "Reporte de Rehabilitación exportado correctamente.",
+    "No hay registros de rehabilitación para reporte.",
+    ["texto", "texto", "fecha", "texto", "texto", "texto"], ancho_min=15)
+
+_registrar(
+    "auditoria", "Auditoría", "Auditoria", """
+        SELECT timestamp, id_usuario, accion, id_cliente, detalles
+        FROM Auditoria
+        {donde}
+        ORDER BY id DESC
+    """,
+    ["Fecha y Hora", "Usuario", "Acción", "Cliente", "Detalles"],
+    "#D5D8DC", "Reporte_Auditoria", "Reporte de Auditoría exportado correctamente.",
+    "No hay registros de auditoría para reporte.",
+    ["fecha_hora", "texto", "texto", "texto", "texto"], ancho_min=15, marca=("id", "Auditoria"))
+
+# Informes del Paquete de Informes (Auditoría se exporta aparte)
+PAQUETE = ("caja", "clientes", "cartera", "microcredito", "pagos", "buro", "intermediacion", "rehabilitacion")
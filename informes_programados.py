@@ -0,0 +1,126 @@
+"""
+Informes pre-generados por la noche, fuera del horario de atención.
+
+Los informes de PROGRAMACION se generan con el mismo motor de exportación
+(exportador) en la carpeta CARPETA, según un horario tipo cron
+("minuto hora día mes día_semana", con *, listas, rangos y */n; día_semana
+0 = domingo). Gestión de Informes ofrece el último archivo generado al
+instante, con la opción de regenerarlo en ese momento.
+
+Uso (servidor o PC que quede encendida):
+    python informes_programados.py            # queda corriendo y genera según el horario
+    python informes_programados.py --ahora    # genera todos ya y termina (p. ej. desde el
+                                              # Programador de tareas de Windows)
+
+Cada archivo se escribe con un nombre temporal y se renombra al terminar, así
+la interfaz nunca ofrece un archivo a medio escribir. Se conservan los últimos
+CONSERVAR archivos de cada informe.
+"""
+import datetime
+import glob
+import os
+import sys
+import time
+
+import exportador
+import informes
+
+CARPETA = "Informes_Programados"
+CONSERVAR = 7
+
+# (clave del informe, formato de exportador.FORMATOS, horario)
+PROGRAMACION = [
+    ("cartera", "Excel", "0 2 * * *"),
+    ("clientes", "Excel", "15 2 * * *"),
+]
+
+_RANGOS_CRON = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def _campo_cron(texto, minimo, maximo):
+    valores = set()
+    for parte in texto.split(","):
+        rango, _, paso = parte.partition("/")
+        if rango == "*":
+            desde, hasta = minimo, maximo
+        elif "-" in rango:
+            desde, hasta = (int(v) for v in rango.split("-"))
+        else:
+            desde = hasta = int(rango)
+        valores.update(range(desde, hasta + 1, int(paso or 1)))
+    return valores
+
+
+def coincide(horario, momento):
+    """True si el horario cron corresponde al minuto de `momento`."""
+    campos = [_campo_cron(t, *r) for t, r in zip(horario.split(), _RANGOS_CRON)]
+    dia_semana = (momento.weekday() + 1) % 7  # cron: 0 = domingo
+    return (momento.minute in campos[0] and momento.hour in campos[1] and momento.day in campos[2]
+            and momento.month in campos[3] and dia_semana in campos[4])
+
+
+def _patron(informe, extension):
+    return os.path.join(CARPETA, f"{informe.archivo}_programado_*{extension}")
+
+
+def ultimo_generado(clave, formato="Excel"):
+    """(ruta, fecha de generación) del último archivo pre-generado, o None."""
+    informe = informes.INFORMES[clave]
+    archivos = glob.glob(_patron(informe, exportador.FORMATOS[formato]))
+    if not archivos:
+        return None
+    ruta = max(archivos, key=os.path.getmtime)
+    return ruta, datetime.datetime.fromtimestamp(os.path.getmtime(ruta))
+
+
+def generar(dbm, clave, formato="Excel"):
+    """Genera ahora el informe en CARPETA. Retorna (ruta o None si no hubo filas, filas)."""
+    informe = informes.INFORMES[clave]
+    extension = exportador.FORMATOS[formato]
+    os.makedirs(CARPETA, exist_ok=True)
+    ruta = os.path.join(CARPETA, f"{informe.archivo}_programado_{datetime.datetime.now():%Y%m%d_%H%M}{extension}")
+    temporal = os.path.join(CARPETA, f".generando_{os.path.basename(ruta)}")
+    filas = exportador.exportar(dbm, informe, temporal)
+    if not filas:
+        return None, 0
+    os.replace(temporal, ruta)
+
+    # Solo los últimos CONSERVAR de este informe y formato
+    for viejo in sorted(glob.glob(_patron(informe, extension)), key=os.path.getmtime)[:-CONSERVAR]:
+        try:
+            os.remove(viejo)
+        except OSError:
+            pass
+    return ruta, filas
+
+
+def _generar_y_reportar(dbm, clave, formato):
+    inicio = time.monotonic()
+    try:
+        ruta, filas = generar(dbm, clave, formato)
+        print(f"{datetime.datetime.now():%Y-%m-%d %H:%M} {clave}: "
+              + (f"{filas:,} filas -> {ruta} ({time.monotonic() - inicio:.1f} s)" if ruta else "sin datos"))
+    except Exception as e:
+        print(f"{datetime.datetime.now():%Y-%m-%d %H:%M} {clave}: error ({e})")
+
+
+def correr(dbm, programacion=PROGRAMACION):
+    """Bucle del programador: cada minuto genera los informes cuyo horario coincide."""
+    print(f"Programador de informes: {len(programacion)} informes en '{os.path.abspath(CARPETA)}'.")
+    while True:
+        ahora = datetime.datetime.now().replace(second=0, microsecond=0)
+        for clave, formato, horario in programacion:
+            if coincide(horario, ahora):
+                _generar_y_reportar(dbm, clave, formato)
+        # Dormir hasta el minuto siguiente (aunque la generación haya tardado)
+        siguiente = ahora + datetime.timedelta(minutes=1)
+        time.sleep(max((siguiente - datetime.datetime.now()).total_seconds(), 0) + 0.5)
+
+
+if __name__ == "__main__":
+    from database import db_manager
+    if "--ahora" in sys.argv:
+        for clave, formato, _ in PROGRAMACION:
+            _generar_y_reportar(db_manager, clave, formato)
+    else:
+        correr(db_manager)
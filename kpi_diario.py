@@ -0,0 +1,8 @@
+from database import db_manager
+from kpis import registrar_dia
+
+# Guarda la instantánea de KPI del día en KpiDiario (tarea programada, p. ej. cada noche a las 23:00)
+if __name__ == "__main__":
+    snap = registrar_dia(db_manager)
+    print(f"KpiDiario: {snap.calculado:%Y-%m-%d} registrado "
+          f"(saldo $ {snap.saldo_cartera:,.2f}, recaudado $ {snap.total_recaudado:,.2f}).")
@@ -0,0 +1,235 @@
+"""
+Indicadores del tablero de estadísticas (KPI), calculados de una vez y en caché.
+
+Una instantánea reúne todas las cifras del tablero:
+  - una sola sentencia agregada con clientes, capital prestado y total recaudado
+    (ResumenPagos ya trae lo pagado por crédito);
+  - una lectura de la cartera desembolsada sobre la que motor_mora calcula
+    cartera vencida, mora, PAR30/PAR90 y los mayores endeudamientos.
+
+La instantánea se guarda TTL segundos. Registrar un pago o un desembolso llama a
+invalidar() y la siguiente apertura del tablero recalcula; los cambios hechos
+en otras estaciones se ven al vencer el TTL.
+
+Historial: registrar_dia() guarda la instantánea del día en KpiDiario (una fila
+por fecha, se sobrescribe si se vuelve a correr). Lo llaman el arranque de la
+aplicación y el script kpi_diario.py (tarea programada nocturna). Los gráficos
+de tendencia leen solo esa tabla. Se guardan acumulados (capital prestado,
+total recaudado): la recaudación de una semana o un mes es la diferencia entre
+el último valor del período y el del anterior, así un día sin registro no
+pierde pagos.
+"""
+import datetime
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import motor_mora
+
+SQL_TOTALES = """
+    SELECT
+        (SELECT COUNT(*) FROM Clientes),
+        (SELECT COALESCE(SUM(monto_aprobado), 0) FROM Microcreditos),
+        (SELECT COALESCE(SUM(total_pagado), 0) FROM ResumenPagos)
+"""
+
+TABLA_DIARIA = "KpiDiario"
+# Columnas de KpiDiario además de la fecha (mismos nombres que en SnapshotKPI)
+COLUMNAS_DIARIO = ("total_clientes", "capital_prestado", "total_recaudado", "saldo_cartera",
+                   "cartera_vencida", "mora", "creditos_activos", "creditos_en_mora", "par30", "par90")
+
+SQL_CREAR_DIARIO = f"""
+    CREATE TABLE IF NOT EXISTS {TABLA_DIARIA} (
+        fecha TEXT PRIMARY KEY,
+        total_clientes INTEGER,
+        capital_prestado REAL,
+        total_recaudado REAL,
+        saldo_cartera REAL,
+        cartera_vencida REAL,
+        mora REAL,
+        creditos_activos INTEGER,
+        creditos_en_mora INTEGER,
+        par30 REAL,
+        par90 REAL,
+        calculado TEXT
+    )
+"""
+
+_SQL_GUARDAR_DIA = f"""
+    INSERT INTO {TABLA_DIARIA} (fecha, {", ".join(COLUMNAS_DIARIO)}, calculado)
+    VALUES (%s, {", ".join(["%s"] * len(COLUMNAS_DIARIO))}, %s)
+    ON CONFLICT (fecha) DO UPDATE SET
+        {", ".join(f"{c} = excluded.{c}" for c in COLUMNAS_DIARIO)},
+        calculado = excluded.calculado
+"""
+
+SnapshotKPI = namedtuple("SnapshotKPI", [
+    "total_clientes", "capital_prestado", "total_recaudado",
+    "saldo_cartera", "cartera_vencida", "mora", "creditos_activos", "creditos_en_mora",
+    "par30", "par90",
+    "mayores_deudores",  # [(nombres, monto_aprobado, plazo_meses)]
+    "calculado",         # datetime de la instantánea
+])
+
+
+def _par(saldo, dias_mora, dias):
+    """Portafolio en riesgo: fracción del saldo de créditos con más de `dias` de atraso."""
+    total = saldo.sum()
+    return float(saldo[dias_mora > dias].sum() / total) if total > 0 else 0.0
+
+
+def calcular_snapshot(cursor, top=5, hoy=None):
+    """Calcula todas las cifras del tablero con el cursor dado."""
+    cursor.execute(SQL_TOTALES)
+    clientes, capital, recaudado = cursor.fetchone()
+
+    filas, mora = motor_mora.consultar_cartera(cursor, hoy)
+    monto = np.array([f[2] or 0.0 for f in filas], dtype=np.float64)
+    saldo = motor_mora.saldos_de_filas(filas)  # capital pendiente según la tabla de amortización
+    totales = motor_mora.totales_mora(mora)
+
+    # Mayor endeudamiento entre los créditos desembolsados (mismo orden que la tabla anterior)
+    mayores = [(filas[i][1], float(monto[i]), filas[i][3])
+               for i in np.argsort(-monto, kind="stable")[:top]]
+
+    return SnapshotKPI(
+        total_clientes=int(clientes or 0),
+        capital_prestado=float(capital or 0),
+        total_recaudado=float(recaudado or 0),
+        saldo_cartera=float(saldo.sum()),
+        cartera_vencida=totales["monto_vencido"],
+        mora=totales["mora"],
+        creditos_activos=int(np.count_nonzero(saldo)),
+        creditos_en_mora=totales["creditos_en_mora"],
+        par30=_par(saldo, mora.dias_mora, 30),
+        par90=_par(saldo, mora.dias_mora, 90),
+        mayores_deudores=mayores,
+        calculado=datetime.datetime.now(),
+    )
+
+
+class ServicioKPI:
+    """Caché thread-safe de la instantánea de KPI."""
+    TTL = 60  # segundos
+
+    def __init__(self, ttl=None):
+        self.ttl = self.TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._vence = 0.0
+        self._version = 0  # sube con cada invalidar()
+
+    def vigente(self):
+        """La instantánea en caché si no venció; None si hay que calcular."""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() < self._vence:
+                return self._snapshot
+        return None
+
+    def obtener(self, cursor):
+        """Instantánea vigente o recién calculada. Pensada para EjecutorDB (recibe el cursor)."""
+        snap = self.vigente()
+        if snap is not None:
+            return snap
+        with self._lock:
+            version = self._version
+        snap = calcular_snapshot(cursor)
+        with self._lock:
+            # Si se invalidó mientras se calculaba, se entrega pero no se guarda
+            if version == self._version:
+                self._snapshot = snap
+                self._vence = time.monotonic() + self.ttl
+        return snap
+
+    def invalidar(self):
+        """Descarta la instantánea (llamar después de registrar pagos o desembolsos)."""
+        with self._lock:
+            self._snapshot = None
+            self._version += 1
+
+
+# ---------------------------------------------------------------------
+# Historial diario (KpiDiario)
+# ---------------------------------------------------------------------
+
+def guardar_dia(cursor, snap, fecha=None):
+    """Guarda (o reemplaza) la fila del día con los valores de la instantánea."""
+    fecha = fecha or datetime.date.today()
+    cursor.execute(_SQL_GUARDAR_DIA, (fecha.strftime("%Y-%m-%d"),)
+                   + tuple(getattr(snap, c) for c in COLUMNAS_DIARIO)
+                   + (snap.calculado.strftime("%Y-%m-%d %H:%M:%S"),))
+
+
+def registrar_dia(dbm, fecha=None):
+    """
+    Calcula la instantánea y la guarda en KpiDiario en una transacción propia.
+    No pasa por el diario offline: cada motor registra su propio historial.
+    """
+    conn = dbm.get_connection()
+    cursor = dbm.get_cursor(conn, diario=False)
+    try:
+        snap = calcular_snapshot(cursor, hoy=fecha)
+        guardar_dia(cursor, snap, fecha)
+        conn.commit()
+        return snap
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        dbm.release_connection(conn)
+
+
+def registrar_dia_en_fondo(dbm):
+    """registrar_dia() en un hilo aparte (al iniciar la aplicación)."""
+    def correr():
+        try:
+            registrar_dia(dbm)
+        except Exception as e:
+            print(f"KPI diario: no se pudo registrar ({e})")
+    threading.Thread(target=correr, daemon=True).start()
+
+
+def leer_tendencia(cursor, dias):
+    """
+    (base, filas) de los últimos `dias` días de KpiDiario, en orden de fecha.
+    filas son dicts con 'fecha' (date) y COLUMNAS_DIARIO; base es la última fila
+    anterior al rango (para la recaudación del primer período) o None.
+    """
+    desde = (datetime.date.today() - datetime.timedelta(days=dias)).strftime("%Y-%m-%d")
+    columnas = ", ".join(("fecha",) + COLUMNAS_DIARIO)
+    cursor.execute(f"SELECT {columnas} FROM {TABLA_DIARIA} WHERE fecha < %s ORDER BY fecha DESC LIMIT 1", (desde,))
+    base = cursor.fetchone()
+    cursor.execute(f"SELECT {columnas} FROM {TABLA_DIARIA} WHERE fecha >= %s ORDER BY fecha", (desde,))
+    filas = cursor.fetchall()
+
+    def a_dict(fila):
+        d = dict(zip(("fecha",) + COLUMNAS_DIARIO, fila))
+        d["fecha"] = datetime.datetime.strptime(str(d["fecha"])[:10], "%Y-%m-%d").date()
+        return d
+    return (a_dict(base) if base else None), [a_dict(f) for f in filas]
+
+
+def _periodo(fecha, periodo):
+    if periodo == "mes":
+        return fecha.replace(day=1)
+    return fecha - datetime.timedelta(days=fecha.weekday())  # lunes de la semana
+
+
+def por_periodo(base, filas, columna, periodo="semana"):
+    """
+    Diferencia del acumulado `columna` por semana o mes: [(inicio del período, monto)].
+    El primer período se mide contra `base` o, sin ella, contra su primera fila.
+    """
+    ultimos = {}
+    for fila in filas:
+        ultimos[_periodo(fila["fecha"], periodo)] = fila[columna] or 0
+    if not ultimos:
+        return []
+    anterior = (base[columna] or 0) if base else (filas[0][columna] or 0)
+    resultado = []
+    for inicio, valor in ultimos.items():
+        resultado.append((inicio, round(valor - anterior, 2)))
+        anterior = valor
+    return resultado
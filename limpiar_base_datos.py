@@ -31,6 +31,10 @@ def limpiar_todo():
             "Intermediacion_Detalles", 
             "Caja",
             "Pagos",
+            "ResumenPagos",
+            "KpiDiario",
+            "Cuotas",
+            "MarcasExportacion",
             "sqlite_sequence" # IMPORTANTE: Esto reinicia los contadores de ID a 1
         ]
         
@@ -0,0 +1,77 @@
+"""
+Marcas de agua de las exportaciones "solo cambios" (tabla MarcasExportacion).
+
+Por informe y usuario se guarda el último valor de la marca (Informe.marca:
+un id o una fecha-hora ISO) que ya se exportó. La siguiente exportación de
+cambios lee solo las filas con marca mayor a esa y menor o igual al máximo
+tomado al empezar. El máximo y las filas salen de la misma instantánea
+(exportador.exportar_cambios), así lo que se confirma durante la exportación
+queda para la próxima.
+
+Límite en PostgreSQL: una transacción que sigue abierta al empezar y que luego
+confirma una marca menor al máximo (un id de secuencia o un modificado tomado
+antes que el de otra transacción ya confirmada) queda por debajo de la marca y
+no sale en las exportaciones de cambios; sí en la exportación completa. En
+SQLite las escrituras van de a una y no pasa.
+
+La marca se guarda después de escribir el archivo: una exportación cancelada
+o fallida no avanza. Se guarda sin diario offline (cada motor lleva las suyas).
+"""
+import datetime
+
+TABLA = "MarcasExportacion"
+
+SQL_CREAR = f"""
+    CREATE TABLE IF NOT EXISTS {TABLA} (
+        informe TEXT NOT NULL,
+        usuario TEXT NOT NULL,
+        marca TEXT NOT NULL,
+        filas INTEGER,
+        fecha TEXT,
+        PRIMARY KEY (informe, usuario)
+    )
+"""
+
+_SQL_GUARDAR = f"""
+    INSERT INTO {TABLA} (informe, usuario, marca, filas, fecha) VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (informe, usuario) DO UPDATE SET
+        marca = excluded.marca, filas = excluded.filas, fecha = excluded.fecha
+"""
+
+
+def _valor(texto):
+    """Los ids se comparan como números; las fechas ISO, como texto."""
+    if texto is None:
+        return None
+    texto = str(texto)
+    return int(texto) if texto.isdigit() else texto
+
+
+def leer(cursor, informe, usuario):
+    """(marca, fecha de la última exportación) o (None, None) si nunca se exportó."""
+    cursor.execute(f"SELECT marca, fecha FROM {TABLA} WHERE informe = %s AND usuario = %s",
+                   (informe, usuario or ""))
+    fila = cursor.fetchone()
+    return (_valor(fila[0]), fila[1]) if fila else (None, None)
+
+
+def maxima(cursor, informe):
+    """Valor actual más alto de la marca del informe (None si la tabla está vacía)."""
+    expresion, origen = informe.marca
+    cursor.execute(f"SELECT MAX({expresion}) FROM {origen}")
+    fila = cursor.fetchone()
+    return _valor(fila[0]) if fila and fila[0] is not None else None
+
+
+def guardar(dbm, informe, usuario, marca, filas):
+    conn = dbm.get_connection()
+    cursor = dbm.get_cursor(conn, diario=False)
+    try:
+        cursor.execute(_SQL_GUARDAR, (informe, usuario or "", str(marca), filas,
+                                      datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        dbm.release_connection(conn)
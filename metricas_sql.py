@@ -0,0 +1,158 @@
+"""
+Instrumentación opcional de consultas para CursorProxy.
+
+Cuando está activa, cada sentencia registra su latencia, las filas devueltas y
+el módulo de la interfaz que la lanzó (clientes, caja, cartera, informes...).
+Las que superan el umbral se anotan en un log rotativo en disco y resumen()
+entrega p50/p95/p99 por sentencia normalizada.
+"""
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+
+# Archivos de infraestructura: no cuentan como "módulo que llama"
+_ARCHIVOS_INTERNOS = ("db_manager.py", "metricas_sql.py", "ejecutor_db.py", "diario_offline.py",
+                      "migraciones.py", "threading.py", "thread.py")
+_PREFIJOS_MODULO = ("abrir_modulo_", "abrir_ventana_", "crear_modulo_", "abrir_")
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(\.\d+)?\b")
+_RE_MARCADOR = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+_RE_LISTA = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalizar(query):
+    """Forma canónica de la sentencia: sin literales, marcadores unificados y espacios colapsados."""
+    q = _RE_CADENA.sub("?", query)
+    q = _RE_MARCADOR.sub("?", q)
+    q = _RE_NUMERO.sub("?", q)
+    q = _RE_LISTA.sub("(?, ...)", q)
+    return _RE_ESPACIOS.sub(" ", q).strip()
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    k = (len(ordenados) - 1) * p / 100.0
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def modulo_llamador():
+    """Nombre del módulo de la interfaz que originó la consulta (p. ej. 'cartera')."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = os.path.basename(frame.f_code.co_filename)
+        if archivo not in _ARCHIVOS_INTERNOS:
+            codigo = frame.f_code
+            raiz = getattr(codigo, "co_qualname", codigo.co_name).split(".")[0]
+            for prefijo in _PREFIJOS_MODULO:
+                if raiz.startswith(prefijo):
+                    return raiz[len(prefijo):]
+            if raiz == "<module>":
+                return os.path.splitext(archivo)[0]
+            return raiz
+        frame = frame.f_back
+    return "desconocido"
+
+
+class Medicion:
+    """Una ejecución en curso; se cierra al leer sus filas o al ejecutar la siguiente."""
+    __slots__ = ("query", "modulo", "inicio", "segundos", "filas")
+
+    def __init__(self, query, modulo):
+        self.query = query
+        self.modulo = modulo
+        self.inicio = time.perf_counter()
+        self.segundos = 0.0
+        self.filas = None
+
+
+class MetricasSQL:
+    """
+    Acumula latencias por sentencia normalizada y escribe el log de consultas lentas.
+    umbral_ms: umbral general; umbrales: {'informes': 2000, ...} por módulo.
+    """
+
+    def __init__(self, umbral_ms=300, umbrales=None, archivo="consultas_lentas.log",
+                 max_bytes=2 * 1024 * 1024, respaldos=3, muestras_por_sentencia=1000):
+        self.umbral_ms = umbral_ms
+        self.umbrales = dict(umbrales or {})
+        self._muestras_max = muestras_por_sentencia
+        self._lock = threading.Lock()
+        self._latencias = defaultdict(lambda: deque(maxlen=self._muestras_max))
+        self._totales = defaultdict(lambda: {"llamadas": 0, "filas": 0, "lentas": 0, "modulos": set()})
+
+        self.log = logging.getLogger("alianza.consultas_lentas")
+        self.log.propagate = False
+        if archivo and not self.log.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                archivo, maxBytes=max_bytes, backupCount=respaldos, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s\t%(message)s"))
+            self.log.addHandler(handler)
+            self.log.setLevel(logging.INFO)
+
+    def iniciar(self, query):
+        return Medicion(query, modulo_llamador())
+
+    def cerrar(self, medicion, filas=None):
+        """Registra la medición (latencia acumulada de execute + fetch)."""
+        if filas is not None:
+            medicion.filas = filas
+        ms = medicion.segundos * 1000.0
+        clave = normalizar(medicion.query)
+        umbral = self.umbrales.get(medicion.modulo, self.umbral_ms)
+        lenta = umbral is not None and ms >= umbral
+        with self._lock:
+            self._latencias[clave].append(ms)
+            total = self._totales[clave]
+            total["llamadas"] += 1
+            total["filas"] += max(medicion.filas or 0, 0)
+            total["modulos"].add(medicion.modulo)
+            if lenta:
+                total["lentas"] += 1
+        if lenta:
+            self.log.info("%.1f ms\t%s filas\t%s\t%s", ms,
+                          "?" if medicion.filas is None or medicion.filas < 0 else medicion.filas,
+                          medicion.modulo, clave)
+
+    def resumen(self, top=20, orden="p95"):
+        """Lista de sentencias (peores primero) con llamadas, p50/p95/p99, máximo, filas y módulos."""
+        with self._lock:
+            copia = {k: (sorted(v), dict(self._totales[k])) for k, v in self._latencias.items()}
+        filas = []
+        for clave, (lat, total) in copia.items():
+            filas.append({
+                "sentencia": clave,
+                "llamadas": total["llamadas"],
+                "p50": round(_percentil(lat, 50), 2),
+                "p95": round(_percentil(lat, 95), 2),
+                "p99": round(_percentil(lat, 99), 2),
+                "max": round(lat[-1], 2) if lat else 0.0,
+                "filas_prom": round(total["filas"] / total["llamadas"], 1) if total["llamadas"] else 0,
+                "lentas": total["lentas"],
+                "modulos": ", ".join(sorted(total["modulos"])),
+            })
+        filas.sort(key=lambda f: f[orden], reverse=True)
+        return filas[:top]
+
+    def imprimir_resumen(self, top=20):
+        """Tabla de texto con el resumen, para la consola."""
+        print(f"{'p50':>9} {'p95':>9} {'p99':>9} {'llam.':>7} {'filas':>8}  módulos | sentencia")
+        for f in self.resumen(top):
+            print(f"{f['p50']:>9} {f['p95']:>9} {f['p99']:>9} {f['llamadas']:>7} {f['filas_prom']:>8}  "
+                  f"{f['modulos']} | {f['sentencia'][:120]}")
+
+    def reiniciar(self):
+        with self._lock:
+            self._latencias.clear()
+            self._totales.clear()
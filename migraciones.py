@@ -0,0 +1,663 @@
+"""
+Motor de migraciones versionado del esquema.
+
+Cada paso se aplica una sola vez, en orden y dentro de su propia transacción;
+la versión aplicada queda registrada en la tabla schema_version. Al arrancar
+solo se compara el número de versión: si el esquema está al día no se hace
+ninguna introspección.
+
+Los pasos son idempotentes (verifican antes de crear/agregar) porque las bases
+existentes ya tienen aplicada, en parte, la cadena anterior de migrar_db().
+"""
+import datetime
+import hashlib
+import json
+
+from busqueda_clientes import EXPR_NOMBRE_PG, TABLA_FTS
+import cuotas
+import kpis
+import marcas_exportacion
+import resumen_pagos
+
+
+def _generar_hash(clave):
+    return hashlib.sha256(clave.encode()).hexdigest()
+
+
+def _agregar_columnas(cursor, dbm, tabla, columnas):
+    """Agrega las columnas que falten en `tabla`. columnas: [(nombre, tipo)]"""
+    existentes = [c.lower() for c in dbm.get_column_names(cursor, tabla)]
+    for col_nombre, col_tipo in columnas:
+        if col_nombre.replace('"', '').lower() not in existentes:
+            print(f"Migrando DB: Agregando columna '{col_nombre}' a {tabla}...")
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {col_nombre} {col_tipo}")
+
+
+# =================================================================
+# PASOS DE MIGRACIÓN
+# =================================================================
+
+def _m001_esquema_base(cursor, dbm):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Clientes (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula TEXT UNIQUE NOT NULL,
+            ruc TEXT,
+            nombre TEXT NOT NULL,
+            estado_civil TEXT,
+            cargas_familiares INTEGER,
+            email TEXT,
+            telefono TEXT,
+            direccion TEXT,
+            parroquia TEXT,
+            tipo_vivienda TEXT,
+            profesion TEXT,
+            ingresos_mensuales REAL,
+            referencia1 TEXT,
+            referencia2 TEXT,
+            asesor TEXT,
+            apertura TEXT,
+            numero_carpeta TEXT,
+            "fecha nacimiento" TEXT,
+            producto TEXT,
+            observaciones TEXT,
+            "cartera castigada" INTEGER DEFAULT 0,
+            "valor cartera" REAL,
+            "demanda judicial" INTEGER DEFAULT 0,
+            "valor demanda" REAL,
+            "problemas justicia" INTEGER DEFAULT 0,
+            "detalle justicia" TEXT
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Usuarios (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            usuario TEXT UNIQUE NOT NULL,
+            clave_hash TEXT NOT NULL,
+            nivel_acceso INTEGER NOT NULL,
+            estado INTEGER DEFAULT 1,
+            rol TEXT
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Auditoria (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            id_usuario TEXT,
+            accion TEXT,
+            id_cliente TEXT,
+            detalles TEXT,
+            timestamp TEXT
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Rehabilitacion (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula_cliente TEXT UNIQUE NOT NULL,
+            fecha_inicio TEXT,
+            terminos TEXT,
+            resultado TEXT,
+            finalizado INTEGER DEFAULT 0,
+            FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS visitas_microcredito (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula_cliente TEXT NOT NULL,
+            fecha TEXT,
+            observaciones TEXT,
+            FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Pagos (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            fecha TEXT,
+            cedula_cliente TEXT,
+            cuota_nro INTEGER,
+            valor_capital REAL,
+            valor_interes REAL,
+            valor_mora REAL,
+            total_pagado REAL,
+            usuario TEXT
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Caja (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            fecha_hora TEXT,
+            cedula TEXT,
+            ruc TEXT,
+            nombres_completos TEXT,
+            email TEXT,
+            direccion TEXT,
+            telefono TEXT,
+            estado_civil TEXT,
+            asesor TEXT,
+            buro_credito TEXT,
+            buro_archivo_ruta TEXT,
+            valor_apertura REAL,
+            numero_apertura TEXT,
+            estado_impreso TEXT
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Intermediacion_Detalles (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula_cliente TEXT UNIQUE NOT NULL,
+
+
+            chk_dis_temp INTEGER DEFAULT 0, val_dis_temp REAL DEFAULT 0, obs_dis_temp TEXT,
+            chk_dis_reg INTEGER DEFAULT 0, val_dis_reg REAL DEFAULT 0, obs_dis_reg TEXT,
+            chk_pat_1 INTEGER DEFAULT 0, val_pat_1 REAL DEFAULT 0, obs_pat_1 TEXT,
+            chk_pat_2 INTEGER DEFAULT 0, val_pat_2 REAL DEFAULT 0, obs_pat_2 TEXT,
+            chk_inmueble INTEGER DEFAULT 0, val_inmueble REAL DEFAULT 0, obs_inmueble TEXT,
+            chk_ruc INTEGER DEFAULT 0, val_ruc REAL DEFAULT 0, obs_ruc TEXT,
+            chk_declaraciones INTEGER DEFAULT 0, val_declaraciones REAL DEFAULT 0, obs_declaraciones TEXT,
+            chk_estados_cta INTEGER DEFAULT 0, val_estados_cta REAL DEFAULT 0, obs_estados_cta TEXT,
+
+            fecha_cita TEXT,
+            informe_cita TEXT,
+
+            chk_precal INTEGER DEFAULT 0, desc_precal TEXT,
+            chk_aprob INTEGER DEFAULT 0, desc_aprob TEXT,
+            fecha_desembolso_inter TEXT,
+            chk_informe INTEGER DEFAULT 0, desc_informe TEXT,
+
+            FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS PagosBuro (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            fecha TEXT,
+            cedula_cliente TEXT,
+            nombre_cliente TEXT,
+            monto REAL,
+            usuario TEXT,
+            metodo TEXT,
+            detalles TEXT
+        )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM Usuarios")
+    if cursor.fetchone()[0] == 0:
+        hash_admin = _generar_hash('cyberpol2022')
+        cursor.execute("INSERT INTO Usuarios (usuario, clave_hash, nivel_acceso, rol) VALUES (%s, %s, %s, %s)", ('Paul', hash_admin, 1, 'Administrador'))
+
+
+def _m002_columnas_clientes(cursor, dbm):
+    _agregar_columnas(cursor, dbm, 'Clientes', [
+        ('imagen_deposito', 'BYTEA'),
+        ('nombre', 'TEXT'),
+        ('asesor', 'TEXT'),
+        ('referencia_vivienda', 'TEXT'),
+        ('situacion_financiera', 'TEXT'),
+        ('terreno', 'INTEGER DEFAULT 0'),
+        ('valor_terreno', 'REAL'),
+        ('hipotecado', 'TEXT'),
+        ('fuente_ingreso', 'TEXT'),
+        ('ingresos_mensuales_2', 'REAL'),
+        ('fuente_ingreso_2', 'TEXT'),
+        ('casa_dep', 'INTEGER DEFAULT 0'),
+        ('valor_casa_dep', 'REAL'),
+        ('hipotecado_casa_dep', 'TEXT'),
+        ('local', 'INTEGER DEFAULT 0'),
+        ('valor_local', 'REAL'),
+        ('hipotecado_local', 'TEXT'),
+        ('score_buro', 'INTEGER'),
+        ('egresos', 'REAL'),
+        ('total_disponible', 'REAL'),
+        ('valor_apertura', 'REAL'),
+        ('fecha_registro', 'TEXT'),
+    ])
+
+
+def _m003_usuarios(cursor, dbm):
+    cols_user = dbm.get_column_names(cursor, 'Usuarios')
+    if 'clave_hash' not in cols_user:
+        if 'clave' in cols_user:
+            print("Migrando DB: Renombrando 'clave' a 'clave_hash' en Usuarios...")
+            cursor.execute("ALTER TABLE Usuarios RENAME COLUMN clave TO clave_hash")
+        else:
+            print("Migrando DB: Agregando 'clave_hash' a Usuarios...")
+            cursor.execute("ALTER TABLE Usuarios ADD COLUMN clave_hash TEXT")
+    if 'estado' not in cols_user:
+        print("Migrando DB: Agregando 'estado' a Usuarios...")
+        cursor.execute("ALTER TABLE Usuarios ADD COLUMN estado INTEGER DEFAULT 1")
+    if 'rol' not in cols_user:
+        print("Migrando DB: Agregando 'rol' a Usuarios...")
+        cursor.execute("ALTER TABLE Usuarios ADD COLUMN rol TEXT")
+        cursor.execute("UPDATE Usuarios SET rol = 'Administrador' WHERE nivel_acceso = 1")
+        cursor.execute("UPDATE Usuarios SET rol = 'Usuario' WHERE nivel_acceso = 2")
+
+
+def _m004_tablas_modulos(cursor, dbm):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Documentos (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula_cliente TEXT NOT NULL,
+            nombre_archivo TEXT NOT NULL,
+            tipo_documento TEXT,
+            ruta_archivo TEXT NOT NULL,
+            fecha_subida TEXT NOT NULL,
+            FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS Microcreditos (
+            id {dbm.sql_type("SERIAL PRIMARY KEY")},
+            cedula_cliente TEXT NOT NULL,
+            ruc TEXT,
+            observaciones TEXT,
+            observaciones_info TEXT,
+            status TEXT,
+            sub_status TEXT,
+
+            ref1_fecha TEXT, ref1_hora TEXT, ref1_nombre TEXT, ref1_telefono TEXT,
+            ref1_relacion TEXT, ref1_tiempo_conocer TEXT, ref1_direccion TEXT,
+            ref1_tipo_vivienda TEXT, ref1_cargas TEXT, ref1_patrimonio TEXT, ref1_responsable TEXT,
+
+            ref2_fecha TEXT, ref2_hora TEXT, ref2_nombre TEXT, ref2_telefono TEXT,
+            ref2_relacion TEXT, ref2_tiempo_conocer TEXT, ref2_direccion TEXT,
+            ref2_tipo_vivienda TEXT, ref2_cargas TEXT, ref2_patrimonio TEXT, ref2_responsable TEXT,
+
+            fecha_comite TEXT, fecha_desembolsado TEXT, fecha_negado TEXT, fecha_desistimiento TEXT,
+
+            FOREIGN KEY (cedula_cliente) REFERENCES Clientes(cedula)
+        )
+    """)
+
+    _agregar_columnas(cursor, dbm, 'Caja', [
+        ('estado_impreso', "TEXT DEFAULT 'Pendiente'"),
+        ('observaciones', 'TEXT'),
+        ('fecha_contrato', 'TEXT'),
+    ])
+
+
+def _m005_columnas_microcreditos(cursor, dbm):
+    _agregar_columnas(cursor, dbm, 'Microcreditos', [
+        ('observaciones_info', 'TEXT'),
+        ('ref1_fecha', 'TEXT'), ('ref1_hora', 'TEXT'), ('ref1_nombre', 'TEXT'), ('ref1_telefono', 'TEXT'),
+        ('ref2_fecha', 'TEXT'), ('ref2_hora', 'TEXT'), ('ref2_nombre', 'TEXT'), ('ref2_telefono', 'TEXT'),
+        ('status', 'TEXT'), ('sub_status', 'TEXT'),
+        ('fecha_desembolsado', 'TEXT'), ('fecha_negado', 'TEXT'), ('fecha_desistimiento', 'TEXT'), ('fecha_comite', 'TEXT'),
+        # Datos del desembolso
+        ('fecha_desembolso_real', 'TEXT'),
+        ('monto_aprobado', 'REAL'),
+        ('tasa_interes', 'REAL'),
+        ('plazo_meses', 'INTEGER'),
+        ('valor_cuota', 'REAL'),
+        ('dia_pago', 'INTEGER'),
+        # Campos pestaña Visitas
+        ('vis_tiempo_reside', 'TEXT'),
+        ('vis_m2_constru', 'TEXT'),
+        ('vis_avaluo', 'TEXT'),
+        ('vis_hipoteca', 'TEXT'),
+        ('vis_avaluo_enseres', 'TEXT'),
+        ('vis_pisos', 'TEXT'),
+        ('vis_donde_vive', 'TEXT'),
+        ('vis_caracteristicas', 'TEXT'),
+        ('vis_destino_credito', 'TEXT'),
+        ('vis_hora', 'TEXT'),
+        ('vis_observaciones', 'TEXT'),
+        ('vis_imagenes_rutas', 'TEXT'),
+    ])
+
+
+def _m006_intermediacion_pagosburo(cursor, dbm):
+    _agregar_columnas(cursor, dbm, 'Intermediacion_Detalles', [(col, 'TEXT') for col in (
+        'obs_dis_temp', 'obs_dis_reg', 'obs_pat_1', 'obs_pat_2',
+        'obs_inmueble', 'obs_ruc', 'obs_declaraciones', 'obs_estados_cta',
+        'fecha_cita', 'informe_cita',
+        'chk_precal', 'desc_precal',
+        'chk_aprob', 'desc_aprob',
+        'fecha_desembolso_inter',
+        'chk_informe', 'desc_informe',
+    )])
+    _agregar_columnas(cursor, dbm, 'PagosBuro', [
+        ('metodo', 'TEXT'),
+        ('detalles', 'TEXT'),
+        ('hora', 'TEXT'),
+        ('concepto', 'TEXT'),
+        ('pago_efectivo', 'REAL DEFAULT 0'),
+        ('pago_transferencia', 'REAL DEFAULT 0'),
+        ('pago_tarjeta', 'REAL DEFAULT 0'),
+    ])
+
+
+def _m007_columnas_rehabilitacion(cursor, dbm):
+    _agregar_columnas(cursor, dbm, 'Rehabilitacion', [
+        ('val_empresas', 'REAL'), ('desc_empresas', 'TEXT'),
+        ('val_bancos', 'REAL'), ('desc_bancos', 'TEXT'),
+        ('val_cooperativas', 'REAL'), ('desc_cooperativas', 'TEXT'),
+        ('val_cobranzas', 'REAL'), ('desc_cobranzas', 'TEXT'),
+        ('fecha_cita', 'TEXT'), ('informe_cita', 'TEXT'),
+    ])
+
+
+def _m008_indices(cursor, dbm):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_cedula ON Clientes(cedula)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_caja_cedula ON Caja(cedula)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_micro_cedula ON Microcreditos(cedula_cliente)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_docs_cedula ON Documentos(cedula_cliente)")
+
+
+def _m009_usuario_admin(cursor, dbm):
+    cursor.execute("SELECT id FROM Usuarios WHERE usuario='admin'")
+    admin_user = cursor.fetchone()
+    if admin_user:
+        print("Migrando usuario admin a Paul...")
+        cursor.execute("UPDATE Usuarios SET usuario=%s, clave_hash=%s WHERE id=%s",
+                       ('Paul', _generar_hash('cyberpol2022'), admin_user[0]))
+
+
+# Índices administrados: (nombre, tabla, columnas). Cada uno responde a un patrón
+# de acceso concreto de la aplicación; el orden de las columnas importa.
+INDICES_CONSULTAS = [
+    ("idx_clientes_ruc", "Clientes", "ruc"),                              # búsqueda por RUC
+    ("idx_pagos_cedula_fecha", "Pagos", "cedula_cliente, fecha"),         # subconsultas de cartera, recaudación
+    ("idx_micro_cedula_id", "Microcreditos", "cedula_cliente, id"),       # último crédito: ORDER BY id DESC LIMIT 1
+    ("idx_micro_sub_status", "Microcreditos", "sub_status, cedula_cliente"),  # cartera: sub_status = 'Desembolsado'
+    ("idx_caja_cedula_id", "Caja", "cedula, id"),                         # última apertura por cédula
+    ("idx_caja_ruc", "Caja", "ruc"),                                      # cedula = '' AND ruc = %s
+    ("idx_caja_numero_apertura", "Caja", "numero_apertura"),
+    ("idx_docs_cedula_fecha", "Documentos", "cedula_cliente, fecha_subida"),  # ORDER BY fecha_subida
+    ("idx_pagosburo_cedula_fecha", "PagosBuro", "cedula_cliente, fecha"),
+    ("idx_auditoria_timestamp", "Auditoria", "timestamp"),
+]
+
+# Índices de la migración 8 que quedan cubiertos por un compuesto con el mismo prefijo
+INDICES_REEMPLAZADOS = ("idx_caja_cedula", "idx_micro_cedula", "idx_docs_cedula")
+
+
+def _m010_indices_consultas(cursor, dbm):
+    for nombre, tabla, columnas in INDICES_CONSULTAS:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas})")
+    for nombre in INDICES_REEMPLAZADOS:
+        cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
+    if dbm.mode == "POSTGRES":
+        # Estadísticas frescas para que el planificador use los índices nuevos.
+        # (En SQLite no: con tablas casi vacías fijaría planes de SCAN; de eso se
+        # encarga PRAGMA optimize al cerrar el pool.)
+        cursor.execute("ANALYZE")
+
+
+def _m011_busqueda_nombres(cursor, dbm):
+    # Las bases antiguas usan 'nombres' y las nuevas solo tenían 'nombre'
+    _agregar_columnas(cursor, dbm, "Clientes", [("nombres", "TEXT")])
+
+    if dbm.mode == "POSTGRES":
+        # Sin tildes y en minúsculas; IMMUTABLE para poder indexarla (unaccent no lo es)
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION alz_normalizar(texto TEXT) RETURNS TEXT AS $$
+                SELECT translate(lower(texto), 'áéíóúàèìòùäëïöüâêîôûñç', 'aeiouaeiouaeiouaeiounc')
+            $$ LANGUAGE SQL IMMUTABLE
+        """)
+        # CREATE EXTENSION requiere privilegios que el usuario de la aplicación puede
+        # no tener: si falla, la migración sigue y la búsqueda usa LIKE sin índice
+        # (busqueda_clientes lo detecta porque pg_trgm no queda instalada).
+        cursor.execute("SAVEPOINT alz_trgm")
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_clientes_nombre_trgm ON Clientes "
+                           f"USING gin ({EXPR_NOMBRE_PG} gin_trgm_ops)")
+            cursor.execute("RELEASE SAVEPOINT alz_trgm")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT alz_trgm")
+            print(f"pg_trgm no disponible en el servidor ({e}); la búsqueda por nombre usará LIKE.")
+        return
+
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+                nombres, nombre, content='Clientes', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except Exception as e:
+        print(f"FTS5 no disponible en este SQLite ({e}); la búsqueda por nombre usará LIKE.")
+        return
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON Clientes BEGIN
+            INSERT INTO {TABLA_FTS}(rowid, nombres, nombre) VALUES (new.id, new.nombres, new.nombre);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON Clientes BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombres, nombre) VALUES ('delete', old.id, old.nombres, old.nombre);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE OF nombres, nombre ON Clientes BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, nombres, nombre) VALUES ('delete', old.id, old.nombres, old.nombre);
+            INSERT INTO {TABLA_FTS}(rowid, nombres, nombre) VALUES (new.id, new.nombres, new.nombre);
+        END
+    """)
+    cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def _m012_resumen_pagos(cursor, dbm):
+    cursor.execute(resumen_pagos.SQL_CREAR)
+    resumen_pagos.reconstruir(cursor)
+
+
+def _m013_kpi_diario(cursor, dbm):
+    cursor.execute(kpis.SQL_CREAR_DIARIO)
+
+
+def _m014_cuotas(cursor, dbm):
+    cursor.execute(cuotas.SQL_CREAR)
+    cursor.execute(cuotas.SQL_INDICE)
+    cuotas.generar_faltantes(cursor)
+
+
+def _m015_marcas_exportacion(cursor, dbm):
+    cursor.execute(marcas_exportacion.SQL_CREAR)
+
+
+def _m016_caja_modificado(cursor, dbm):
+    # Marca de "solo cambios" de Caja: las aperturas se editan (datos, contrato,
+    # estado impreso), así que el id no alcanza. Los triggers la ponen en cada
+    # INSERT y UPDATE, venga de donde venga la escritura.
+    _agregar_columnas(cursor, dbm, "Caja", [("modificado", "TEXT")])
+    cursor.execute("UPDATE Caja SET modificado = %s WHERE modificado IS NULL",
+                   (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_caja_modificado ON Caja (modificado)")
+    if dbm.mode == "POSTGRES":
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION alz_caja_modificado() RETURNS trigger AS $$
+            BEGIN
+                NEW.modificado := to_char(clock_timestamp(), 'YYYY-MM-DD HH24:MI:SS.US');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS caja_modificado ON Caja")
+        cursor.execute("""
+            CREATE TRIGGER caja_modificado BEFORE INSERT OR UPDATE ON Caja
+            FOR EACH ROW EXECUTE PROCEDURE alz_caja_modificado()
+        """)
+    else:
+        for evento in ("INSERT", "UPDATE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS caja_modificado_{evento.lower()} AFTER {evento} ON Caja BEGIN
+                    UPDATE Caja SET modificado = strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') WHERE id = new.id;
+                END
+            """)
+    # Las marcas guardadas eran ids: la próxima exportación de cambios de Caja trae todo
+    cursor.execute(f"DELETE FROM {marcas_exportacion.TABLA} WHERE informe = 'caja'")
+
+
+# Lista ordenada: (versión, descripción, función). Solo se agregan pasos al final.
+MIGRACIONES = [
+    (1, "Esquema base", _m001_esquema_base),
+    (2, "Columnas de Clientes", _m002_columnas_clientes),
+    (3, "Usuarios: clave_hash, estado y rol", _m003_usuarios),
+    (4, "Tablas Documentos y Microcreditos; columnas de Caja", _m004_tablas_modulos),
+    (5, "Columnas de Microcreditos (desembolso y visitas)", _m005_columnas_microcreditos),
+    (6, "Columnas de Intermediacion_Detalles y PagosBuro", _m006_intermediacion_pagosburo),
+    (7, "Columnas de Rehabilitacion", _m007_columnas_rehabilitacion),
+    (8, "Índices básicos", _m008_indices),
+    (9, "Usuario admin -> Paul", _m009_usuario_admin),
+    (10, "Índices de consultas frecuentes", _m010_indices_consultas),
+    (11, "Búsqueda de clientes por nombre (pg_trgm / FTS5)", _m011_busqueda_nombres),
+    (12, "Tabla ResumenPagos", _m012_resumen_pagos),
+    (13, "Tabla KpiDiario (historial del tablero)", _m013_kpi_diario),
+    (14, "Tabla Cuotas (amortización de créditos desembolsados)", _m014_cuotas),
+    (15, "Tabla MarcasExportacion (exportación de solo cambios)", _m015_marcas_exportacion),
+    (16, "Caja.modificado (exportación de solo cambios de Caja)", _m016_caja_modificado),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# Clave del advisory lock de PostgreSQL (evita que dos estaciones migren a la vez)
+_LOCK_MIGRACIONES = 20260101
+
+
+# =================================================================
+# MOTOR
+# =================================================================
+
+def _version_actual(conn, cursor):
+    """Versión registrada en schema_version (0 si la tabla aún no existe)."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        return row[0] or 0
+    except Exception:
+        conn.rollback()
+        return None
+
+
+def _iniciar_transaccion(dbm, conn, cursor):
+    conn.commit()
+    if dbm.mode == "SQLITE":
+        # Toma el bloqueo de escritura desde el inicio y agrupa el DDL en la transacción
+        cursor.execute("BEGIN IMMEDIATE")
+    else:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_MIGRACIONES,))
+
+
+def aplicar_migraciones(dbm, migraciones=MIGRACIONES):
+    """
+    Aplica en orden los pasos pendientes y retorna la versión final del esquema.
+    Si un paso falla se revierte completo y se relanza la excepción.
+    """
+    conn = dbm.get_connection()
+    # Las migraciones corren en cada motor; no van al diario offline
+    cursor = dbm.get_cursor(conn, diario=False)
+    try:
+        version = _version_actual(conn, cursor)
+        objetivo = migraciones[-1][0]
+        if version is not None and version >= objetivo:
+            conn.commit()
+            return version
+
+        if version is None:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    descripcion TEXT,
+                    aplicada TEXT
+                )
+            """)
+            conn.commit()
+
+        for num, descripcion, paso in migraciones:
+            _iniciar_transaccion(dbm, conn, cursor)
+            # Releer dentro del bloqueo: otra estación pudo haberlo aplicado
+            cursor.execute("SELECT MAX(version) FROM schema_version")
+            version = cursor.fetchone()[0] or 0
+            if num <= version:
+                conn.commit()
+                continue
+            print(f"Migración {num}: {descripcion}...")
+            try:
+                paso(cursor, dbm)
+                cursor.execute("INSERT INTO schema_version (version, descripcion, aplicada) VALUES (%s, %s, %s)",
+                               (num, descripcion, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                # El catálogo pudo haber visto DDL que se acaba de revertir
+                dbm.catalogo.invalidar()
+                raise
+        return num
+    finally:
+        dbm.release_connection(conn)
+
+
+# =================================================================
+# REVISIÓN DE PLANES
+# =================================================================
+
+# Consultas calientes de la aplicación: (nombre, sql, parámetros de ejemplo)
+CONSULTAS_CALIENTES = [
+    ("clientes por cédula", "SELECT * FROM Clientes WHERE cedula = %s", ("0000000000",)),
+    ("clientes por ruc", "SELECT nombre, cedula, ruc FROM Clientes WHERE ruc = %s", ("0000000000001",)),
+    ("pagos de un cliente", "SELECT cuotas_pagadas, capital_pagado FROM ResumenPagos WHERE cedula_cliente = %s", ("0000000000",)),
+    ("último crédito", "SELECT * FROM Microcreditos WHERE cedula_cliente = %s ORDER BY id DESC LIMIT 1", ("0000000000",)),
+    ("cartera desembolsada", "SELECT cedula_cliente FROM Microcreditos WHERE sub_status = %s", ("Desembolsado",)),
+    ("última apertura de caja", "SELECT valor_apertura, numero_apertura FROM Caja WHERE cedula = %s ORDER BY id DESC LIMIT 1", ("0000000000",)),
+    ("caja por ruc", "SELECT id FROM Caja WHERE cedula = %s OR (cedula = '' AND ruc = %s)", ("0000000000", "0000000000001")),
+    ("caja por número de apertura", "SELECT id FROM Caja WHERE numero_apertura = %s", ("0001",)),
+    ("documentos del cliente", "SELECT * FROM Documentos WHERE cedula_cliente = %s ORDER BY fecha_subida DESC", ("0000000000",)),
+    ("pagos de buró", "SELECT * FROM PagosBuro WHERE cedula_cliente = %s ORDER BY fecha DESC", ("0000000000",)),
+    ("auditoría por fecha", "SELECT * FROM Auditoria WHERE timestamp >= %s ORDER BY timestamp", ("2026-01-01",)),
+]
+
+
+def _escaneos_secuenciales(dbm, cursor, query, params):
+    """Tablas que el plan recorre completas (sin índice)."""
+    if dbm.mode == "SQLITE":
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        # detalle: 'SCAN Clientes [USING ... INDEX]' recorre todo; 'SEARCH Clientes USING INDEX' no
+        return [fila[-1] for fila in cursor.fetchall()
+                if fila[-1].startswith("SCAN ") and not fila[-1].startswith("SCAN CONSTANT")]
+
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    encontrados = []
+    pendientes = [plan[0]["Plan"]]
+    while pendientes:
+        nodo = pendientes.pop()
+        if nodo.get("Node Type") == "Seq Scan":
+            encontrados.append(f"Seq Scan on {nodo.get('Relation Name')}")
+        pendientes.extend(nodo.get("Plans", []))
+    return encontrados
+
+
+def revisar_planes(dbm, consultas=CONSULTAS_CALIENTES):
+    """
+    Ejecuta EXPLAIN sobre las consultas calientes y retorna [(nombre, detalle)]
+    de las que todavía recorren una tabla completa.
+    En PostgreSQL una tabla casi vacía puede preferir Seq Scan aunque exista el
+    índice; el resultado es representativo con datos reales y ANALYZE reciente.
+    """
+    conn = dbm.get_connection()
+    cursor = dbm.get_cursor(conn, diario=False)
+    hallazgos = []
+    try:
+        for nombre, query, params in consultas:
+            try:
+                for detalle in _escaneos_secuenciales(dbm, cursor, query, params):
+                    hallazgos.append((nombre, detalle))
+            except Exception as e:
+                conn.rollback()
+                hallazgos.append((nombre, f"No se pudo revisar: {e}"))
+        conn.rollback()
+    finally:
+        dbm.release_connection(conn)
+    return hallazgos
@@ -0,0 +1,184 @@
+"""
+Motor de mora de la cartera, vectorizado con NumPy.
+
+Carga todos los créditos desembolsados (fecha de desembolso, día de pago, plazo,
+cuota y cuotas pagadas de ResumenPagos) en arreglos y calcula de una sola pasada,
+para toda la cartera: vencimiento de la próxima cuota, días de mora, cuotas y
+monto vencidos y la mora acumulada.
+
+Usa las mismas reglas que el cobro en Recaudación:
+  - la cuota k vence k meses después del desembolso, el día `dia_pago`
+    (o el último día del mes si ese día no existe);
+  - la mora es TASA_MORA_DIARIA de la cuota por cada día de atraso;
+  - la cuota es la del sistema francés de amortizacion (monto, tasa, plazo).
+"""
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import amortizacion
+
+TASA_MORA_DIARIA = 0.011  # 1.1% por día sobre la cuota
+
+# Columnas 0-7 iguales a las que ya leían Cartera y el Excel de cartera.
+# valor_cuota (4) es la cuota contratada; amortizacion la calcula solo si no se guardó (cuotas_de_filas)
+COLUMNAS_CARTERA = """
+    m.cedula_cliente,
+    c.nombres,
+    m.monto_aprobado,
+    m.plazo_meses,
+    m.valor_cuota,
+    m.fecha_desembolso_real,
+    COALESCE(r.capital_pagado, 0) as capital_pagado,
+    COALESCE(r.total_pagado, 0) as total_cash_paid,
+    m.dia_pago,
+    COALESCE(r.cuotas_pagadas, 0) as cuotas_pagadas,
+    m.tasa_interes
+"""
+ORIGEN_CARTERA = """
+    Microcreditos m
+    LEFT JOIN Clientes c ON m.cedula_cliente = c.cedula
+    LEFT JOIN ResumenPagos r ON r.cedula_cliente = m.cedula_cliente
+"""
+FILTRO_CARTERA = "m.sub_status = 'Desembolsado'"
+SQL_CARTERA = f"SELECT {COLUMNAS_CARTERA} FROM {ORIGEN_CARTERA} WHERE {FILTRO_CARTERA}"
+
+MoraCartera = namedtuple("MoraCartera", "vencimiento dias_mora cuotas_vencidas monto_vencido mora")
+
+_FORMATOS_FECHA = ("%d/%m/%Y", "%Y-%m-%d")
+
+
+def fecha_iso(texto):
+    """Fecha de desembolso en cualquiera de los formatos guardados; None si no se entiende."""
+    if isinstance(texto, (datetime.date, datetime.datetime)):
+        return texto.strftime("%Y-%m-%d")
+    if not texto:
+        return None
+    return _fecha_texto(str(texto).split(" ")[0])
+
+
+@lru_cache(maxsize=8192)
+def _fecha_texto(base):
+    # Pocas fechas distintas entre miles de créditos: strptime una vez por fecha
+    for formato in _FORMATOS_FECHA:
+        try:
+            return datetime.datetime.strptime(base, formato).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return None
+
+
+def _vencimientos(meses_desembolso, dia_pago, k):
+    """Fecha de vencimiento de la cuota k (arreglos que se difunden entre sí)."""
+    mes = meses_desembolso + k.astype("timedelta64[M]")
+    inicio = mes.astype("datetime64[D]")
+    dias_mes = ((mes + 1).astype("datetime64[D]") - inicio).astype(np.int64)
+    return inicio + (np.minimum(dia_pago, dias_mes) - 1).astype("timedelta64[D]")
+
+
+def calcular_mora(fechas_desembolso, dias_pago, plazos, cuotas, cuotas_pagadas, hoy=None):
+    """
+    Mora de toda la cartera. Recibe secuencias paralelas (una posición por crédito)
+    y retorna MoraCartera con un arreglo por campo. Los créditos sin fecha de
+    desembolso válida o ya pagados quedan con vencimiento NaT y sin mora.
+    """
+    hoy = np.datetime64(hoy or datetime.date.today(), "D")
+    n = len(plazos)
+    desembolso = np.array([fecha_iso(f) for f in fechas_desembolso], dtype="datetime64[D]")
+    dia = np.clip(np.array([int(d or 1) for d in dias_pago], dtype=np.int64), 1, 31)
+    plazo = np.array([p or 0 for p in plazos], dtype=np.int64)
+    cuota = np.array([c or 0.0 for c in cuotas], dtype=np.float64)
+    pagadas = np.array([p or 0 for p in cuotas_pagadas], dtype=np.int64)
+
+    valida = ~np.isnat(desembolso)
+    meses = np.where(valida, desembolso, hoy).astype("datetime64[M]")
+
+    # Última cuota vencida a hoy: la del mes actual si su día ya pasó, si no la anterior
+    transcurridos = (hoy.astype("datetime64[M]") - meses).astype(np.int64)
+    vence_este_mes = _vencimientos(meses, dia, transcurridos)
+    ultima_vencida = np.clip(np.where(vence_este_mes < hoy, transcurridos, transcurridos - 1), 0, plazo)
+    vencidas = np.where(valida, np.maximum(ultima_vencida - pagadas, 0), 0)
+
+    proxima = pagadas + 1
+    pendiente = valida & (proxima <= plazo)
+    vencimiento = np.where(pendiente, _vencimientos(meses, dia, proxima), np.datetime64("NaT"))
+    dias_mora = np.where(vencidas > 0, (hoy - vencimiento).astype(np.int64), 0)
+
+    # Mora acumulada: cada cuota vencida suma sus propios días de atraso
+    mora = np.zeros(n, dtype=np.float64)
+    ancho = int(vencidas.max()) if n else 0
+    if ancho:
+        j = np.arange(ancho, dtype=np.int64)
+        k = proxima[:, None] + j[None, :]
+        dias = (hoy - _vencimientos(meses[:, None], dia[:, None], k)).astype(np.int64)
+        dias = np.where(j[None, :] < vencidas[:, None], dias, 0)
+        mora = np.round(cuota * TASA_MORA_DIARIA * dias.sum(axis=1), 2)
+
+    return MoraCartera(vencimiento, dias_mora, vencidas, np.round(vencidas * cuota, 2), mora)
+
+
+def _columnas(filas):
+    return list(zip(*filas)) if filas else [()] * 11
+
+
+def _num(valores):
+    return np.array([v or 0 for v in valores], dtype=np.float64)
+
+
+def cuotas_de_filas(filas):
+    """Cuota contratada (valor_cuota) de cada crédito; la de amortizacion solo si no se guardó."""
+    c = _columnas(filas)
+    contratada = _num(c[4])
+    calculada = amortizacion.cuota_fija(_num(c[2]), _num(c[10]), _num(c[3]).astype(np.int64))
+    return np.where(contratada > 0, contratada, calculada)
+
+
+def saldos_de_filas(filas):
+    """Saldo de capital de cada crédito según su tabla de amortización y las cuotas pagadas."""
+    c = _columnas(filas)
+    return amortizacion.saldos(_num(c[2]), _num(c[10]), _num(c[3]).astype(np.int64),
+                               _num(c[9]).astype(np.int64))
+
+
+def mora_de_filas(filas, hoy=None):
+    """Aplica calcular_mora a filas con las columnas de COLUMNAS_CARTERA (toda la cartera o una página)."""
+    c = _columnas(filas)
+    return calcular_mora(c[5], c[8], c[3], cuotas_de_filas(filas), c[9], hoy)
+
+
+def liquidacion_de_fila(fila, hoy=None):
+    """
+    Valor para cancelar hoy un crédito (fila de SQL_CARTERA): amortizacion.Liquidacion
+    con el interés corrido desde el último vencimiento ya pasado (o desde el desembolso).
+    """
+    mora = mora_de_filas([fila], hoy)
+    hoy = np.datetime64(hoy or datetime.date.today(), "D")
+    pagadas, vencidas = int(fila[9] or 0), int(mora.cuotas_vencidas[0])
+    dias = 0
+    desembolso = fecha_iso(fila[5])
+    if desembolso:
+        desde = np.datetime64(desembolso, "D")
+        if pagadas + vencidas > 0:
+            dia = np.clip(int(fila[8] or 1), 1, 31)
+            desde = _vencimientos(desde.astype("datetime64[M]"), dia, np.int64(pagadas + vencidas))
+        dias = max(int((hoy - desde).astype(np.int64)), 0)
+    return amortizacion.liquidacion(fila[2] or 0, fila[10] or 0, fila[3] or 0, pagadas, vencidas,
+                                    dias, float(mora.mora[0]))
+
+
+def consultar_cartera(cursor, hoy=None):
+    """Créditos desembolsados y su mora: (filas, MoraCartera)."""
+    cursor.execute(SQL_CARTERA)
+    filas = cursor.fetchall()
+    return filas, mora_de_filas(filas, hoy)
+
+
+def totales_mora(mora):
+    """Totales para el tablero: créditos en mora, cartera vencida y mora acumulada."""
+    return {
+        "creditos_en_mora": int(np.count_nonzero(mora.cuotas_vencidas)),
+        "monto_vencido": float(mora.monto_vencido.sum()),
+        "mora": float(mora.mora.sum()),
+    }
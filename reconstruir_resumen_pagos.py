@@ -0,0 +1,7 @@
+from database import db_manager
+from resumen_pagos import reconstruir_resumen
+
+# Recalcula ResumenPagos desde Pagos (p. ej. después de corregir pagos a mano)
+if __name__ == "__main__":
+    total = reconstruir_resumen(db_manager)
+    print(f"ResumenPagos reconstruido: {total} créditos con pagos.")
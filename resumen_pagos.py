@@ -0,0 +1,83 @@
+"""
+Resumen de pagos por crédito (tabla ResumenPagos).
+
+Una fila por cédula con lo que las pantallas de cartera necesitan de Pagos:
+cuotas pagadas, capital pagado, total pagado, fecha y número de la última cuota.
+registrar_pago la actualiza en la misma transacción que inserta en Pagos, así
+cartera, recaudación y consultas leen filas ya agregadas en lugar de sumar
+Pagos por cada crédito.
+
+Pagos no guarda el id del crédito: el crédito se identifica por la cédula del
+cliente, igual que en las subconsultas que este resumen reemplaza.
+"""
+
+TABLA = "ResumenPagos"
+
+SQL_CREAR = f"""
+    CREATE TABLE IF NOT EXISTS {TABLA} (
+        cedula_cliente TEXT PRIMARY KEY,
+        cuotas_pagadas INTEGER NOT NULL DEFAULT 0,
+        capital_pagado REAL NOT NULL DEFAULT 0,
+        total_pagado REAL NOT NULL DEFAULT 0,
+        fecha_ultimo_pago TEXT,
+        ultima_cuota INTEGER
+    )
+"""
+
+# ON CONFLICT ... DO UPDATE existe en PostgreSQL 9.5+ y SQLite 3.24+
+_SQL_SUMAR_PAGO = f"""
+    INSERT INTO {TABLA} (cedula_cliente, cuotas_pagadas, capital_pagado, total_pagado, fecha_ultimo_pago, ultima_cuota)
+    VALUES (%s, 1, %s, %s, %s, %s)
+    ON CONFLICT (cedula_cliente) DO UPDATE SET
+        cuotas_pagadas = {TABLA}.cuotas_pagadas + 1,
+        capital_pagado = {TABLA}.capital_pagado + excluded.capital_pagado,
+        total_pagado = {TABLA}.total_pagado + excluded.total_pagado,
+        fecha_ultimo_pago = excluded.fecha_ultimo_pago,
+        ultima_cuota = excluded.ultima_cuota
+"""
+
+_SQL_RECONSTRUIR = f"""
+    INSERT INTO {TABLA} (cedula_cliente, cuotas_pagadas, capital_pagado, total_pagado, fecha_ultimo_pago, ultima_cuota)
+    SELECT cedula_cliente, COUNT(*), COALESCE(SUM(valor_capital), 0), COALESCE(SUM(total_pagado), 0),
+           MAX(fecha), MAX(cuota_nro)
+    FROM Pagos
+    WHERE cedula_cliente IS NOT NULL
+    GROUP BY cedula_cliente
+"""
+
+
+def sumar_pago(cursor, cedula, cuota_nro, valor_capital, total_pagado, fecha):
+    """Acumula un pago en el resumen. Llamar con el mismo cursor/transacción del INSERT en Pagos."""
+    cursor.execute(_SQL_SUMAR_PAGO, (cedula, valor_capital or 0, total_pagado or 0, fecha, cuota_nro))
+
+
+def reconstruir(cursor):
+    """Vacía el resumen y lo recalcula desde Pagos (dentro de la transacción del llamador)."""
+    cursor.execute(f"DELETE FROM {TABLA}")
+    cursor.execute(_SQL_RECONSTRUIR)
+
+
+def reconstruir_resumen(dbm):
+    """
+    Recalcula ResumenPagos en una transacción propia y retorna cuántos créditos quedaron.
+    No pasa por el diario offline: cada motor reconstruye su propio resumen.
+    """
+    conn = dbm.get_connection()
+    cursor = dbm.get_cursor(conn, diario=False)
+    try:
+        if dbm.mode == "SQLITE":
+            conn.commit()
+            cursor.execute("BEGIN IMMEDIATE")
+        else:
+            # Frena los INSERT en Pagos mientras se recalcula: ningún pago queda fuera
+            cursor.execute("LOCK TABLE Pagos IN SHARE ROW EXCLUSIVE MODE")
+        reconstruir(cursor)
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLA}")
+        total = cursor.fetchone()[0]
+        conn.commit()
+        return total
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        dbm.release_connection(conn)
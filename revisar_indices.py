@@ -0,0 +1,10 @@
+from database import db_manager
+from migraciones import revisar_planes
+
+# Reporta las consultas calientes que todavía recorren tablas completas
+if __name__ == "__main__":
+    hallazgos = revisar_planes(db_manager)
+    if not hallazgos:
+        print("Todas las consultas calientes usan índices.")
+    for nombre, detalle in hallazgos:
+        print(f"[SEQ SCAN] {nombre}: {detalle}")